@@ -5,6 +5,22 @@ from dataclasses import dataclass
 class Settings:
     # Dentro de Docker la URL de Qdrant es el nombre del servicio del compose
     QDRANT_URL: str = os.getenv("QDRANT_URL", "http://localhost:6333")
+    QDRANT_API_KEY: str = os.getenv("QDRANT_API_KEY")
+    # Transporte gRPC opcional (puerto 6334 expuesto en docker-compose)
+    QDRANT_PREFER_GRPC: bool = os.getenv("QDRANT_PREFER_GRPC", "false").lower() == "true"
+    QDRANT_GRPC_PORT: int = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+    # Hilos para buscar en varias colecciones en paralelo (camino síncrono)
+    SEARCH_MAX_WORKERS: int = int(os.getenv("SEARCH_MAX_WORKERS", "8"))
+    QDRANT_TIMEOUT_S: int = int(os.getenv("QDRANT_TIMEOUT_S", "0"))  # 0 = timeout por defecto del cliente
+    # Recuperación en dos fases: ids + scores primero, contenido solo del top-k final.
+    # Añade un retrieve por colección tras la búsqueda: compensa solo con payloads grandes
+    TWO_PHASE_RETRIEVAL: bool = os.getenv("TWO_PHASE_RETRIEVAL", "false").lower() == "true"
+    # Motor vectorial: "qdrant" o "local" (export float16 memory-mapped, búsqueda exacta en proceso)
+    VECTOR_BACKEND: str = os.getenv("VECTOR_BACKEND", "qdrant").lower()
+    LOCAL_INDEX_DIR: str = os.getenv("LOCAL_INDEX_DIR", "data/local_index")
+    # Índice léxico (BM25 + tipos de recurso exactos) para consultas con identificadores azurerm_*
+    LEXICAL_INDEX_ENABLED: bool = os.getenv("LEXICAL_INDEX_ENABLED", "true").lower() == "true"
+    LEXICAL_MIN_RELATIVE_SCORE: float = float(os.getenv("LEXICAL_MIN_RELATIVE_SCORE", "0.5"))  # hits léxicos con score >= esta fracción del mejor
 
     # Usa la colección donde ya se indexaron los ejemplos
     QDRANT_COLLECTION_NAME: str = os.getenv("QDRANT_COLLECTION", "jupiter_examples")
@@ -12,12 +28,79 @@ class Settings:
 
     # Mismo modelo que se usa al indexar (384 dims)
     EMBEDDINGS_MODEL_NAME: str = os.getenv("EMBEDDING_MODEL", "intfloat/multilingual-e5-small")
+    # Backend de inferencia: "torch" (sentence-transformers) u "onnx" (ONNX Runtime, int8 por defecto)
+    EMBEDDINGS_BACKEND: str = os.getenv("EMBEDDINGS_BACKEND", "torch").lower()
+    ONNX_MODEL_DIR: str = os.getenv("ONNX_MODEL_DIR", "models/onnx")
+    ONNX_QUANTIZED: bool = os.getenv("ONNX_QUANTIZED", "true").lower() == "true"
+    ONNX_AUTO_EXPORT: bool = os.getenv("ONNX_AUTO_EXPORT", "false").lower() == "true"  # exportar al arrancar si falta (requiere torch)
+    ONNX_INTRA_OP_THREADS: int = int(os.getenv("ONNX_INTRA_OP_THREADS", "0"))  # 0 = los que elija ONNX Runtime
+    ONNX_INTER_OP_THREADS: int = int(os.getenv("ONNX_INTER_OP_THREADS", "1"))
 
     LLM_MODEL_NAME: str = os.getenv("LLM_MODEL", "gpt-4o-mini")
     K_DOCS: int = int(os.getenv("K_DOCS", 3))
     LLM_TEMPERATURE: float = float(os.getenv("LLM_TEMPERATURE", 0.0))
     LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", 3))
+    # Deadline por petición (0 = sin límite salvo que lo pida el cliente)
+    DEFAULT_REQUEST_TIMEOUT_MS: int = int(os.getenv("DEFAULT_REQUEST_TIMEOUT_MS", 0))
+    # Tiempo mínimo restante para lanzar una llamada al LLM; si no, respuesta parcial
+    DEADLINE_MIN_LLM_S: float = float(os.getenv("DEADLINE_MIN_LLM_S", 1.5))
 
     API_URL: str = os.getenv("API_URL", "http://localhost:8008")
 
+    # /query/batch: tamaño máximo del lote y concurrencia de las etapas LLM
+    BATCH_MAX_QUESTIONS: int = int(os.getenv("BATCH_MAX_QUESTIONS", 200))
+    BATCH_MAX_CONCURRENCY: int = int(os.getenv("BATCH_MAX_CONCURRENCY", 4))
+
+    # Caché de respuestas completas de /query (0 = desactivada)
+    RESPONSE_CACHE_SIZE: int = int(os.getenv("RESPONSE_CACHE_SIZE", 512))
+    RESPONSE_CACHE_TTL_S: float = float(os.getenv("RESPONSE_CACHE_TTL_S", 600))
+    # Caché semántica (paráfrasis): tamaño (0 = desactivada) y distancia coseno máxima
+    # Desactivada por defecto (0): SEMANTIC_CACHE_MAX_DISTANCE hay que calibrarla con el modelo
+    # (python -m src.services.semantic_cache calibrate); con e5 preguntas no relacionadas dan coseno >= 0.9
+    SEMANTIC_CACHE_SIZE: int = int(os.getenv("SEMANTIC_CACHE_SIZE", 0))
+    SEMANTIC_CACHE_MAX_DISTANCE: float = float(os.getenv("SEMANTIC_CACHE_MAX_DISTANCE", 0.05))
+
+    # Control de admisión (concurrencia del agente y cola de espera)
+    MAX_CONCURRENT_QUERIES: int = int(os.getenv("MAX_CONCURRENT_QUERIES", 8))
+    MAX_QUEUED_QUERIES: int = int(os.getenv("MAX_QUEUED_QUERIES", 32))
+    MAX_QUEUE_WAIT_S: float = float(os.getenv("MAX_QUEUE_WAIT_S", 20))
+    ADMISSION_RETRY_AFTER_S: int = int(os.getenv("ADMISSION_RETRY_AFTER_S", 2))
+
+    # Caché LRU de embeddings de consulta (0 = desactivada)
+    QUERY_EMBEDDING_CACHE_SIZE: int = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "2048"))
+    # Micro-batching de embeddings de consulta: "off", "local" (en proceso) o "sidecar" (socket Unix)
+    EMBEDDING_BATCHER: str = os.getenv("EMBEDDING_BATCHER", "off").lower()
+    EMBEDDING_BATCH_MAX_SIZE: int = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "32"))
+    EMBEDDING_BATCH_MAX_WAIT_MS: float = float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "5"))
+    EMBEDDING_SIDECAR_SOCKET: str = os.getenv("EMBEDDING_SIDECAR_SOCKET", "/tmp/rag-embeddings.sock")
+    EMBEDDING_ENCODE_TIMEOUT_S: float = float(os.getenv("EMBEDDING_ENCODE_TIMEOUT_S", "10"))
+    # Si el sidecar no responde: "fail" (dependencia dura, /ready lo comprueba) o "local" (encode en el worker)
+    EMBEDDING_SIDECAR_FALLBACK: str = os.getenv("EMBEDDING_SIDECAR_FALLBACK", "fail").lower()
+    EMBEDDING_SIDECAR_MAX_REQUEST_BYTES: int = int(os.getenv("EMBEDDING_SIDECAR_MAX_REQUEST_BYTES", 1024 * 1024))
+    EMBEDDING_SIDECAR_SOCKET_MODE: int = int(os.getenv("EMBEDDING_SIDECAR_SOCKET_MODE", "600"), 8)
+
+    # Respuestas de /query: gzip a partir de este tamaño (si el cliente lo acepta)
+    RESPONSE_GZIP_MIN_BYTES: int = int(os.getenv("RESPONSE_GZIP_MIN_BYTES", "1024"))
+    RESPONSE_GZIP_LEVEL: int = int(os.getenv("RESPONSE_GZIP_LEVEL", "5"))
+
+    # Servidor: con API_WORKERS > 1 se arranca gunicorn en modo pre-fork (config/gunicorn_conf.py)
+    API_PORT: int = int(os.getenv("API_PORT", "8008"))
+    API_WORKERS: int = int(os.getenv("API_WORKERS", "1"))
+    API_WORKER_TIMEOUT_S: int = int(os.getenv("API_WORKER_TIMEOUT_S", "120"))
+
+    # Warmup en el arranque (modelo de embeddings, Qdrant, cliente LLM)
+    WARMUP_ENABLED: bool = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+    WARMUP_LLM_PING: bool = os.getenv("WARMUP_LLM_PING", "true").lower() == "true"
+    # Reintento en segundo plano de los componentes imprescindibles que fallen en el warmup
+    WARMUP_RETRY_INITIAL_S: float = float(os.getenv("WARMUP_RETRY_INITIAL_S", 1))
+    WARMUP_RETRY_MAX_S: float = float(os.getenv("WARMUP_RETRY_MAX_S", 30))
+    # Conteo de documentos de / y /ready: timeout y caché corta (se sondean a menudo)
+    COLLECTION_COUNTS_TIMEOUT_S: float = float(os.getenv("COLLECTION_COUNTS_TIMEOUT_S", 2))
+    COLLECTION_COUNTS_TTL_S: float = float(os.getenv("COLLECTION_COUNTS_TTL_S", 10))
+
+    # Visor /viewer: cabeceras de caché y caché en memoria de ficheros pequeños
+    VIEWER_MAX_AGE_S: int = int(os.getenv("VIEWER_MAX_AGE_S", 3600))
+    VIEWER_CACHE_MAX_ENTRIES: int = int(os.getenv("VIEWER_CACHE_MAX_ENTRIES", 128))
+    VIEWER_CACHE_MAX_FILE_BYTES: int = int(os.getenv("VIEWER_CACHE_MAX_FILE_BYTES", 256 * 1024))
+
 SETTINGS = Settings()
\ No newline at end of file
@@ -0,0 +1,46 @@
+"""
+Configuración de gunicorn para el modo multi-worker de la API.
+
+    gunicorn -c config/gunicorn_conf.py src.api.api:app
+
+El master precarga modelo de embeddings, reglas y grafo (preload_app +
+when_ready) y congela el heap antes de crear los workers (UvicornWorker).
+"""
+import os
+import shutil
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # raíz del proyecto
+from config.config import SETTINGS
+
+bind = f"0.0.0.0:{SETTINGS.API_PORT}"
+workers = SETTINGS.API_WORKERS
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = SETTINGS.API_WORKER_TIMEOUT_S
+graceful_timeout = 30
+keepalive = 5
+
+# Métricas Prometheus compartidas entre workers. Se limpia aquí (al leer la
+# configuración) porque con preload_app la app se importa antes de on_starting
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+if PROMETHEUS_MULTIPROC_DIR:
+    shutil.rmtree(PROMETHEUS_MULTIPROC_DIR, ignore_errors=True)
+    os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+
+def when_ready(server):
+    """Se ejecuta en el master con la app ya importada y antes del primer fork"""
+    from src.services.prefork import preload_for_fork
+    preload_for_fork()
+
+
+def post_worker_init(worker):
+    from src.services.prefork import log_process_memory
+    log_process_memory("worker")
+
+
+def child_exit(server, worker):
+    if PROMETHEUS_MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
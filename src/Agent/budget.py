@@ -0,0 +1,62 @@
+"""
+Presupuesto de latencia (deadline) por petición.
+
+El deadline viaja en el estado del grafo (state["deadline"], reloj monotónico
+del proceso). Cada nodo consulta el tiempo restante, las llamadas a Qdrant y
+al LLM reciben ese tiempo como timeout y, si no queda suficiente para el LLM,
+el grafo responde con lo que ya tiene (template o solo documentos).
+"""
+import math
+import time
+from typing import Optional
+
+from config.config import SETTINGS
+from src.Agent.state import AgentState
+from src.services.llms import llm, llm_no_retry
+
+
+def deadline_from_timeout(timeout_ms: Optional[float], start: Optional[float] = None) -> Optional[float]:
+    """Deadline absoluto (time.monotonic) a partir de un timeout en ms; None = sin límite"""
+    if not timeout_ms or timeout_ms <= 0:
+        return None
+    if start is None:
+        start = time.monotonic()
+    return start + timeout_ms / 1000
+
+
+def remaining(state: AgentState) -> Optional[float]:
+    """Segundos que quedan hasta el deadline (None si la petición no tiene)"""
+    deadline = state.get("deadline")
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+def has_budget(state: AgentState, needed_s: float = 0.0) -> bool:
+    """True si no hay deadline o si quedan al menos needed_s segundos"""
+    left = remaining(state)
+    return left is None or left > needed_s
+
+
+def has_llm_budget(state: AgentState) -> bool:
+    """True si queda tiempo para una llamada al LLM"""
+    return has_budget(state, SETTINGS.DEADLINE_MIN_LLM_S)
+
+
+def qdrant_timeout(state: AgentState) -> Optional[int]:
+    """Timeout (segundos enteros, como lo acepta Qdrant) para las búsquedas"""
+    left = remaining(state)
+    if left is None:
+        return None
+    return max(1, math.ceil(left))
+
+
+def llm_for(state: AgentState):
+    """
+    LLM a usar en un nodo: sin deadline, el normal (con reintentos);
+    con deadline, uno sin reintentos y con el tiempo restante como timeout.
+    """
+    left = remaining(state)
+    if left is None:
+        return llm
+    return llm_no_retry.bind(timeout=max(left, 0.1))
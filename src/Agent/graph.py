@@ -3,17 +3,70 @@
 Construcción del grafo principal
 """
 import time
+import asyncio
+import threading
+import functools
 from langgraph.graph import StateGraph, END
+from langchain_core.runnables import RunnableLambda
 from config.logger_config import logger
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, AsyncIterator, Tuple, Any
 
 from src.Agent.state import AgentState
+from src.services.metrics import NODE_LATENCY
 from src.Agent.nodes.validate_scope import validate_scope, should_continue
-from src.Agent.nodes.contextualize import contextualize_question
+from src.Agent.nodes.contextualize import contextualize_question, acontextualize_question
 from src.Agent.nodes.intent_classifier import classify_intent
-from src.Agent.nodes.retrieval import retrieve_documents
+from src.Agent.nodes.semantic_cache import lookup_semantic_cache, after_semantic_cache, store_in_semantic_cache
+from src.Agent.nodes.retrieval import retrieve_documents, aretrieve_documents
 from src.Agent.nodes.decision import decide_response_type, get_next_node
-from src.Agent.nodes.generation import generate_answer, format_template, format_hybrid
+from src.Agent.nodes.generation import (
+    generate_answer,
+    agenerate_answer,
+    format_template,
+    format_hybrid,
+    aformat_hybrid,
+    format_partial,
+)
+
+# Nodos cuya salida del LLM se reenvía token a token en streaming
+STREAMING_NODES = {"generate", "format_hybrid"}
+
+
+def _timed(name: str, func):
+    """Envuelve un nodo (sync) midiendo su latencia en NODE_LATENCY."""
+    @functools.wraps(func)
+    def wrapper(state):
+        start = time.perf_counter()
+        try:
+            return func(state)
+        finally:
+            NODE_LATENCY.labels(node=name).observe(time.perf_counter() - start)
+    return wrapper
+
+
+def _atimed(name: str, afunc):
+    """Envuelve un nodo async midiendo su latencia en NODE_LATENCY."""
+    @functools.wraps(afunc)
+    async def wrapper(state):
+        start = time.perf_counter()
+        try:
+            return await afunc(state)
+        finally:
+            NODE_LATENCY.labels(node=name).observe(time.perf_counter() - start)
+    return wrapper
+
+
+def _node(name: str, func, afunc=None) -> RunnableLambda:
+    """
+    Nodo instrumentado. Si tiene variante asíncrona: graph.invoke usa func,
+    graph.ainvoke usa afunc (I/O sin bloquear el event loop).
+    """
+    return RunnableLambda(
+        _timed(name, func),
+        afunc=_atimed(name, afunc) if afunc else None,
+        name=func.__name__,
+    )
+
 
 def reject_query(state: AgentState) -> AgentState:
     """
@@ -32,9 +85,12 @@ class Agent:
     
     def __init__(self):
         logger.info("🚀 Inicializando Terraform Generator", source="agent")
+        start_time = time.time()
         try:
             self.graph = self._create_graph()
-            logger.info("✅ Agent inicializado", source="agent")
+            # Coste único de construir + compilar el grafo (se reporta en el arranque de la API)
+            self.build_time_ms = (time.time() - start_time) * 1000
+            logger.info("✅ Agent inicializado", source="agent", build_time_ms=round(self.build_time_ms, 2))
         except Exception as e:
             logger.error("❌ Error inicializando Agent", source="agent", error=str(e))
             raise
@@ -43,10 +99,12 @@ class Agent:
         """
         Crea el grafo:
 
-        contextualize → validate_scope ─┬─→ classify_intent → retrieve → decide ─┬─→ generate ──────→  END
-                                        │                                        ├─→ format_template → END
-                                        │                                        └─→ format_hybrid ──→ END
-                                        └─→ reject ──────────────────────────────────────────────────→ END
+        contextualize → validate_scope ─┬─→ classify_intent → semantic_cache ─┬─→ retrieve → decide ─┬─→ generate ──────→  END
+                                        │                                      │                      ├─→ format_template → END
+                                        │                                      │                      ├─→ format_hybrid ──→ END
+                                        │                                      │                      └─→ format_partial → END  (deadline agotado)
+                                        │                                      └─→ END  (acierto: respuesta reutilizada)
+                                        └─→ reject ────────────────────────────────────────────────────────────────────→ END
         """
         logger.info("🔧 Creando grafo", source="agent")
         
@@ -54,15 +112,17 @@ class Agent:
         
         
         # ========== NODOS ==========
-        workflow.add_node("contextualize", contextualize_question)
-        workflow.add_node("validate_scope", validate_scope)
-        workflow.add_node("reject", reject_query)
-        workflow.add_node("classify_intent", classify_intent)
-        workflow.add_node("retrieve", retrieve_documents)
-        workflow.add_node("decide", decide_response_type)
-        workflow.add_node("generate", generate_answer)
-        workflow.add_node("format_template", format_template)
-        workflow.add_node("format_hybrid", format_hybrid)
+        workflow.add_node("contextualize", _node("contextualize", contextualize_question, acontextualize_question))
+        workflow.add_node("validate_scope", _node("validate_scope", validate_scope))
+        workflow.add_node("reject", _node("reject", reject_query))
+        workflow.add_node("classify_intent", _node("classify_intent", classify_intent))
+        workflow.add_node("semantic_cache", _node("semantic_cache", lookup_semantic_cache))
+        workflow.add_node("retrieve", _node("retrieve", retrieve_documents, aretrieve_documents))
+        workflow.add_node("decide", _node("decide", decide_response_type))
+        workflow.add_node("generate", _node("generate", generate_answer, agenerate_answer))
+        workflow.add_node("format_template", _node("format_template", format_template))
+        workflow.add_node("format_hybrid", _node("format_hybrid", format_hybrid, aformat_hybrid))
+        workflow.add_node("format_partial", _node("format_partial", format_partial))
         
         # ========== EDGES ==========
         
@@ -81,7 +141,15 @@ class Agent:
         )
         
         # 4. Flujo principal
-        workflow.add_edge("classify_intent", "retrieve")
+        workflow.add_edge("classify_intent", "semantic_cache")
+        workflow.add_conditional_edges(
+            "semantic_cache",
+            after_semantic_cache,
+            {
+                "hit": END,
+                "miss": "retrieve"
+            }
+        )
         workflow.add_edge("retrieve", "decide")
 
         # 5. Branching desde decide
@@ -91,7 +159,8 @@ class Agent:
             {
                 "generate": "generate",
                 "format_template": "format_template",
-                "format_hybrid": "format_hybrid"
+                "format_hybrid": "format_hybrid",
+                "format_partial": "format_partial"
             }
         )
         
@@ -100,19 +169,16 @@ class Agent:
         workflow.add_edge("generate", END)
         workflow.add_edge("format_template", END)
         workflow.add_edge("format_hybrid", END)
+        workflow.add_edge("format_partial", END)
         
         logger.info("✅ Grafo compilado", source="agent")
         return workflow.compile()
 
-    def invoke(self, question: str, k_docs: int, threshold: float, chat_history: Optional[List[Dict[str, str]]] = None) -> dict:
-        """
-        Ejecuta el grafo con una pregunta.
-        """
-        start_time = time.time()
-        
-        # Estado inicial
-        state = {
+    def _initial_state(self, question: str, k_docs: int, threshold: float, chat_history: Optional[List[Dict[str, str]]] = None, prefetched_hits: Optional[List[Dict[str, Any]]] = None, deadline: Optional[float] = None) -> dict:
+        """Estado inicial del grafo."""
+        return {
             "question": question,
+            "deadline": deadline,
             "k_docs": k_docs,
             "threshold": threshold,
             "original_question": question,
@@ -127,7 +193,9 @@ class Agent:
             "target_collections": [],
             "response_action": "",
             "intent_scores": {},
+            "semantic_cache_hit": False,
             # Retrieval
+            "prefetched_hits": prefetched_hits,
             "raw_documents": [],
             "documents": [],
             "documents_metadata": [],
@@ -136,11 +204,20 @@ class Agent:
             "template_code": None,
             "explanation": None,
         }
+
+    def invoke(self, question: str, k_docs: int, threshold: float, chat_history: Optional[List[Dict[str, str]]] = None, deadline: Optional[float] = None) -> dict:
+        """
+        Ejecuta el grafo con una pregunta.
+        deadline (time.monotonic) limita la latencia total: ver src/Agent/budget.py.
+        """
+        start_time = time.time()
+        state = self._initial_state(question, k_docs, threshold, chat_history, deadline=deadline)
         
         logger.info("▶️ Ejecutando grafo", source="agent", question=question[:80])
         
         try:
             result = self.graph.invoke(state)
+            store_in_semantic_cache(result)
             duration = time.time() - start_time
             logger.info("✅ Grafo completado", source="agent",duration=f"{duration:.2f}s",is_valid_scope=result.get("is_valid_scope"),intent=result.get("intent"),action=result.get("response_action"))
             return result
@@ -148,12 +225,117 @@ class Agent:
         except Exception as e:
             logger.error("❌ Error en grafo", source="agent", error=str(e))
             raise
+
+    async def ainvoke(self, question: str, k_docs: int, threshold: float, chat_history: Optional[List[Dict[str, str]]] = None, prefetched_hits: Optional[List[Dict[str, Any]]] = None, deadline: Optional[float] = None) -> dict:
+        """
+        Ejecuta el grafo de forma asíncrona (graph.ainvoke).
+        LLM y Qdrant no bloquean el event loop, así un único worker
+        atiende muchas conversaciones concurrentes.
+        Si se pasan prefetched_hits, el nodo retrieve los usa en lugar de buscar.
+        """
+        start_time = time.time()
+        state = self._initial_state(question, k_docs, threshold, chat_history, prefetched_hits, deadline)
+        
+        logger.info("▶️ Ejecutando grafo (async)", source="agent", question=question[:80])
         
+        try:
+            result = await self.graph.ainvoke(state)
+            await asyncio.to_thread(store_in_semantic_cache, result)
+            duration = time.time() - start_time
+            logger.info("✅ Grafo completado", source="agent",duration=f"{duration:.2f}s",is_valid_scope=result.get("is_valid_scope"),intent=result.get("intent"),action=result.get("response_action"))
+            return result
+            
+        except Exception as e:
+            logger.error("❌ Error en grafo", source="agent", error=str(e))
+            raise
+        
+    async def astream(self, question: str, k_docs: int, threshold: float, chat_history: Optional[List[Dict[str, str]]] = None, deadline: Optional[float] = None) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Ejecuta el grafo en streaming y produce eventos (nombre, datos):
+
+        - scope:     resultado de validate_scope
+        - intent:    intent clasificado y acción prevista
+        - documents: documentos recuperados
+        - token:     fragmentos del LLM según llegan (generate / format_hybrid)
+        - answer:    respuesta completa cuando no hay LLM (template, rechazo, fallback)
+        - final:     estado final del grafo (para construir las fuentes)
+        """
+        start_time = time.time()
+        state = self._initial_state(question, k_docs, threshold, chat_history, deadline=deadline)
+        streamed_nodes = set()
+        final_state = state
+        
+        logger.info("▶️ Ejecutando grafo (stream)", source="agent", question=question[:80])
+        
+        try:
+            async for mode, chunk in self.graph.astream(state, stream_mode=["updates", "messages", "values"]):
+                if mode == "messages":
+                    message, metadata = chunk
+                    node = metadata.get("langgraph_node")
+                    if node in STREAMING_NODES and message.content:
+                        streamed_nodes.add(node)
+                        yield "token", {"content": message.content}
+
+                elif mode == "updates":
+                    for node, update in chunk.items():
+                        update = update or {}
+                        if node == "validate_scope":
+                            yield "scope", {"is_valid_scope": update.get("is_valid_scope", True)}
+                        elif node == "classify_intent":
+                            yield "intent", {
+                                "intent": update.get("intent"),
+                                "is_multi_intent": update.get("is_multi_intent", False),
+                                "response_action": update.get("response_action"),
+                            }
+                        elif node == "retrieve":
+                            raw_documents = update.get("raw_documents", [])
+                            yield "documents", {
+                                "count": len(raw_documents),
+                                "top_score": raw_documents[0].relevance_score if raw_documents else 0.0,
+                            }
+                        elif node == "semantic_cache":
+                            if update.get("semantic_cache_hit"):
+                                yield "answer", {"content": update.get("answer", "")}
+                        elif node in ("reject", "format_template", "format_partial") or (
+                            node in STREAMING_NODES and node not in streamed_nodes
+                        ) or update.get("response_action") == "partial_response":
+                            yield "answer", {"content": update.get("answer", "")}
+
+                elif mode == "values":
+                    final_state = chunk
+
+            await asyncio.to_thread(store_in_semantic_cache, final_state)
+            duration = time.time() - start_time
+            logger.info("✅ Grafo completado (stream)", source="agent",duration=f"{duration:.2f}s",is_valid_scope=final_state.get("is_valid_scope"),intent=final_state.get("intent"),action=final_state.get("response_action"))
+            yield "final", final_state
+
+        except Exception as e:
+            logger.error("❌ Error en grafo", source="agent", error=str(e))
+            raise
+
     def query(self, question: str) -> str:
             """Método simple que devuelve solo la respuesta."""
             result = self.invoke(question)
             return result.get("answer", "No se pudo generar respuesta.")
     
+_agent: Optional[Agent] = None
+_agent_lock = threading.Lock()
+
+
+def get_agent() -> Agent:
+    """
+    Devuelve el Agent compartido del proceso.
+    El grafo se construye y compila una sola vez; todas las peticiones
+    reutilizan el mismo grafo compilado (no guarda estado entre invocaciones).
+    """
+    global _agent
+    if _agent is None:
+        with _agent_lock:
+            if _agent is None:
+                _agent = Agent()
+    return _agent
+
+
 # Test
 if __name__ == "__main__":
     import sys
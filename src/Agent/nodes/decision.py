@@ -4,9 +4,11 @@ Nodo de decisión basado en la intención detectada
 """
 from config.config import SETTINGS
 from src.Agent.state import AgentState
+from src.Agent.budget import has_llm_budget
 from config.logger_config import logger, get_request_id, set_request_id
 from typing import Literal
 from src.api.schemas import SourceInfo
+from src.services.lexical_index import is_lexical_hit
 
 def _has_terraform_code(content: str) -> bool:
     """Verifica si el contenido tiene código Terraform"""
@@ -31,12 +33,31 @@ def _find_best_template(raw_documents: list, threshold: float) -> tuple:
         return None, False
     
     for doc in raw_documents:
+        # Los hits léxicos no traen un coseno: su score no se compara con el threshold
+        if is_lexical_hit(doc.metadata):
+            continue
         # Verificar score y contenido
         if doc.relevance_score >= threshold and _has_terraform_code(doc.content):
             return doc, True
     
     return None, False
 
+def _decide_without_llm(state: AgentState, raw_documents: list, threshold: float) -> AgentState:
+    """Sin presupuesto para el LLM: template si hay uno bueno, si no respuesta solo con documentos"""
+    if state.get("intent") in ["code_template", "full_example"] or state.get("is_multi_intent"):
+        best_doc, found = _find_best_template(raw_documents, threshold)
+        if found and best_doc:
+            state["response_action"] = "return_template"
+            state["template_code"] = best_doc.content
+            logger.info("⏱️ Decisión: return_template", source="decision", reason="deadline", score=best_doc.relevance_score)
+            state["messages"].append(f"⚠️ Decisión: return_template por deadline (score: {best_doc.relevance_score:.2f})")
+            return state
+
+    state["response_action"] = "partial_response"
+    logger.info("⏱️ Decisión: partial_response", source="decision", reason="deadline", num_docs=len(raw_documents))
+    state["messages"].append("⚠️ Decisión: partial_response por deadline (solo documentos)")
+    return state
+
 def decide_response_type(state: AgentState) -> AgentState:
     """
     Decide la acción a tomar basada en la intención detectada
@@ -58,6 +79,9 @@ def decide_response_type(state: AgentState) -> AgentState:
 
         logger.info("🤔 Evaluando tipo de respuesta", source="decision", intent=intent, is_multi_intent=is_multi_intent, num_docs=len(raw_documents), current_action=response_action)
 
+        # Caso 0 - Sin tiempo para el LLM: la mejor respuesta disponible sin generar
+        if not has_llm_budget(state):
+            return _decide_without_llm(state, raw_documents, threshold)
         
         # Caso 1 - Hybrid
         if is_multi_intent or response_action == "hybrid_response":
@@ -93,7 +117,7 @@ def decide_response_type(state: AgentState) -> AgentState:
             state["messages"].append(f"⚠️ Error en decisión, usando fallback: {str(e)}")
             return state
 
-def get_next_node(state: AgentState) -> Literal["generate", "format_template", "format_hybrid"]:
+def get_next_node(state: AgentState) -> Literal["generate", "format_template", "format_hybrid", "format_partial"]:
     """
     Router condicional para LangGraph.
     
@@ -107,7 +131,8 @@ def get_next_node(state: AgentState) -> Literal["generate", "format_template", "
     routing = {
         "return_template": "format_template",
         "hybrid_response": "format_hybrid",
-        "generate_answer": "generate"
+        "generate_answer": "generate",
+        "partial_response": "format_partial"
     }
     
     next_node = routing.get(action, "generate")
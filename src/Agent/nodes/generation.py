@@ -2,7 +2,8 @@
 Nodo de generación de respuestas
 """
 from src.Agent.state import AgentState
-from src.services.llms import llm
+from src.Agent.budget import has_llm_budget, llm_for
+from src.services.lexical_index import is_lexical_hit
 from config.logger_config import logger, get_request_id, set_request_id
 
 def _format_chat_history(chat_history: list) -> str:
@@ -17,13 +18,8 @@ def _format_chat_history(chat_history: list) -> str:
     
     return "\n".join(formatted)
 
-def generate_answer(state: AgentState) -> AgentState:
-    """
-    Genera una respuesta usando el LLM.
-    Usado para preguntas de explicación.
-    """
-    logger.info("🤖 Generando respuesta con LLM", source="generation")
-    
+def _build_answer_prompt(state: AgentState) -> str:
+    """Construye el prompt de generate_answer a partir del estado."""
     question = state.get("question", "")
     documents = state.get("documents", [])
     chat_history = state.get("chat_history", [])
@@ -31,8 +27,7 @@ def generate_answer(state: AgentState) -> AgentState:
     context = "\n\n---\n\n".join(documents) if documents else "No hay contexto disponible."
     history_text = _format_chat_history(chat_history)
     
-    try:
-        prompt = f"""Eres un experto en Terraform y Azure. Responde la pregunta basándote en el contexto y el historial de conversación.
+    return f"""Eres un experto en Terraform y Azure. Responde la pregunta basándote en el contexto y el historial de conversación.
 
 Contexto:
 {context}
@@ -41,18 +36,59 @@ Contexto:
 Pregunta: {question}
 
 Respuesta:"""
-        response = llm.invoke(prompt)
-        state["answer"] = response.content
-        state["messages"].append("✅ Respuesta generada con LLM")
+
+
+def _apply_answer(state: AgentState, response) -> AgentState:
+    """Guarda la respuesta del LLM en el estado."""
+    state["answer"] = response.content
+    state["messages"].append("✅ Respuesta generada con LLM")
+    logger.info("✅ Respuesta generada", source="generation", answer_length=len(response.content))
+    return state
+
+
+def _deadline_hit(state: AgentState) -> bool:
+    """True si la petición tiene deadline y ya no queda tiempo para el LLM."""
+    return state.get("deadline") is not None and not has_llm_budget(state)
+
+
+def _generation_failed(state: AgentState, e: Exception) -> None:
+    """Registra el error de generación en el estado."""
+    logger.error("❌ Error en generación", source="generation", error=str(e))
+    state["answer"] = f"Error al generar respuesta: {str(e)}"
+    state["messages"].append(f"❌ Error: {str(e)}")
+
+
+def generate_answer(state: AgentState) -> AgentState:
+    """
+    Genera una respuesta usando el LLM.
+    Usado para preguntas de explicación.
+    """
+    logger.info("🤖 Generando respuesta con LLM", source="generation")
+    
+    try:
+        response = llm_for(state).invoke(_build_answer_prompt(state))
+        return _apply_answer(state, response)
             
-        logger.info("✅ Respuesta generada", source="generation", answer_length=len(response.content))
-        return state
+    except Exception as e:
+        if _deadline_hit(state):
+            return format_partial(state)
+        _generation_failed(state, e)
+        raise
+
+
+async def agenerate_answer(state: AgentState) -> AgentState:
+    """Versión asíncrona de generate_answer (llm.ainvoke)."""
+    logger.info("🤖 Generando respuesta con LLM (async)", source="generation")
+    
+    try:
+        response = await llm_for(state).ainvoke(_build_answer_prompt(state))
+        return _apply_answer(state, response)
             
     except Exception as e:
-            logger.error("❌ Error en generación", source="generation", error=str(e))
-            state["answer"] = f"Error al generar respuesta: {str(e)}"
-            state["messages"].append(f"❌ Error: {str(e)}")
-            raise
+        if _deadline_hit(state):
+            return format_partial(state)
+        _generation_failed(state, e)
+        raise
 
 
 
@@ -100,14 +136,8 @@ def format_template(state: AgentState) -> AgentState:
 
 
 # MODO 3: Respuesta híbrida (código + explicación)
-def format_hybrid(state: AgentState) -> AgentState:
-    """
-    Genera respuesta híbrida: explicación + código.
-    Usado para queries multi-intent.
-    """
-    logger.info("🔀 Generando respuesta híbrida", source="generation")
-    
-    question = state.get("question", "")
+def _split_hybrid_docs(state: AgentState) -> tuple:
+    """Separa los documentos en código y explicación."""
     documents = state.get("documents", [])
     raw_documents = state.get("raw_documents", [])
     
@@ -126,9 +156,12 @@ def format_hybrid(state: AgentState) -> AgentState:
         code_docs = documents[:2] if documents else []
     if not explanation_docs:
         explanation_docs = documents[2:4] if len(documents) > 2 else []
-    
-    try:
-        prompt = f"""Eres un experto en Terraform y Azure. El usuario quiere código Y explicación.
+    return code_docs, explanation_docs
+
+
+def _build_hybrid_prompt(question: str, code_docs: list, explanation_docs: list) -> str:
+    """Construye el prompt de la respuesta híbrida."""
+    return f"""Eres un experto en Terraform y Azure. El usuario quiere código Y explicación.
 
 DOCUMENTACIÓN:
 {chr(10).join(explanation_docs[:2]) if explanation_docs else "No disponible"}
@@ -145,27 +178,63 @@ INSTRUCCIONES:
 
 RESPUESTA:"""
 
-        response = llm.invoke(prompt)
-        state["answer"] = response.content
-        state["messages"].append("🔀 Respuesta híbrida generada")
-        
-        logger.info("✅ Respuesta híbrida generada", source="generation",
-                   code_docs=len(code_docs), explanation_docs=len(explanation_docs))
-        return state
+
+def _apply_hybrid(state: AgentState, response, code_docs: list, explanation_docs: list) -> AgentState:
+    """Guarda la respuesta híbrida en el estado."""
+    state["answer"] = response.content
+    state["messages"].append("🔀 Respuesta híbrida generada")
+    
+    logger.info("✅ Respuesta híbrida generada", source="generation",
+               code_docs=len(code_docs), explanation_docs=len(explanation_docs))
+    return state
+
+
+def _hybrid_fallback(state: AgentState, e: Exception, code_docs: list, explanation_docs: list) -> AgentState:
+    """Fallback sin LLM: mostrar lo que tengamos."""
+    logger.error("❌ Error en híbrido", source="generation", error=str(e))
+    
+    fallback = []
+    if explanation_docs:
+        fallback.append(f"## Explicación\n{explanation_docs[0][:500]}...")
+    if code_docs:
+        fallback.append(f"## Código\n```hcl\n{code_docs[0]}\n```")
+    
+    state["answer"] = "\n\n".join(fallback) if fallback else f"Error: {str(e)}"
+    state["messages"].append(f"⚠️ Fallback: {str(e)}")
+    return state
+
+
+def format_hybrid(state: AgentState) -> AgentState:
+    """
+    Genera respuesta híbrida: explicación + código.
+    Usado para queries multi-intent.
+    """
+    logger.info("🔀 Generando respuesta híbrida", source="generation")
+    
+    question = state.get("question", "")
+    code_docs, explanation_docs = _split_hybrid_docs(state)
+    
+    try:
+        response = llm_for(state).invoke(_build_hybrid_prompt(question, code_docs, explanation_docs))
+        return _apply_hybrid(state, response, code_docs, explanation_docs)
         
     except Exception as e:
-        logger.error("❌ Error en híbrido", source="generation", error=str(e))
-        
-        # Fallback: mostrar lo que tengamos
-        fallback = []
-        if explanation_docs:
-            fallback.append(f"## Explicación\n{explanation_docs[0][:500]}...")
-        if code_docs:
-            fallback.append(f"## Código\n```hcl\n{code_docs[0]}\n```")
+        return _hybrid_fallback(state, e, code_docs, explanation_docs)
+
+
+async def aformat_hybrid(state: AgentState) -> AgentState:
+    """Versión asíncrona de format_hybrid (llm.ainvoke)."""
+    logger.info("🔀 Generando respuesta híbrida (async)", source="generation")
+    
+    question = state.get("question", "")
+    code_docs, explanation_docs = _split_hybrid_docs(state)
+    
+    try:
+        response = await llm_for(state).ainvoke(_build_hybrid_prompt(question, code_docs, explanation_docs))
+        return _apply_hybrid(state, response, code_docs, explanation_docs)
         
-        state["answer"] = "\n\n".join(fallback) if fallback else f"Error: {str(e)}"
-        state["messages"].append(f"⚠️ Fallback: {str(e)}")
-        return state
+    except Exception as e:
+        return _hybrid_fallback(state, e, code_docs, explanation_docs)
 
 
 def _has_terraform_code(content: str) -> bool:
@@ -174,6 +243,38 @@ def _has_terraform_code(content: str) -> bool:
     return any(indicator in content for indicator in tf_indicators)
 
 
+# MODO 4: Respuesta parcial (deadline agotado, sin LLM)
+def format_partial(state: AgentState) -> AgentState:
+    """
+    Devuelve los documentos más relevantes sin generar texto.
+    Usado cuando el deadline de la petición no deja tiempo para el LLM.
+    """
+    logger.info("⏱️ Formateando respuesta parcial", source="generation")
+    
+    raw_documents = state.get("raw_documents", [])
+    state["response_action"] = "partial_response"
+    
+    if not raw_documents:
+        state["answer"] = "⏱️ No hubo tiempo suficiente para responder a tu consulta. Inténtalo de nuevo."
+        state["messages"].append("⚠️ Respuesta parcial: sin documentos")
+        return state
+    
+    lines = ["⏱️ No hubo tiempo suficiente para generar una respuesta completa. Estos son los documentos más relevantes:\n"]
+    for i, doc in enumerate(raw_documents, 1):
+        md = doc.metadata or {}
+        name = md.get("name") or md.get("example_name") or doc.source
+        ref = md.get("ref", "")
+        title = f"[{name}]({ref})" if ref else f"`{name}`"
+        excerpt = " ".join(doc.content[:300].split())
+        relevance = "coincidencia léxica" if is_lexical_hit(md) else f"{doc.relevance_score:.0%}"
+        lines.append(f"{i}. {title} ({relevance})\n\n> {excerpt}...\n")
+    
+    state["answer"] = "\n".join(lines)
+    state["messages"].append("⚠️ Respuesta parcial (deadline)")
+    logger.info("✅ Respuesta parcial formateada", source="generation", docs=len(raw_documents))
+    return state
+
+
 # TEST
 if __name__ == "__main__":
     from src.Agent.state import DocumentScore
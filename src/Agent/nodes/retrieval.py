@@ -1,10 +1,165 @@
 import os
+import asyncio
 from config.config import SETTINGS
 from src.Agent.state import AgentState, DocumentScore
-from src.services.search import search_all_collections
+from src.Agent.budget import has_budget, qdrant_timeout, remaining
+from src.services.search import search_all_collections, async_search_all_collections
+from src.services.lexical_index import lexical_applies, lexical_search
 from config.logger_config import logger
 
 ALL_COLLECTIONS = ["terraform_book", "examples_terraform"]
+EXTRA_CANDIDATES = 5  # Documentos extra por colección para que el filtrado seleccione
+
+
+def _apply_hits(state: AgentState, hits: list) -> AgentState:
+    """Convierte los hits de búsqueda en DocumentScore y actualiza el estado."""
+    # Ordenar los hits por score descendente y quedarse con los k_docs mejores
+    hits = sorted(hits, key=lambda x: x.get("score", 0), reverse=True)[
+        : state["k_docs"]
+    ]
+
+    logger.info(
+        f"✅ search_examples retornó {len(hits)} resultados",
+        source="retrieval",
+        hits_count=len(hits),
+    )
+
+    # Convertir hits a DocumentScore (para LangGraph)
+    raw_documents = []
+    for rank, hit in enumerate(hits, 1):
+        # Enriquecer metadata con un campo "ref" clicable si es posible
+        md = hit.get("metadata", {}) or {}
+        path = md.get("file_path") or hit.get("path") or ""
+        pages = md.get("pages") or md.get("page")
+
+        # --- LÓGICA DE GENERACIÓN DE ENLACES (S3 vs LOCAL) ---
+        ref = ""
+        s3_bucket = os.getenv("S3_DATA_BUCKET_NAME")
+        aws_region = os.getenv(
+            "AWS_DEFAULT_REGION", "eu-west-1"
+        )  # Región por defecto si no está definida
+
+        if path:
+            if s3_bucket:
+                # ☁️ MODO NUBE (S3)
+                # El path indexado viene como "/app/data/pdfs/..." (ruta Docker)
+                # Lo convertimos a "data/pdfs/..." (Key de S3)
+                clean_key = path.replace("/app/", "", 1).lstrip("/")
+
+                # Construimos la URL pública de S3
+                # Formato: https://BUCKET.s3.REGION.amazonaws.com/KEY
+                ref = (
+                    f"https://{s3_bucket}.s3.{aws_region}.amazonaws.com/{clean_key}"
+                )
+
+                # Si es un PDF y tenemos página, añadimos el ancla #page=X para que el navegador vaya directo
+                if pages and clean_key.endswith(".pdf"):
+                    ref += f"#page={pages}"
+
+            else:
+                # 💻 MODO LOCAL (Visor API)
+                # Mantiene la compatibilidad para cuando desarrollas en tu máquina
+                base_url = SETTINGS.API_URL
+                rel_path = ""
+                if "data/" in path.replace("\\", "/"):
+                    # Extraer desde data/docs/ en adelante
+                    rel_path = path.replace("\\", "/").split("data/", 1)[-1]
+                    # Codificamos la ruta para la URL del visor local
+                    ref = f"{base_url.rstrip('/')}/viewer/{rel_path.replace('/', '%2F')}"
+                else:
+                    ref = f"{base_url.rstrip('/')}/{path}"
+
+        # Guardar ref en metadata para que el Frontend lo pinte
+        if ref:
+            try:
+                md["ref"] = ref
+            except Exception:
+                pass
+
+        doc_score = DocumentScore(
+            content=hit.get("content", ""),
+            metadata=md,
+            relevance_score=float(hit.get("score", 0.0)),  # Score de Qdrant
+            source=hit.get("path", "unknown"),
+            collection=hit.get("collection", "unknown"),
+            line_number=None,
+        )
+        raw_documents.append(doc_score)
+
+        logger.debug(
+            f"Documento {rank} convertido a DocumentScore",
+            source="retrieval",
+            score=doc_score.relevance_score,
+            source_file=doc_score.source,
+        )
+
+    logger.info(
+        f"✅ Búsqueda completada",
+        source="retrieval",
+        documents_found=len(raw_documents),
+        scores=[f"{d.relevance_score:.3f}" for d in raw_documents[:5]],
+    )
+
+    # Actualizar estado
+    state["raw_documents"] = raw_documents
+    state["documents"] = [doc.content for doc in raw_documents]
+    # Propagar el campo `ref` en los metadatos
+    state["documents_metadata"] = [
+        {
+            "metadata": doc.metadata,
+            "source": doc.source,
+            "score": doc.relevance_score,
+            "collection": doc.collection,
+            "ref": doc.metadata.get("ref", ""),  # Incluir el enlace clicable
+        }
+        for doc in raw_documents
+    ]
+    state["messages"].append(
+        f"📚 Recuperados {len(raw_documents)} documentos crudos"
+    )
+
+    return state
+
+
+def _retrieval_failed(state: AgentState, question: str, e: Exception) -> AgentState:
+    """Registra el error de recuperación y deja el estado sin documentos."""
+    logger.error(
+        f"❌ Error durante la recuperación de documentos",
+        source="retrieval",
+        error=str(e),
+        error_type=type(e).__name__,
+        question=question[:100],
+    )
+    state["messages"].append(f"❌ Error en recuperación: {str(e)}")
+    state["raw_documents"] = []
+    return state
+
+
+def _deadline_exceeded(state: AgentState) -> AgentState:
+    """Deadline agotado antes de buscar: se continúa sin documentos."""
+    logger.warning("⏱️ Recuperación omitida por deadline", source="retrieval")
+    state["messages"].append("⚠️ Recuperación omitida (deadline)")
+    state["raw_documents"] = []
+    return state
+
+
+def _lexical_hits(state: AgentState, question: str) -> list:
+    """Camino rápido por identificador exacto (azurerm_*); [] si no aplica."""
+    try:
+        hits = lexical_search(question, ALL_COLLECTIONS, state["k_docs"])
+    except Exception as e:
+        logger.warning(f"⚠️ Error en índice léxico, se usa búsqueda densa: {e}", source="retrieval")
+        return []
+    if hits:
+        logger.info("⚡ Recuperación por índice léxico", source="retrieval", hits_count=len(hits))
+    return hits
+
+
+async def _alexical_hits(state: AgentState, question: str) -> list:
+    """Versión asíncrona de _lexical_hits: el scoring BM25 corre en un hilo, fuera del event loop."""
+    if not lexical_applies(question):
+        return []
+    return await asyncio.to_thread(_lexical_hits, state, question)
 
 
 def retrieve_documents(state: AgentState) -> AgentState:
@@ -20,10 +175,21 @@ def retrieve_documents(state: AgentState) -> AgentState:
     """
     question = state["question"]
     k_max = (
-        state["k_docs"] + 5
+        state["k_docs"] + EXTRA_CANDIDATES
     )  # Traer más documentos para que filtering los seleccione
     threshold = state["threshold"]
 
+    # Hits ya calculados fuera del grafo (p.ej. /query/batch)
+    if state.get("prefetched_hits") is not None:
+        return _apply_hits(state, state["prefetched_hits"])
+
+    lexical_hits = _lexical_hits(state, question)
+    if lexical_hits:
+        return _apply_hits(state, lexical_hits)
+
+    if not has_budget(state):
+        return _deadline_exceeded(state)
+
     try:
         logger.info(
             " - Iniciando búsqueda con search_examples",
@@ -37,123 +203,54 @@ def retrieve_documents(state: AgentState) -> AgentState:
             collections=ALL_COLLECTIONS,
             k_per_collection=k_max,
             threshold=threshold,
+            timeout=qdrant_timeout(state),
+            fetch_k=state["k_docs"],
         )
+        return _apply_hits(state, hits)
 
-        # Ordenar los hits por score descendente y quedarse con los k_docs mejores
-        hits = sorted(hits, key=lambda x: x.get("score", 0), reverse=True)[
-            : state["k_docs"]
-        ]
+    except Exception as e:
+        return _retrieval_failed(state, question, e)
 
-        logger.info(
-            f"✅ search_examples retornó {len(hits)} resultados",
-            source="retrieval",
-            hits_count=len(hits),
-        )
 
-        # Convertir hits a DocumentScore (para LangGraph)
-        raw_documents = []
-        for rank, hit in enumerate(hits, 1):
-            # Enriquecer metadata con un campo "ref" clicable si es posible
-            md = hit.get("metadata", {}) or {}
-            path = md.get("file_path") or hit.get("path") or ""
-            pages = md.get("pages") or md.get("page")
-
-            # --- LÓGICA DE GENERACIÓN DE ENLACES (S3 vs LOCAL) ---
-            ref = ""
-            s3_bucket = os.getenv("S3_DATA_BUCKET_NAME")
-            aws_region = os.getenv(
-                "AWS_DEFAULT_REGION", "eu-west-1"
-            )  # Región por defecto si no está definida
-
-            if path:
-                if s3_bucket:
-                    # ☁️ MODO NUBE (S3)
-                    # El path indexado viene como "/app/data/pdfs/..." (ruta Docker)
-                    # Lo convertimos a "data/pdfs/..." (Key de S3)
-                    clean_key = path.replace("/app/", "", 1).lstrip("/")
-
-                    # Construimos la URL pública de S3
-                    # Formato: https://BUCKET.s3.REGION.amazonaws.com/KEY
-                    ref = (
-                        f"https://{s3_bucket}.s3.{aws_region}.amazonaws.com/{clean_key}"
-                    )
-
-                    # Si es un PDF y tenemos página, añadimos el ancla #page=X para que el navegador vaya directo
-                    if pages and clean_key.endswith(".pdf"):
-                        ref += f"#page={pages}"
+async def aretrieve_documents(state: AgentState) -> AgentState:
+    """
+    Versión asíncrona de retrieve_documents (AsyncQdrantClient, sin bloquear el event loop).
+    """
+    question = state["question"]
+    k_max = state["k_docs"] + EXTRA_CANDIDATES
+    threshold = state["threshold"]
 
-                else:
-                    # 💻 MODO LOCAL (Visor API)
-                    # Mantiene la compatibilidad para cuando desarrollas en tu máquina
-                    base_url = SETTINGS.API_URL
-                    rel_path = ""
-                    if "data/" in path.replace("\\", "/"):
-                        # Extraer desde data/docs/ en adelante
-                        rel_path = path.replace("\\", "/").split("data/", 1)[-1]
-                        # Codificamos la ruta para la URL del visor local
-                        ref = f"{base_url.rstrip('/')}/viewer/{rel_path.replace('/', '%2F')}"
-                    else:
-                        ref = f"{base_url.rstrip('/')}/{path}"
-
-            # Guardar ref en metadata para que el Frontend lo pinte
-            if ref:
-                try:
-                    md["ref"] = ref
-                except Exception:
-                    pass
-
-            doc_score = DocumentScore(
-                content=hit.get("content", ""),
-                metadata=md,
-                relevance_score=float(hit.get("score", 0.0)),  # Score de Qdrant
-                source=hit.get("path", "unknown"),
-                collection=hit.get("collection", "unknown"),
-                line_number=None,
-            )
-            raw_documents.append(doc_score)
-
-            logger.debug(
-                f"Documento {rank} convertido a DocumentScore",
-                source="retrieval",
-                score=doc_score.relevance_score,
-                source_file=doc_score.source,
-            )
+    if state.get("prefetched_hits") is not None:
+        return _apply_hits(state, state["prefetched_hits"])
 
+    lexical_hits = await _alexical_hits(state, question)
+    if lexical_hits:
+        return _apply_hits(state, lexical_hits)
+
+    if not has_budget(state):
+        return _deadline_exceeded(state)
+
+    try:
         logger.info(
-            f"✅ Búsqueda completada",
+            " - Iniciando búsqueda async",
             source="retrieval",
-            documents_found=len(raw_documents),
-            scores=[f"{d.relevance_score:.3f}" for d in raw_documents[:5]],
+            question=question[:100],
+            k_max=k_max,
         )
 
-        # Actualizar estado
-        state["raw_documents"] = raw_documents
-        state["documents"] = [doc.content for doc in raw_documents]
-        # Propagar el campo `ref` en los metadatos
-        state["documents_metadata"] = [
-            {
-                "metadata": doc.metadata,
-                "source": doc.source,
-                "score": doc.relevance_score,
-                "collection": doc.collection,
-                "ref": doc.metadata.get("ref", ""),  # Incluir el enlace clicable
-            }
-            for doc in raw_documents
-        ]
-        state["messages"].append(
-            f"📚 Recuperados {len(raw_documents)} documentos crudos"
+        # El embedding corre en un hilo: wait_for acota también ese tramo
+        hits = await asyncio.wait_for(
+            async_search_all_collections(
+                query=question,
+                collections=ALL_COLLECTIONS,
+                k_per_collection=k_max,
+                threshold=threshold,
+                timeout=qdrant_timeout(state),
+                fetch_k=state["k_docs"],
+            ),
+            timeout=remaining(state),
         )
-
-        return state
+        return _apply_hits(state, hits)
 
     except Exception as e:
-        logger.error(
-            f"❌ Error durante la recuperación de documentos",
-            source="retrieval",
-            error=str(e),
-            error_type=type(e).__name__,
-            question=question[:100],
-        )
-        state["messages"].append(f"❌ Error en recuperación: {str(e)}")
-        state["raw_documents"] = []
-        return state
+        return _retrieval_failed(state, question, e)
@@ -0,0 +1,81 @@
+# src/Agent/nodes/semantic_cache.py
+"""
+Caché semántica en el grafo: lookup tras classify_intent (un acierto va
+directo a END sin Qdrant ni LLM) y guardado del resultado final.
+"""
+from typing import Any, Dict, Literal
+
+from src.Agent.state import AgentState
+from src.services.embeddings import encode_query
+from src.services.semantic_cache import semantic_cache
+from config.logger_config import logger
+
+# Campos del resultado que se reutilizan en un acierto
+CACHED_FIELDS = (
+    "answer",
+    "template_code",
+    "explanation",
+    "response_action",
+    "raw_documents",
+    "documents",
+    "documents_metadata",
+)
+CACHEABLE_ACTIONS = {"generate_answer", "return_template", "hybrid_response"}
+
+
+def _has_history(state: Dict[str, Any]) -> bool:
+    # La generación incluye chat_history en el prompt: la clave de la caché no lo
+    # contempla, así que las conversaciones con historial no leen ni guardan
+    return bool(state.get("chat_history"))
+
+
+def lookup_semantic_cache(state: AgentState) -> AgentState:
+    """Reutiliza recuperación y respuesta de una pregunta equivalente ya respondida."""
+    state["semantic_cache_hit"] = False
+    if not semantic_cache.enabled or state.get("prefetched_hits") is not None or _has_history(state):
+        return state
+
+    try:
+        embedding = encode_query(state["question"])
+        cached = semantic_cache.get(embedding, state["intent"], state["k_docs"], state["threshold"])
+    except Exception as e:
+        logger.warning(f"⚠️ Error consultando la caché semántica: {e}", source="semantic_cache")
+        return state
+    if cached is None:
+        return state
+
+    value, similarity, cached_question = cached
+    state.update(value)
+    state["semantic_cache_hit"] = True
+    state["messages"].append(f"♻️ Respuesta de caché semántica (similitud {similarity:.3f})")
+    logger.info("♻️ Acierto en caché semántica", source="semantic_cache", similarity=round(similarity, 4), cached_question=cached_question[:80], question=state["question"][:80])
+    return state
+
+
+def after_semantic_cache(state: AgentState) -> Literal["hit", "miss"]:
+    return "hit" if state.get("semantic_cache_hit") else "miss"
+
+
+def store_in_semantic_cache(result: Dict[str, Any]) -> None:
+    """Guarda un resultado final completo (sin errores, fallbacks ni respuestas parciales)."""
+    if (
+        not semantic_cache.enabled
+        or result.get("semantic_cache_hit")
+        or result.get("prefetched_hits") is not None
+        or _has_history(result)
+        or not result.get("is_valid_scope")
+        or result.get("response_action") not in CACHEABLE_ACTIONS
+        or any(msg.startswith(("❌", "⚠️")) for msg in result.get("messages", []))
+    ):
+        return
+    try:
+        semantic_cache.set(
+            encode_query(result["question"]),
+            result["question"],
+            result["intent"],
+            result["k_docs"],
+            result["threshold"],
+            {field: result.get(field) for field in CACHED_FIELDS},
+        )
+    except Exception as e:
+        logger.warning(f"⚠️ Error guardando en la caché semántica: {e}", source="semantic_cache")
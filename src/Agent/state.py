@@ -23,6 +23,7 @@ class AgentState(TypedDict):
     question: str
     original_question: Optional[str]               # Pregunta original sin modificar para contexto en memoria
     chat_history: Optional[List[Dict[str, str]]]   # Historial de conversación (role: user/assistant, content: texto)
+    deadline: Optional[float]            # Deadline de la petición (time.monotonic); None = sin límite
     k_docs: int                          # Número de documentos a recuperar  
     threshold: float                     # Umbral de puntuación para filtrar documentos  
     # Scope Validation
@@ -35,8 +36,12 @@ class AgentState(TypedDict):
     target_collections: List[str]        # Colecciones donde buscar
     response_action: str                 # Acción: generate_answer, return_template, hybrid_response
     intent_scores: Dict[str, float]      # Scores de cada intent
+
+    # Caché semántica
+    semantic_cache_hit: bool             # Respuesta reutilizada de una pregunta equivalente
     
     # Retrieval
+    prefetched_hits: Optional[List[Dict[str, Any]]]  # Hits precalculados (búsqueda batch); si existen no se busca
     raw_documents: List[DocumentScore]
     documents: List[str]
     documents_metadata: List[Dict[str, Any]]
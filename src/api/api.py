@@ -1,27 +1,75 @@
 import os
+import json
+import asyncio
 import time
-from fastapi import FastAPI, HTTPException
+import dataclasses
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 import sys
 
-from fastapi.responses import FileResponse
-from src.Agent.graph import Agent
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST
+from src.Agent.graph import get_agent
+from src.Agent.budget import deadline_from_timeout
+from src.Agent.nodes.retrieval import ALL_COLLECTIONS, EXTRA_CANDIDATES
+from src.services.search import async_search_all_collections_batch
+from src.services.singleflight import SingleFlight, query_key
+from src.services.warmup import WARMUP, cached_collection_counts, run_warmup
+from src.services.response_cache import ResponseCache
+from src.services.admission import AdmissionController, AdmissionRejected
+from src.services.metrics import (
+    CACHE_LOOKUPS,
+    REJECTIONS,
+    REQUEST_LATENCY,
+    observe_result,
+    render_metrics,
+)
+from src.services.prefork import process_memory
 
 sys.path.append("/app")  # Asegura que /app esté en PYTHONPATH
 from config.config import SETTINGS
 from config.logger_config import logger
 
 # OpenAI (v1 SDK). Si no hay API key, haremos fallback.
+from src.api.file_server import serve_file
+from src.api.responses import json_response, project_sources
 from src.api.schemas import (
+    BatchQueryItem,
+    BatchQueryRequest,
+    BatchQueryResponse,
     HealthResponse,
+    ReadinessResponse,
     QueryRequest,
     QueryResponse,
 )
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Construye y compila el grafo una sola vez al arrancar la API."""
+    agent = get_agent()
+    logger.info(
+        "🧠 Grafo del agente listo",
+        source="api",
+        duration=f"{agent.build_time_ms / 1000:.3f}s",
+        build_time_ms=round(agent.build_time_ms, 2),
+    )
+
+    # Warmup en segundo plano: /health responde ya, /ready cuando todo está caliente
+    warmup_task = None
+    if SETTINGS.WARMUP_ENABLED:
+        warmup_task = asyncio.create_task(run_warmup(ALL_COLLECTIONS))
+    yield
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+
+
 app = FastAPI(
     title="Terraform RAG Assistant API",
     description="API para consultar documentacion de Terraform usando RAG con LangGraph",
     version="2.0.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -32,6 +80,76 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Coalescing de consultas idénticas en curso (por proceso)
+query_coalescer = SingleFlight()
+
+# Caché de respuestas completas (por proceso)
+response_cache = ResponseCache(
+    max_size=SETTINGS.RESPONSE_CACHE_SIZE, ttl_s=SETTINGS.RESPONSE_CACHE_TTL_S
+)
+
+# Control de admisión: ejecuciones concurrentes del agente + cola acotada (por proceso)
+admission = AdmissionController(
+    max_concurrent=SETTINGS.MAX_CONCURRENT_QUERIES,
+    max_queue=SETTINGS.MAX_QUEUED_QUERIES,
+    max_wait_s=SETTINGS.MAX_QUEUE_WAIT_S,
+    retry_after_s=SETTINGS.ADMISSION_RETRY_AFTER_S,
+)
+
+# Campos del resultado del grafo que usa /query (lo que se cachea)
+CACHED_RESULT_FIELDS = (
+    "answer",
+    "raw_documents",
+    "documents",
+    "is_valid_scope",
+    "intent",
+    "response_action",
+)
+
+
+def _is_cacheable(result: dict) -> bool:
+    """No se cachean respuestas que han pasado por errores o fallbacks."""
+    return not any(
+        msg.startswith(("❌", "⚠️")) for msg in result.get("messages", [])
+    )
+
+
+def _request_deadline(http_request: Request, timeout_ms: Optional[int], start: float) -> Optional[float]:
+    """
+    Deadline de la petición (time.monotonic): campo timeout_ms, cabecera
+    X-Request-Timeout-Ms o DEFAULT_REQUEST_TIMEOUT_MS, en ese orden.
+    """
+    if timeout_ms is None:
+        header = http_request.headers.get("x-request-timeout-ms")
+        if header:
+            try:
+                timeout_ms = int(header)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="X-Request-Timeout-Ms debe ser un entero (ms)")
+        else:
+            timeout_ms = SETTINGS.DEFAULT_REQUEST_TIMEOUT_MS
+    return deadline_from_timeout(timeout_ms, start)
+
+
+async def _run_agent(key: str, question: str, k: int, threshold: float, chat_history, deadline: Optional[float] = None) -> dict:
+    """Ejecuta el agente (con admisión) y guarda la respuesta en la caché si procede."""
+    async with admission.slot():
+        result = await get_agent().ainvoke(question, k, threshold, chat_history=chat_history, deadline=deadline)
+    if _is_cacheable(result):
+        response_cache.set(key, {f: result.get(f) for f in CACHED_RESULT_FIELDS})
+    return result
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    """Respuesta rápida 429 cuando el servicio está saturado"""
+    REJECTIONS.labels(reason=exc.reason).inc()
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc), "reason": exc.reason},
+        headers={"Retry-After": str(exc.retry_after_s)},
+    )
+
+
 # Endpoints
 
 
@@ -43,32 +161,77 @@ async def health():
     return {"status": "ok"}
 
 
+@app.get("/metrics")
+async def metrics():
+    """Métricas en formato Prometheus"""
+    return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.get("/viewer/{path:path}")
-def serve_doc(path: str):
-    file_path = os.path.join("data", path)
-    if not os.path.exists(file_path):
-        return {"error": "File not found", "path": file_path}
-    return FileResponse(file_path)
+def serve_doc(path: str, request: Request):
+    """Visor de documentos de data/ (ETag/304, Range para PDFs y caché de ficheros pequeños)"""
+    return serve_file(request, path)
+
+
+async def _documents_count() -> tuple:
+    """(estado de Qdrant, nº por colección, total); con timeout y caché corta"""
+    try:
+        counts = await cached_collection_counts(ALL_COLLECTIONS)
+        return "connected", counts, sum(counts.values())
+    except Exception as e:
+        logger.warning(f"⚠️ No se pudo contar documentos: {e or type(e).__name__}", source="api")
+        return "disconnected", {}, None
+
+
+@app.get("/ready", response_model=ReadinessResponse)
+async def ready():
+    """
+    Readiness: 200 solo cuando el warmup ha dejado listos los componentes
+    necesarios (clasificador, embeddings, Qdrant); si no, 503. Los que fallen
+    en el arranque se reintentan en segundo plano (ver run_warmup).
+    Con WARMUP_ENABLED=false los componentes se cargan en la primera consulta:
+    basta con que Qdrant responda. Con el sidecar de embeddings como dependencia
+    dura (EMBEDDING_SIDECAR_FALLBACK=fail), además debe responder el sidecar.
+    """
+    vector_db_status, counts, total = await _documents_count()
+    is_ready = WARMUP.ready if SETTINGS.WARMUP_ENABLED else vector_db_status == "connected"
+    components = dict(WARMUP.components)
+    if SETTINGS.EMBEDDING_BATCHER == "sidecar":
+        from src.services.embedding_batcher import sidecar_status
+        components["embedding_sidecar"] = await asyncio.to_thread(sidecar_status)
+        if SETTINGS.EMBEDDING_SIDECAR_FALLBACK != "local":
+            is_ready = is_ready and components["embedding_sidecar"]["ready"]
+    body = ReadinessResponse(
+        ready=is_ready,
+        warmup_finished=WARMUP.finished,
+        components=components,
+        collections=counts,
+        documents_count=total,
+    )
+    return JSONResponse(status_code=200 if is_ready else 503, content=body.model_dump())
 
 
 @app.get("/", response_model=HealthResponse)
 async def root():
     """Health check endpoint"""
+    vector_db_status, _, total = await _documents_count()
     return HealthResponse(
         status="healthy",
         message="Terraform RAG Assistant API LangGraph",
-        vector_db_status="connected",
-        documents_count=None,
+        vector_db_status=vector_db_status,
+        documents_count=total,
+        graph_build_ms=round(get_agent().build_time_ms, 2),
     )
 
 
 @app.post("/api/query", response_model=QueryResponse)  # Llamadas de AWS
 @app.post("/query", response_model=QueryResponse)  # Llamadas en local
-async def query_endpoint(request: QueryRequest):
+async def query_endpoint(request: QueryRequest, http_request: Request):
     """
     Endpoint principal - Ejecuta el Agent de LangGraph
     """
     start_time = time.time()
+    deadline = _request_deadline(http_request, request.timeout_ms, time.monotonic())
 
     try:
 
@@ -87,23 +250,44 @@ async def query_endpoint(request: QueryRequest):
 
         # 2) Invocar agente
         try:
-            agent = Agent()
-            result = agent.invoke(
-                request.question, k, threshold, chat_history=request.chat_history
-            )
+            key = query_key(request.question, k, threshold, request.chat_history)
+            result = response_cache.get(key)
+            cached = result is not None
+            CACHE_LOOKUPS.labels(result="hit" if cached else "miss").inc()
+            if not cached:
+                # Si se une a una ejecución en curso, espera solo lo que le queda de su propio deadline
+                wait_s = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    result = await query_coalescer.do(
+                        key,
+                        lambda: _run_agent(
+                            key, request.question, k, threshold, request.chat_history, deadline
+                        ),
+                        timeout=wait_s,
+                    )
+                except asyncio.TimeoutError:
+                    logger.warning("⏱️ Deadline agotado esperando una consulta idéntica en curso", source="api")
+                    raise HTTPException(
+                        status_code=504, detail="Deadline agotado esperando una consulta idéntica en curso"
+                    )
 
             # Extraer respuestas del estado del grafo
             answer = result.get("answer", "")
+            observe_result(result)
             response_time_ms = (time.time() - start_time) * 1000
+            REQUEST_LATENCY.labels(endpoint="query").observe(response_time_ms / 1000)
             logger.info(
                 "Respuesta generada",
                 source="api",
+                cache_hit=cached,
                 intent=result.get("intent"),
                 action=result.get("response_action"),
                 is_valid_scope=result.get("is_valid_scope"),
                 docs_count=len(result.get("documents", [])),
                 response_time_ms=round(response_time_ms, 2),
             )
+        except (AdmissionRejected, HTTPException):
+            raise
         except Exception as e:
             logger.error(
                 f"❌ Error al llamar al agente: {e}",
@@ -136,14 +320,21 @@ async def query_endpoint(request: QueryRequest):
                 error_type="Exception",
             )
 
-        # 4) Respuesta
-        return QueryResponse(
-            answer=answer,
-            sources=sources,
-            question=request.question,
-            context=result.get("context_hist", []),
+        # 4) Respuesta (orjson + gzip; fuentes proyectadas si se pidió source_fields)
+        if request.source_fields is not None:
+            sources = project_sources(sources, request.source_fields)
+        return json_response(
+            http_request,
+            {
+                "answer": answer,
+                "sources": sources,
+                "question": request.question,
+                "context": result.get("context_hist", []),
+            },
         )
 
+    except (AdmissionRejected, HTTPException):
+        raise
     except Exception as e:
         logger.error(
             "❌ Error crítico",
@@ -155,6 +346,188 @@ async def query_endpoint(request: QueryRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/query/batch", response_model=BatchQueryResponse)  # Llamadas de AWS
+@app.post("/query/batch", response_model=BatchQueryResponse)  # Llamadas en local
+async def query_batch_endpoint(request: BatchQueryRequest):
+    """
+    Endpoint batch - N preguntas en una llamada.
+    Un único encode batch + una query batch por colección, y las etapas
+    LLM del grafo con concurrencia acotada.
+    """
+    start_time = time.time()
+    questions = request.questions
+    if len(questions) > SETTINGS.BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Máximo {SETTINGS.BATCH_MAX_QUESTIONS} preguntas por lote",
+        )
+
+    k = request.k_docs or SETTINGS.K_DOCS
+    threshold = request.threshold or SETTINGS.THRESHOLD
+    max_concurrency = min(request.max_concurrency or SETTINGS.BATCH_MAX_CONCURRENCY, SETTINGS.BATCH_MAX_CONCURRENCY)
+    logger.info(
+        f"📨 Nueva consulta batch",
+        source="api",
+        questions=len(questions),
+        k=k,
+        threshold=threshold,
+        max_concurrency=max_concurrency,
+    )
+
+    # Cada pregunta ocupa su propio hueco de admisión (el lote no cuenta como una sola
+    # ejecución); con la cola ya llena se rechaza el lote entero con 429
+    admission.check()
+
+    # 1) Retrieval compartido (si falla, o falla alguna colección, los hits son None
+    #    y cada pregunta busca por su cuenta en el grafo)
+    try:
+        async with admission.slot():
+            hits_per_question = await async_search_all_collections_batch(
+                questions, ALL_COLLECTIONS, k + EXTRA_CANDIDATES, threshold
+            )
+    except AdmissionRejected:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Error en búsqueda batch: {e}", source="api", error_type=type(e).__name__)
+        hits_per_question = [None] * len(questions)
+    retrieval_time_ms = (time.time() - start_time) * 1000
+
+    # 2) Etapas LLM con concurrencia acotada
+    agent = get_agent()
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def run_one(question: str, hits) -> BatchQueryItem:
+        async with semaphore:
+            item_start = time.time()
+            try:
+                async with admission.slot():
+                    result = await agent.ainvoke(
+                        question, k, threshold, chat_history=[], prefetched_hits=hits
+                    )
+                observe_result(result)
+                return BatchQueryItem(
+                    question=question,
+                    answer=result.get("answer", ""),
+                    sources=result.get("raw_documents", []),
+                    response_time_ms=round((time.time() - item_start) * 1000, 2),
+                )
+            except Exception as e:
+                logger.error(f"❌ Error en pregunta del lote: {e}", source="api", question=question[:100])
+                return BatchQueryItem(
+                    question=question,
+                    answer="",
+                    response_time_ms=round((time.time() - item_start) * 1000, 2),
+                    error=str(e),
+                )
+
+    results = await asyncio.gather(
+        *(run_one(q, hits) for q, hits in zip(questions, hits_per_question))
+    )
+
+    total_time_ms = (time.time() - start_time) * 1000
+    REQUEST_LATENCY.labels(endpoint="query_batch").observe(total_time_ms / 1000)
+    logger.info(
+        "Lote completado",
+        source="api",
+        questions=len(questions),
+        errors=sum(1 for r in results if r.error),
+        retrieval_time_ms=round(retrieval_time_ms, 2),
+        response_time_ms=round(total_time_ms, 2),
+    )
+    return BatchQueryResponse(
+        results=results,
+        retrieval_time_ms=round(retrieval_time_ms, 2),
+        total_time_ms=round(total_time_ms, 2),
+    )
+
+
+def _sse(event: str, data: dict) -> str:
+    """Formatea un evento Server-Sent Events."""
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+@app.post("/api/query/stream")  # Llamadas de AWS
+@app.post("/query/stream")  # Llamadas en local
+async def query_stream_endpoint(request: QueryRequest, http_request: Request):
+    """
+    Endpoint en streaming (SSE) - Emite el progreso del grafo
+    (scope, intent, documents), los tokens del LLM según llegan
+    y al final las fuentes (sources) y un evento done.
+    """
+    logger.info(
+        f"📨 Nueva consulta en streaming",
+        source="api",
+        question=request.question,
+        k_docs=request.k_docs,
+        threshold=request.threshold,
+    )
+    k = request.k_docs or SETTINGS.K_DOCS
+    threshold = request.threshold or SETTINGS.THRESHOLD
+    deadline = _request_deadline(http_request, request.timeout_ms, time.monotonic())
+
+    # Rechazo rápido antes de abrir el stream (el 429 llega como respuesta HTTP normal);
+    # el hueco se reserva dentro del generador para liberarlo siempre al terminar
+    admission.check()
+
+    async def event_stream():
+        start_time = time.time()
+        try:
+            await admission.acquire()
+        except AdmissionRejected as e:
+            REJECTIONS.labels(reason=e.reason).inc()
+            yield _sse("error", {"detail": str(e), "reason": e.reason})
+            return
+        try:
+            agent = get_agent()
+            async for event, data in agent.astream(
+                request.question, k, threshold, chat_history=request.chat_history, deadline=deadline
+            ):
+                if event != "final":
+                    yield _sse(event, data)
+                    continue
+
+                sources = [
+                    dataclasses.asdict(doc) for doc in data.get("raw_documents", [])
+                ]
+                yield _sse("sources", {"sources": sources})
+                observe_result(data)
+                response_time_ms = (time.time() - start_time) * 1000
+                REQUEST_LATENCY.labels(endpoint="query_stream").observe(response_time_ms / 1000)
+                logger.info(
+                    "Respuesta en streaming completada",
+                    source="api",
+                    intent=data.get("intent"),
+                    action=data.get("response_action"),
+                    docs_count=len(sources),
+                    response_time_ms=round(response_time_ms, 2),
+                )
+                yield _sse(
+                    "done",
+                    {
+                        "question": request.question,
+                        "intent": data.get("intent"),
+                        "response_action": data.get("response_action"),
+                        "response_time_ms": round(response_time_ms, 2),
+                    },
+                )
+        except Exception as e:
+            logger.error(
+                f"❌ Error en streaming: {e}",
+                source="api",
+                error_type=type(e).__name__,
+            )
+            yield _sse("error", {"detail": str(e)})
+        finally:
+            admission.release()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 # Endpoints de debug
 @app.post("/debug/test-search")
 async def debug_test_search(question: str = "What is terraform?"):
@@ -235,11 +608,42 @@ async def debug_vector_store_search(question: str = "What is terraform?"):
         return {"error": str(e), "error_type": type(e).__name__}
 
 
+@app.get("/debug/coalescing")
+async def debug_coalescing():
+    """Contadores del coalescing de consultas idénticas"""
+    return query_coalescer.stats()
+
+
+@app.get("/debug/cache")
+async def debug_cache():
+    """Métricas de la caché de respuestas"""
+    return response_cache.stats()
+
+
+@app.get("/debug/semantic-cache")
+async def debug_semantic_cache():
+    """Métricas de la caché semántica (paráfrasis)"""
+    from src.services.semantic_cache import semantic_cache
+    return semantic_cache.stats()
+
+
+@app.get("/debug/admission")
+async def debug_admission():
+    """Profundidad de cola, ejecuciones en curso y rechazos"""
+    return admission.stats()
+
+
+@app.get("/debug/memory")
+async def debug_memory():
+    """Memoria de este worker (MB, /proc): pss es la parte que le corresponde de lo compartido"""
+    return {"pid": os.getpid(), **process_memory()}
+
+
 @app.get("/debug/embeddings-model")
 async def debug_embeddings_model():
     """Verifica qué modelo de embeddings está en uso"""
     try:
-        from src.services.embeddings import embeddings_model
+        from src.services.embeddings import embeddings_model, get_model_name, query_cache
 
         logger.info(f"📦 Info modelo embeddings", source="api")
 
@@ -247,6 +651,9 @@ async def debug_embeddings_model():
             "status": "ok",
             "model": str(embeddings_model),
             "model_type": type(embeddings_model).__name__,
+            "loaded_model": get_model_name(),
+            "backend": SETTINGS.EMBEDDINGS_BACKEND,
+            "query_cache": query_cache.stats(),
         }
     except Exception as e:
         logger.error(f"❌ Error verificando embeddings: {e}", source="api")
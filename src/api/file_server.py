@@ -0,0 +1,193 @@
+"""
+Servido de ficheros del visor (/viewer).
+
+- Rutas normalizadas y confinadas a la carpeta data/
+- Peticiones condicionales (ETag / Last-Modified → 304)
+- HTTP Range (los visores PDF piden solo los bytes necesarios)
+- Cabeceras de caché
+- Caché en memoria acotada (LRU) para ficheros pequeños de texto (.md, .tf, ...)
+"""
+import os
+import mimetypes
+import threading
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+
+from config.config import SETTINGS
+
+DATA_DIR = Path(os.getenv("VIEWER_DATA_DIR", "data")).resolve()
+CACHEABLE_SUFFIXES = {".md", ".tf", ".tfvars", ".txt", ".yaml", ".yml", ".json"}
+TEXT_MEDIA_TYPES = {
+    ".md": "text/markdown; charset=utf-8",
+    ".tf": "text/plain; charset=utf-8",
+    ".tfvars": "text/plain; charset=utf-8",
+}
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class _SmallFileCache:
+    """LRU de contenidos de ficheros pequeños, indexado por (ruta, mtime, tamaño)."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, int, int], bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: Path, stat: os.stat_result) -> bytes:
+        key = (str(path), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            content = self._entries.get(key)
+            if content is not None:
+                self._entries.move_to_end(key)
+                return content
+
+        content = path.read_bytes()
+        with self._lock:
+            self._entries[key] = content
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return content
+
+
+_cache = _SmallFileCache(SETTINGS.VIEWER_CACHE_MAX_ENTRIES)
+
+
+def resolve_data_path(path: str) -> Optional[Path]:
+    """
+    Resuelve una ruta del visor dentro de data/.
+    Devuelve None si no existe o si intenta salir de data/ (../, rutas absolutas, symlinks).
+    """
+    if not path or "\x00" in path:
+        return None
+    candidate = (DATA_DIR / path.lstrip("/\\")).resolve()
+    if candidate != DATA_DIR and DATA_DIR not in candidate.parents:
+        return None
+    if not candidate.is_file():
+        return None
+    return candidate
+
+
+def _media_type(path: Path) -> str:
+    suffix = path.suffix.lower()
+    if suffix in TEXT_MEDIA_TYPES:
+        return TEXT_MEDIA_TYPES[suffix]
+    return mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+
+
+def _not_modified(request: Request, etag: str, stat: os.stat_result) -> bool:
+    """Evalúa If-None-Match / If-Modified-Since"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(stat.st_mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _parse_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parsea un único rango 'bytes=a-b' / 'bytes=a-' / 'bytes=-n'.
+    Devuelve (inicio, fin) inclusivo, None si se ignora (multi-rango o formato no soportado)
+    o lanza ValueError si no es satisfacible.
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    start_s, sep, end_s = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if start_s:
+            start = int(start_s)
+            end = int(end_s) if end_s else size - 1
+        else:
+            suffix = int(end_s)
+            if suffix <= 0:
+                raise ValueError("Rango vacío")
+            start, end = max(0, size - suffix), size - 1
+    except ValueError:
+        raise ValueError("Rango no válido")
+    end = min(end, size - 1)
+    if start > end or start >= size:
+        raise ValueError("Rango no satisfacible")
+    return start, end
+
+
+def _iter_file(path: Path, start: int, length: int):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def serve_file(request: Request, path: str) -> Response:
+    """Sirve un fichero de data/ con soporte de caché HTTP y Range"""
+    file_path = resolve_data_path(path)
+    if file_path is None:
+        return JSONResponse(status_code=404, content={"error": "File not found", "path": path})
+
+    stat = file_path.stat()
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    media_type = _media_type(file_path)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Cache-Control": f"public, max-age={SETTINGS.VIEWER_MAX_AGE_S}",
+        "Accept-Ranges": "bytes",
+    }
+
+    if _not_modified(request, etag, stat):
+        return Response(status_code=304, headers=headers)
+
+    cacheable = (
+        file_path.suffix.lower() in CACHEABLE_SUFFIXES
+        and stat.st_size <= SETTINGS.VIEWER_CACHE_MAX_FILE_BYTES
+    )
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or if_range.strip() == etag):
+        try:
+            byte_range = _parse_range(range_header, stat.st_size)
+        except ValueError:
+            return Response(
+                status_code=416,
+                headers={**headers, "Content-Range": f"bytes */{stat.st_size}"},
+            )
+        if byte_range is not None:
+            start, end = byte_range
+            length = end - start + 1
+            range_headers = {
+                **headers,
+                "Content-Range": f"bytes {start}-{end}/{stat.st_size}",
+                "Content-Length": str(length),
+            }
+            if cacheable:
+                content = _cache.get(file_path, stat)[start:end + 1]
+                return Response(content, status_code=206, headers=range_headers, media_type=media_type)
+            return StreamingResponse(
+                _iter_file(file_path, start, length),
+                status_code=206,
+                headers=range_headers,
+                media_type=media_type,
+            )
+
+    if cacheable:
+        return Response(_cache.get(file_path, stat), headers=headers, media_type=media_type)
+    return FileResponse(file_path, headers=headers, media_type=media_type)
@@ -0,0 +1,94 @@
+"""
+Serialización compacta de respuestas.
+
+- Proyección de fuentes: solo los campos pedidos en `source_fields`
+- JSON con orjson (sin pasar por la validación de pydantic)
+- gzip para cuerpos grandes si el cliente lo acepta (sin GZipMiddleware,
+  que afectaría también al streaming SSE)
+"""
+import gzip
+import os
+from typing import Any, Dict, Iterable, List
+
+import orjson
+from fastapi import Request
+from fastapi.responses import Response
+
+from config.config import SETTINGS
+from src.Agent.state import DocumentScore
+
+
+def _name(doc: DocumentScore) -> str:
+    md = doc.metadata or {}
+    return (
+        md.get("name")
+        or md.get("example_name")
+        or md.get("source")
+        or os.path.basename(md.get("file_path", "") or doc.source or "")
+    )
+
+
+# Campo proyectado -> extractor sobre DocumentScore
+SOURCE_FIELDS = {
+    "name": _name,
+    "ref": lambda d: (d.metadata or {}).get("ref", ""),
+    "score": lambda d: d.relevance_score,
+    "section": lambda d: (d.metadata or {}).get("section", ""),
+    "pages": lambda d: (d.metadata or {}).get("pages") or (d.metadata or {}).get("page", ""),
+    "path": lambda d: (d.metadata or {}).get("file_path") or d.source,
+    "collection": lambda d: d.collection,
+    "doc_type": lambda d: (d.metadata or {}).get("doc_type", ""),
+    "content": lambda d: d.content,
+    "metadata": lambda d: d.metadata,
+}
+
+
+def project_sources(sources: Iterable[DocumentScore], fields: List[str]) -> List[Dict[str, Any]]:
+    """Reduce cada fuente a un dict plano con los campos pedidos"""
+    extractors = [(f, SOURCE_FIELDS[f]) for f in fields]
+    return [{f: extract(doc) for f, extract in extractors} for doc in sources]
+
+
+def _default(obj: Any) -> Any:
+    """Tipos que orjson no serializa de forma nativa (p.ej. escalares numpy)"""
+    if hasattr(obj, "item"):
+        return obj.item()
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    return str(obj)
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """
+    True si Accept-Encoding admite gzip con q > 0 (explícito o vía '*').
+    'gzip;q=0' lo rechaza aunque '*' lo admita.
+    """
+    explicit = wildcard = None
+    for item in accept_encoding.lower().split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding in ("gzip", "x-gzip"):
+            explicit = q
+        elif coding == "*":
+            wildcard = q
+    q = explicit if explicit is not None else wildcard
+    return q is not None and q > 0
+
+
+def json_response(request: Request, content: Any, status_code: int = 200) -> Response:
+    """Respuesta JSON con orjson, comprimida con gzip si es grande y el cliente lo acepta"""
+    body = orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    headers = {"Vary": "Accept-Encoding"}
+
+    if accepts_gzip(request.headers.get("accept-encoding", "")) and len(body) >= SETTINGS.RESPONSE_GZIP_MIN_BYTES:
+        body = gzip.compress(body, compresslevel=SETTINGS.RESPONSE_GZIP_LEVEL)
+        headers["Content-Encoding"] = "gzip"
+
+    return Response(body, status_code=status_code, headers=headers, media_type="application/json")
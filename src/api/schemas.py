@@ -1,6 +1,6 @@
-from typing import List, Optional, Dict
+from typing import Any, List, Optional, Dict, Union
 from datetime import datetime
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 from config.config import SETTINGS
 from src.Agent.state import DocumentScore
 
@@ -12,6 +12,28 @@ class QueryRequest(BaseModel):
     k_docs: Optional[int] = Field(default=3, description="Número de documentos a recuperar")
     threshold: Optional[float] = Field(default=None, description="Umbral de puntuación para filtrar documentos")
     temperature: Optional[float] = Field(default=0.0, description="Temperatura del LLM")
+    timeout_ms: Optional[int] = Field(
+        default=None,
+        gt=0,
+        description="Deadline de la petición en ms (también cabecera X-Request-Timeout-Ms). "
+                    "Si se agota, se responde con un template o solo con los documentos",
+    )
+    source_fields: Optional[List[str]] = Field(
+        default=None,
+        description="Campos de cada fuente a devolver (name, ref, score, section, pages, path, collection, doc_type, content, metadata). "
+                    "Si se omite, se devuelven las fuentes completas",
+    )
+
+    @field_validator("source_fields")
+    @classmethod
+    def _check_source_fields(cls, value):
+        if value is None:
+            return value
+        from src.api.responses import SOURCE_FIELDS
+        unknown = [f for f in value if f not in SOURCE_FIELDS]
+        if unknown:
+            raise ValueError(f"Campos de fuente no soportados: {unknown}. Válidos: {sorted(SOURCE_FIELDS)}")
+        return list(dict.fromkeys(value))
 
 
 class SourceInfo(BaseModel):
@@ -26,14 +48,60 @@ class SourceInfo(BaseModel):
 class QueryResponse(BaseModel):
     """Modelo para la respuesta del agente"""
     answer: str = Field(..., description="Respuesta generada por el agente")
-    sources: List[DocumentScore] = Field(..., description="Fuentes consultadas")
+    sources: List[Union[DocumentScore, Dict[str, Any]]] = Field(..., description="Fuentes consultadas (proyectadas si se pidió source_fields)")
     question: str = Field(..., description="Pregunta original")
     context: Optional[List[Dict[str, str]]] = Field(default=[], description="Contexto adicional (historial de conversación)")
 
 
+class BatchQueryRequest(BaseModel):
+    """Modelo para la petición de consultas en lote"""
+    questions: List[str] = Field(..., description="Preguntas para el agente RAG")
+    k_docs: Optional[int] = Field(default=3, description="Número de documentos a recuperar por pregunta")
+    threshold: Optional[float] = Field(default=None, description="Umbral de puntuación para filtrar documentos")
+    max_concurrency: Optional[int] = Field(
+        default=None,
+        ge=1,
+        le=SETTINGS.BATCH_MAX_CONCURRENCY,
+        description=f"Máximo de preguntas en las etapas LLM a la vez (1-{SETTINGS.BATCH_MAX_CONCURRENCY})",
+    )
+
+
+class BatchQueryItem(BaseModel):
+    """Resultado de una pregunta dentro de un lote"""
+    question: str
+    answer: str
+    sources: List[DocumentScore] = []
+    response_time_ms: float = Field(..., description="Tiempo del grafo para esta pregunta")
+    error: Optional[str] = None
+
+
+class BatchQueryResponse(BaseModel):
+    """Modelo para la respuesta de consultas en lote"""
+    results: List[BatchQueryItem]
+    retrieval_time_ms: float = Field(..., description="Tiempo de embedding + búsqueda batch compartida")
+    total_time_ms: float
+
+
+class ComponentStatus(BaseModel):
+    """Estado de calentamiento de un componente"""
+    ready: bool
+    duration_ms: float
+    error: Optional[str] = None
+
+
+class ReadinessResponse(BaseModel):
+    """Modelo para el readiness check"""
+    ready: bool
+    warmup_finished: bool
+    components: Dict[str, ComponentStatus] = {}
+    collections: Dict[str, int] = {}
+    documents_count: Optional[int] = None
+
+
 class HealthResponse(BaseModel):
     """Modelo para el health check"""
     status: str
     message: str
     vector_db_status: str
-    documents_count: Optional[int] = None
\ No newline at end of file
+    documents_count: Optional[int] = None
+    graph_build_ms: Optional[float] = None  # Coste único de compilar el grafo en el arranque
\ No newline at end of file
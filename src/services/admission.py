@@ -0,0 +1,100 @@
+"""
+Control de admisión para la ejecución del agente.
+
+Limita las ejecuciones concurrentes y mantiene una cola de espera acotada.
+Si la cola está llena, o la espera supera el máximo, la petición se rechaza
+enseguida (429 + Retry-After) en lugar de acumularse sobre el LLM y el modelo de embeddings.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Dict, Any
+
+from config.logger_config import logger
+from src.services.metrics import ADMISSION_IN_FLIGHT, ADMISSION_QUEUE_DEPTH
+
+
+class AdmissionRejected(Exception):
+    """La petición no se admite (cola llena o espera agotada)"""
+
+    def __init__(self, reason: str, retry_after_s: int):
+        super().__init__(f"Servicio saturado ({reason}), reintenta en {retry_after_s}s")
+        self.reason = reason
+        self.retry_after_s = retry_after_s
+
+
+class AdmissionController:
+    """Semáforo de concurrencia + cola de espera acotada."""
+
+    def __init__(self, max_concurrent: int, max_queue: int, max_wait_s: float, retry_after_s: int):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.max_wait_s = max_wait_s
+        self.retry_after_s = retry_after_s
+        self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+
+    def check(self) -> None:
+        """Rechazo rápido (sin reservar hueco) si la cola ya está llena"""
+        if self._semaphore.locked() and self.queued >= self.max_queue:
+            self.rejected_queue_full += 1
+            logger.warning("🚦 Petición rechazada: cola llena", source="api", queued=self.queued, in_flight=self.in_flight)
+            raise AdmissionRejected("queue_full", self.retry_after_s)
+
+    async def acquire(self) -> None:
+        """Espera un hueco o lanza AdmissionRejected"""
+        if self._semaphore.locked():
+            self.check()
+            self.queued += 1
+            self._publish()
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.max_wait_s)
+            except asyncio.TimeoutError:
+                self.rejected_timeout += 1
+                logger.warning("🚦 Petición rechazada: espera máxima superada", source="api", max_wait_s=self.max_wait_s)
+                raise AdmissionRejected("queue_timeout", self.retry_after_s)
+            finally:
+                self.queued -= 1
+                self._publish()
+        else:
+            await self._semaphore.acquire()
+
+        self.in_flight += 1
+        self.admitted += 1
+        self._publish()
+
+    def release(self) -> None:
+        """Libera el hueco ocupado con acquire()"""
+        self.in_flight -= 1
+        self._semaphore.release()
+        self._publish()
+
+    def _publish(self) -> None:
+        """Actualiza los gauges (explícito para que funcione también en modo multiproceso)"""
+        ADMISSION_QUEUE_DEPTH.set(self.queued)
+        ADMISSION_IN_FLIGHT.set(self.in_flight)
+
+    @asynccontextmanager
+    async def slot(self):
+        """Context manager: acquire() ... release()"""
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Estado actual y contadores de rechazo"""
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "max_wait_s": self.max_wait_s,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+        }
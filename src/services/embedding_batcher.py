@@ -0,0 +1,310 @@
+"""
+Micro-batching de embeddings de consulta.
+
+Las peticiones concurrentes de /query codifican cada una un solo texto; aquí
+se encolan, un hilo las agrupa durante como mucho EMBEDDING_BATCH_MAX_WAIT_MS
+(o hasta EMBEDDING_BATCH_MAX_SIZE textos), hace un único encode y resuelve el
+Future de cada llamada. Una petición aislada espera como mucho ese margen.
+
+Modos (EMBEDDING_BATCHER):
+- "local": batcher dentro del proceso de la API.
+- "sidecar": proceso aparte que comparten varios workers por un socket Unix;
+  los workers no cargan el modelo. Si el sidecar no responde, según
+  EMBEDDING_SIDECAR_FALLBACK: "fail" (dependencia dura: la consulta falla y
+  /ready da 503) o "local" (el worker carga el modelo y codifica él mismo).
+
+    python -m src.services.embedding_batcher serve --socket /tmp/rag-embeddings.sock
+"""
+import argparse
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from config.config import SETTINGS
+from config.logger_config import logger
+from src.services.metrics import EMBEDDING_BATCH_SIZE
+
+# Mensajes del socket: longitud (uint32 big-endian) + cuerpo
+_LENGTH = struct.Struct(">I")
+_SHAPE = struct.Struct(">II")
+# Tras un fallo del sidecar, con fallback local, no se reintenta antes de esto
+SIDECAR_RETRY_S = 5.0
+
+
+class EmbeddingBatcher:
+    """Agrupa encodes concurrentes en lotes; cada llamada recibe su fila por un Future."""
+
+    def __init__(self, encode_fn: Callable[[List[str]], np.ndarray], max_batch_size: int, max_wait_ms: float):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_s = max_wait_ms / 1000
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        """Encola un texto; el Future se resuelve con su embedding (vector float32)"""
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def encode(self, text: str, timeout: Optional[float] = None) -> np.ndarray:
+        future = self.submit(text)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise
+
+    def _collect(self) -> list:
+        """Primer elemento (bloqueante) + lo que llegue antes del plazo o hasta llenar el lote"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait_s
+        while len(batch) < self.max_batch_size:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=left))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            # Los cancelados (timeout del llamante) no se codifican
+            batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            EMBEDDING_BATCH_SIZE.observe(len(batch))
+            try:
+                embeddings = self.encode_fn([text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), embedding in zip(batch, embeddings):
+                future.set_result(embedding.copy())
+
+
+class SidecarClient:
+    """Cliente del sidecar de embeddings (una conexión por hilo)."""
+
+    def __init__(self, socket_path: str, timeout_s: float):
+        self.socket_path = socket_path
+        self.timeout_s = timeout_s
+        self._local = threading.local()
+
+    def _connection(self) -> socket.socket:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            conn.settimeout(self.timeout_s)
+            conn.connect(self.socket_path)
+            self._local.conn = conn
+        return conn
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Embeddings de los textos (ya con prefijo) calculados por el sidecar"""
+        try:
+            conn = self._connection()
+            _send(conn, json.dumps({"texts": texts}).encode("utf-8"))
+            body = _recv(conn)
+        except OSError:
+            # Conexión rota (sidecar reiniciado): la siguiente llamada reconecta
+            conn = getattr(self._local, "conn", None)
+            self._local.conn = None
+            if conn is not None:
+                conn.close()
+            raise
+        if body[:1] == b"{":
+            raise RuntimeError(json.loads(body).get("error", "error en el sidecar de embeddings"))
+        rows, dim = _SHAPE.unpack_from(body)
+        return np.frombuffer(body, dtype=np.float32, offset=_SHAPE.size).reshape(rows, dim)
+
+    def ping(self, timeout_s: float = 1.0) -> bool:
+        """True si el sidecar acepta conexiones y responde (conexión propia, no la del hilo)"""
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+                conn.settimeout(timeout_s)
+                conn.connect(self.socket_path)
+                _send(conn, b'{"ping": true}')
+                return json.loads(_recv(conn)).get("ok") is True
+        except (OSError, ValueError):
+            return False
+
+
+def _send(conn: socket.socket, body: bytes) -> None:
+    conn.sendall(_LENGTH.pack(len(body)) + body)
+
+
+def _recv_exact(conn: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = conn.recv(size)
+        if not chunk:
+            raise ConnectionError("Conexión cerrada")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def _recv(conn: socket.socket, max_size: Optional[int] = None) -> bytes:
+    (size,) = _LENGTH.unpack(_recv_exact(conn, _LENGTH.size))
+    if max_size is not None and size > max_size:
+        raise ValueError(f"Mensaje de {size} bytes (máximo {max_size})")
+    return _recv_exact(conn, size)
+
+
+_batcher: Optional[EmbeddingBatcher] = None
+_client: Optional[SidecarClient] = None
+_sidecar_retry_at = 0.0
+_lock = threading.Lock()
+
+
+def get_batcher() -> EmbeddingBatcher:
+    """Batcher del proceso sobre el encode local (se crea la primera vez)"""
+    global _batcher
+    if _batcher is None:
+        with _lock:
+            if _batcher is None:
+                from src.services.embeddings import _encode
+                _batcher = EmbeddingBatcher(
+                    lambda texts: _encode(texts, "query"),
+                    SETTINGS.EMBEDDING_BATCH_MAX_SIZE,
+                    SETTINGS.EMBEDDING_BATCH_MAX_WAIT_MS,
+                )
+                logger.info("✅ Micro-batching de embeddings activo", source="search",
+                            max_batch_size=SETTINGS.EMBEDDING_BATCH_MAX_SIZE, max_wait_ms=SETTINGS.EMBEDDING_BATCH_MAX_WAIT_MS)
+    return _batcher
+
+
+def get_sidecar_client() -> SidecarClient:
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = SidecarClient(SETTINGS.EMBEDDING_SIDECAR_SOCKET, SETTINGS.EMBEDDING_ENCODE_TIMEOUT_S)
+    return _client
+
+
+def sidecar_encode(texts: List[str]) -> np.ndarray:
+    """
+    Encode por el sidecar. Si no responde (socket caído, timeout) y
+    EMBEDDING_SIDECAR_FALLBACK=local, se codifica en este proceso y no se vuelve
+    a probar el sidecar hasta pasados SIDECAR_RETRY_S; con "fail" el error se propaga.
+    """
+    global _sidecar_retry_at
+    fallback = SETTINGS.EMBEDDING_SIDECAR_FALLBACK == "local"
+    if not fallback or time.monotonic() >= _sidecar_retry_at:
+        try:
+            return get_sidecar_client().encode(texts)
+        except OSError as e:
+            if not fallback:
+                raise
+            _sidecar_retry_at = time.monotonic() + SIDECAR_RETRY_S
+            logger.warning(f"⚠️ Sidecar de embeddings no disponible, se codifica en el proceso: {e}", source="search", error_type=type(e).__name__)
+    from src.services.embeddings import _encode
+    return _encode(texts, "query")
+
+
+def sidecar_status() -> dict:
+    """Estado del sidecar para /ready (mismo formato que los componentes del warmup)"""
+    start = time.time()
+    ready = get_sidecar_client().ping()
+    return {
+        "ready": ready,
+        "duration_ms": round((time.time() - start) * 1000, 2),
+        "error": None if ready else f"Sin respuesta en {SETTINGS.EMBEDDING_SIDECAR_SOCKET}",
+    }
+
+
+def encode_query_text(text: str) -> np.ndarray:
+    """Embedding de un texto de consulta (con prefijo) por el modo configurado"""
+    if SETTINGS.EMBEDDING_BATCHER == "sidecar":
+        return sidecar_encode([text])[0]
+    return get_batcher().encode(text, timeout=SETTINGS.EMBEDDING_ENCODE_TIMEOUT_S)
+
+
+class _SidecarHandler(socketserver.BaseRequestHandler):
+    """Una conexión por hilo de cliente; cada texto pasa por el batcher compartido."""
+
+    def handle(self) -> None:
+        batcher = get_batcher()
+        while True:
+            try:
+                request = json.loads(_recv(self.request, SETTINGS.EMBEDDING_SIDECAR_MAX_REQUEST_BYTES))
+            except (ConnectionError, OSError):
+                return
+            except ValueError as e:
+                # Demasiado grande o no es JSON: el stream ya no está sincronizado, se cierra
+                logger.warning(f"⚠️ Petición rechazada por el sidecar de embeddings: {e}", source="search")
+                return
+            if request.get("ping"):
+                _send(self.request, b'{"ok": true}')
+                continue
+            try:
+                futures = [batcher.submit(text) for text in request["texts"]]
+                matrix = np.stack([f.result() for f in futures]).astype(np.float32, copy=False)
+                body = _SHAPE.pack(*matrix.shape) + matrix.tobytes()
+            except Exception as e:
+                logger.error(f"❌ Error en sidecar de embeddings: {e}", source="search", error_type=type(e).__name__)
+                body = json.dumps({"error": str(e)}).encode("utf-8")
+            _send(self.request, body)
+
+
+class _SidecarServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(socket_path: str) -> None:
+    """Arranca el sidecar: carga el modelo, lo calienta y atiende el socket"""
+    from src.services.embeddings import _encode
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    _encode(["query: warmup terraform azure"], "query")
+    mode = SETTINGS.EMBEDDING_SIDECAR_SOCKET_MODE
+    # El socket se crea ya con el modo restringido (sin ventana entre bind y chmod)
+    old_umask = os.umask(0o777 & ~mode)
+    try:
+        server = _SidecarServer(socket_path, _SidecarHandler)
+    finally:
+        os.umask(old_umask)
+    os.chmod(socket_path, mode)
+    with server:
+        logger.info("✅ Sidecar de embeddings escuchando", source="search", socket=socket_path, mode=oct(mode))
+        server.serve_forever()
+
+
+def _reset_after_fork() -> None:
+    """En el hijo: el hilo del batcher y las conexiones del padre no sirven"""
+    global _batcher, _client, _lock
+    _batcher = None
+    _client = None
+    _lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Sidecar de embeddings con micro-batching (socket Unix)")
+    parser.add_argument("command", choices=["serve"])
+    parser.add_argument("--socket", default=SETTINGS.EMBEDDING_SIDECAR_SOCKET)
+    args = parser.parse_args()
+    serve(args.socket)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -1,29 +1,220 @@
-# from langchain_google_genai import GoogleGenerativeAIEmbeddings
-# from langchain_openai import OpenAIEmbeddings
-# from langchain_huggingface import HuggingFaceEmbeddings
-# from dotenv import load_dotenv
-# load_dotenv()
-# from src.config import SETTINGS
-# import os
+"""
+Proveedor único de embeddings del proceso.
 
+Un solo SentenceTransformer (carga thread-safe) compartido por la búsqueda,
+vector_store y el indexador, para que consultas y pasajes se codifiquen con
+el mismo modelo y la misma normalización:
 
+- consultas: prefijo e5 "query: " (con caché LRU de embeddings por texto normalizado)
+- documentos: sin prefijo (como se indexaron las colecciones existentes)
 
-# embeddings_model = OpenAIEmbeddings(
-#     model=SETTINGS.EMBEDDINGS_MODEL_NAME ,
-#     api_key=os.getenv("OPENAI_API_KEY")
-# )
+`embeddings_model` es el adaptador LangChain (Embeddings) para QdrantVectorStore.
 
-# # embeddings_model = HuggingFaceEmbeddings(
-# #     model_name="intfloat/multilingual-e5-small"
-# # )
+Backend (EMBEDDINGS_BACKEND): "torch" (SentenceTransformer) u "onnx"
+(ONNX Runtime int8, ver src/services/onnx_embeddings.py; no importa torch).
+Las consultas pueden pasar por micro-batching (EMBEDDING_BATCHER, ver
+src/services/embedding_batcher.py).
+"""
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
 
+import numpy as np
 from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
+
 from config.config import SETTINGS
-from langchain_huggingface import HuggingFaceEmbeddings
+from config.logger_config import logger
+from src.services.metrics import EMBEDDING_CACHE_LOOKUPS, EMBEDDING_LATENCY
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
 
 load_dotenv()
 
-embeddings_model = HuggingFaceEmbeddings(
-    model_name=SETTINGS.EMBEDDINGS_MODEL_NAME or "intfloat/multilingual-e5-small",
-    encode_kwargs={"normalize_embeddings": True},
-)
+QUERY_PREFIX = "query: "
+
+_model: Optional["SentenceTransformer"] = None
+_model_name: Optional[str] = None
+_lock = threading.Lock()
+
+
+def resolve_model_name() -> str:
+    """Modelo del manifest (el usado al indexar) o, si no hay manifest, el de SETTINGS"""
+    from src.services.manifest import get_embeddings_model_name
+    try:
+        return get_embeddings_model_name()
+    except Exception:
+        return SETTINGS.EMBEDDINGS_MODEL_NAME or "intfloat/multilingual-e5-small"
+
+
+def get_embeddings_model(model_name: Optional[str] = None) -> "SentenceTransformer":
+    """SentenceTransformer compartido; solo el primer hilo que llega lo carga"""
+    global _model, _model_name
+    if _model is not None:
+        return _model
+
+    with _lock:
+        if _model is None:
+            from sentence_transformers import SentenceTransformer
+            model_name = model_name or resolve_model_name()
+            try:
+                logger.info("🔄 Cargando modelo de embeddings", source="search", model_name=model_name)
+                _model = SentenceTransformer(model_name)
+                _model_name = model_name
+                logger.info("✅ Modelo de embeddings cargado", source="search", model_name=model_name)
+            except Exception as e:
+                logger.error(f"❌ Error cargando modelo: {e}", source="search",
+                            model_name=model_name, error_type=type(e).__name__)
+                raise
+    return _model
+
+
+def _get_onnx_encoder():
+    """Encoder ONNX compartido (registra el nombre del modelo como el de torch)"""
+    global _model_name
+    from src.services.onnx_embeddings import get_onnx_encoder
+    encoder = get_onnx_encoder(resolve_model_name())
+    _model_name = encoder.model_name
+    return encoder
+
+
+def get_model_name() -> Optional[str]:
+    """Nombre del modelo cargado (None si aún no se ha cargado)"""
+    return _model_name
+
+
+def _encode(texts: List[str], mode: str) -> np.ndarray:
+    if SETTINGS.EMBEDDINGS_BACKEND == "onnx":
+        encoder = _get_onnx_encoder()
+        with EMBEDDING_LATENCY.labels(mode=mode).time():
+            return encoder.encode(texts)
+
+    model = get_embeddings_model()
+    with EMBEDDING_LATENCY.labels(mode=mode).time():
+        embeddings = model.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+    return np.asarray(embeddings, dtype=np.float32)
+
+
+def normalize_query_text(query: str) -> str:
+    """
+    Normalización para la clave de la caché: NFC + espacios colapsados.
+    No se pasa a minúsculas: el tokenizador de e5 distingue mayúsculas.
+    """
+    return " ".join(unicodedata.normalize("NFC", query).split())
+
+
+class QueryEmbeddingCache:
+    """LRU acotada de embeddings de consulta, clave (modelo, texto normalizado)."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Tuple[str, str]) -> Optional[np.ndarray]:
+        if self.max_size <= 0:
+            return None
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        EMBEDDING_CACHE_LOOKUPS.labels(result="miss" if embedding is None else "hit").inc()
+        return embedding
+
+    def set(self, key: Tuple[str, str], embedding: np.ndarray) -> None:
+        if self.max_size <= 0:
+            return
+        # Compartido entre peticiones: de solo lectura
+        embedding.setflags(write=False)
+        with self._lock:
+            self._entries[key] = embedding
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+query_cache = QueryEmbeddingCache(SETTINGS.QUERY_EMBEDDING_CACHE_SIZE)
+
+
+def _query_key(query: str) -> Tuple[str, str]:
+    return (_model_name or resolve_model_name(), normalize_query_text(query))
+
+
+def _encode_query_texts(texts: List[str], mode: str) -> np.ndarray:
+    """Encode de consultas (ya con prefijo) según EMBEDDING_BATCHER: directo, micro-batching o sidecar"""
+    if SETTINGS.EMBEDDING_BATCHER == "sidecar":
+        from src.services.embedding_batcher import sidecar_encode
+        return sidecar_encode(texts)
+    if SETTINGS.EMBEDDING_BATCHER == "local" and len(texts) == 1:
+        from src.services.embedding_batcher import encode_query_text
+        return encode_query_text(texts[0])[None, :]
+    return _encode(texts, mode)
+
+
+def encode_query(query: str) -> np.ndarray:
+    """Embedding de una consulta (vector float32, de solo lectura si viene de la caché)"""
+    key = _query_key(query)
+    embedding = query_cache.get(key)
+    if embedding is None:
+        embedding = _encode_query_texts([QUERY_PREFIX + key[1]], "query")[0].copy()
+        query_cache.set(key, embedding)
+    return embedding
+
+
+def encode_queries(queries: List[str]) -> np.ndarray:
+    """Embeddings de varias consultas; solo las que no están en caché pasan por el modelo"""
+    keys = [_query_key(q) for q in queries]
+    cached = [query_cache.get(key) for key in keys]
+    missing = [i for i, embedding in enumerate(cached) if embedding is None]
+    if missing:
+        encoded = _encode_query_texts([QUERY_PREFIX + keys[i][1] for i in missing], "batch")
+        for i, embedding in zip(missing, encoded):
+            embedding = embedding.copy()  # fila propia, no una vista de la matriz del batch
+            query_cache.set(keys[i], embedding)
+            cached[i] = embedding
+    return np.stack(cached) if cached else np.empty((0, 0), dtype=np.float32)
+
+
+def encode_documents(texts: List[str]) -> np.ndarray:
+    """Embeddings de pasajes a indexar (matriz float32)"""
+    return _encode(list(texts), "documents")
+
+
+class SharedEmbeddings(Embeddings):
+    """Adaptador LangChain sobre el modelo compartido."""
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return encode_documents(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return encode_query(text).tolist()
+
+    def __repr__(self) -> str:
+        return f"SharedEmbeddings(model_name={get_model_name() or resolve_model_name()!r}, backend={SETTINGS.EMBEDDINGS_BACKEND!r})"
+
+
+embeddings_model = SharedEmbeddings()
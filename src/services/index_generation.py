@@ -0,0 +1,61 @@
+"""
+Generación del índice vectorial.
+
+Cada vez que se reescriben las colecciones de Qdrant (rag_indexer vía vector_store)
+se actualiza un fichero marcador. Las cachés guardan la generación con la que se
+creó cada entrada y la descartan cuando cambia, también entre procesos
+(el indexador corre en un proceso distinto al de la API).
+"""
+import os
+import time
+import threading
+from pathlib import Path
+
+from config.logger_config import logger
+
+INDEX_GENERATION_PATH = Path(os.getenv("INDEX_GENERATION_PATH", "data/.index_generation"))
+CHECK_INTERVAL_S = float(os.getenv("INDEX_GENERATION_CHECK_INTERVAL_S", "1.0"))
+
+_lock = threading.Lock()
+_cached_generation = "0"
+_last_check = 0.0
+
+
+def _read_generation() -> str:
+    """Lee la generación del marcador ('0' si aún no se ha indexado nada)"""
+    try:
+        stat = INDEX_GENERATION_PATH.stat()
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
+    except FileNotFoundError:
+        return "0"
+
+
+def get_index_generation() -> str:
+    """
+    Generación actual del índice.
+    Como mucho un stat() del marcador por CHECK_INTERVAL_S.
+    """
+    global _cached_generation, _last_check
+    now = time.monotonic()
+    if now - _last_check < CHECK_INTERVAL_S:
+        return _cached_generation
+    with _lock:
+        if now - _last_check >= CHECK_INTERVAL_S:
+            _cached_generation = _read_generation()
+            _last_check = now
+    return _cached_generation
+
+
+def bump_index_generation() -> str:
+    """Marca que las colecciones han cambiado (invalida las cachés dependientes)"""
+    global _cached_generation, _last_check
+    with _lock:
+        try:
+            INDEX_GENERATION_PATH.parent.mkdir(parents=True, exist_ok=True)
+            INDEX_GENERATION_PATH.write_text(str(time.time_ns()), encoding="utf-8")
+        except OSError as e:
+            logger.warning(f"⚠️ No se pudo actualizar la generación del índice: {e}", source="qdrant", path=str(INDEX_GENERATION_PATH))
+        _cached_generation = _read_generation()
+        _last_check = time.monotonic()
+    logger.info("🔁 Generación del índice actualizada", source="qdrant", generation=_cached_generation)
+    return _cached_generation
@@ -0,0 +1,281 @@
+"""
+Índice léxico en memoria para identificadores exactos de Terraform.
+
+Muchas consultas nombran un tipo de recurso concreto (azurerm_storage_account,
+azurerm_cdn_frontdoor_profile...). Si la consulta contiene un identificador
+conocido, la recuperación se responde desde aquí: BM25 sobre el texto de los
+chunks + mapa exacto tipo de recurso -> chunks (resource_types / azure_resources
+que extrae MetadataEnricher al indexar). Sin embedding ni round-trip a Qdrant.
+
+El score de un hit léxico es BM25 relativo al mejor hit (0-1], no un coseno:
+los hits van marcados (metadata["retrieval"] == "lexical") para que no se
+comparen con el threshold de la búsqueda densa (p. ej. al decidir si se
+devuelve un template tal cual).
+
+El índice se construye recorriendo (scroll) los payloads de Qdrant y se
+reconstruye en segundo plano cuando cambia la generación del índice; mientras
+no está listo, la búsqueda densa es el camino normal.
+"""
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Set
+
+from config.config import SETTINGS
+from config.logger_config import logger
+from src.services.index_generation import get_index_generation
+from src.services.metrics import LEXICAL_LOOKUPS
+
+TOKEN_RE = re.compile(r"[a-z0-9_]+")
+IDENTIFIER_RE = re.compile(r"\bazurerm_[a-z0-9_]+\b")
+
+# Parámetros BM25 estándar
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Peso extra por cada identificador de la consulta declarado en los metadatos del chunk
+EXACT_MATCH_BOOST = 10.0
+SCROLL_BATCH = 256
+# Tras un fallo de construcción (Qdrant caído) no se reintenta antes de esto
+REBUILD_RETRY_S = 30.0
+# Valor de metadata["retrieval"] en los hits de este índice
+LEXICAL_RETRIEVAL = "lexical"
+
+
+def tokenize(text: str) -> List[str]:
+    """Tokens en minúsculas; los identificadores con '_' se mantienen enteros"""
+    return TOKEN_RE.findall(text.lower())
+
+
+def is_lexical_hit(metadata: Optional[Dict[str, Any]]) -> bool:
+    """True si el documento viene del índice léxico (su score no es comparable con el threshold denso)"""
+    return (metadata or {}).get("retrieval") == LEXICAL_RETRIEVAL
+
+
+def _resource_types(metadata: Dict[str, Any]) -> Set[str]:
+    types = {t.lower() for t in metadata.get("resource_types") or [] if isinstance(t, str)}
+    types.update(f"azurerm_{r.lower()}" for r in metadata.get("azure_resources") or [] if isinstance(r, str))
+    return types
+
+
+class LexicalIndex:
+    """BM25 + mapa exacto de tipos de recurso sobre los chunks indexados."""
+
+    def __init__(self, generation: str):
+        self.generation = generation
+        self.docs: List[Dict[str, Any]] = []
+        self._lengths: List[int] = []
+        self._postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self._resources: Dict[str, Set[int]] = defaultdict(set)
+        self._idf: Dict[str, float] = {}
+        self._avg_length = 0.0
+
+    def add(self, collection: str, point_id: Any, payload: Dict[str, Any]) -> None:
+        """Añade un punto de Qdrant (mismo formato de hit que search._collect_hits)"""
+        metadata = payload.get("metadata") or {}
+        content = payload.get("page_content") or ""
+        doc_id = len(self.docs)
+        self.docs.append({
+            "id": point_id,
+            "name": metadata.get("name", metadata.get("source", "N/A")),
+            "section": metadata.get("section", ""),
+            "pages": metadata.get("pages", "-"),
+            "path": metadata.get("path", metadata.get("file_path", "N/A")),
+            "doc_type": metadata.get("doc_type", "unknown"),
+            "tags": metadata.get("tags", []),
+            "metadata": metadata,
+            "collection": collection,
+            "content": content,
+        })
+
+        tokens = tokenize(content)
+        self._lengths.append(len(tokens))
+        for token, tf in Counter(tokens).items():
+            self._postings[token][doc_id] = tf
+        for resource in _resource_types(metadata):
+            self._resources[resource].add(doc_id)
+
+    def finalize(self) -> "LexicalIndex":
+        """Calcula idf y longitud media (llamar tras el último add)"""
+        n = len(self.docs)
+        self._avg_length = (sum(self._lengths) / n) if n else 0.0
+        self._idf = {
+            token: math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for token, postings in self._postings.items()
+        }
+        self._postings = dict(self._postings)
+        self._resources = dict(self._resources)
+        return self
+
+    def identifiers(self, query: str) -> List[str]:
+        """Identificadores de la consulta que existen en el índice"""
+        return [
+            ident for ident in dict.fromkeys(IDENTIFIER_RE.findall(query.lower()))
+            if ident in self._resources or ident in self._postings
+        ]
+
+    def _bm25(self, doc_id: int, tokens: List[str]) -> float:
+        length_norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[doc_id] / (self._avg_length or 1.0))
+        score = 0.0
+        for token in tokens:
+            tf = self._postings.get(token, {}).get(doc_id)
+            if tf:
+                score += self._idf[token] * tf * (BM25_K1 + 1) / (tf + length_norm)
+        return score
+
+    def search(self, query: str, k: int, min_relative_score: float = 0.0, collections: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Hits (mayor score primero) de los chunks que contienen o declaran algún
+        identificador de la consulta. score = BM25 (+ boost exacto) / el del
+        mejor hit, en (0, 1]; se descartan los que no llegan a min_relative_score.
+        El BM25 sin normalizar va en metadata["lexical_score"].
+        [] si la consulta no contiene identificadores conocidos.
+        """
+        identifiers = self.identifiers(query)
+        if not identifiers:
+            return []
+
+        candidates: Set[int] = set()
+        for ident in identifiers:
+            candidates.update(self._resources.get(ident, ()))
+            candidates.update(self._postings.get(ident, {}))
+        if collections is not None:
+            candidates = {doc_id for doc_id in candidates if self.docs[doc_id]["collection"] in collections}
+
+        tokens = list(dict.fromkeys(tokenize(query)))
+        raw = []
+        for doc_id in candidates:
+            exact = sum(1 for ident in identifiers if doc_id in self._resources.get(ident, ()))
+            raw.append((self._bm25(doc_id, tokens) + EXACT_MATCH_BOOST * exact, doc_id))
+        raw.sort(reverse=True)
+        raw = raw[:k]
+
+        top = raw[0][0] if raw else 0.0
+        hits = []
+        for score, doc_id in raw:
+            relative = score / top if top > 0 else 1.0
+            if relative < min_relative_score:
+                break
+            doc = self.docs[doc_id]
+            hits.append({
+                **doc,
+                # Copia: quien consume el hit puede añadir campos (ref) sin tocar el índice
+                "metadata": {**doc["metadata"], "retrieval": LEXICAL_RETRIEVAL, "lexical_score": round(score, 4)},
+                "score": relative,
+            })
+        return hits
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "generation": self.generation,
+            "documents": len(self.docs),
+            "terms": len(self._postings),
+            "resource_types": len(self._resources),
+        }
+
+
+def build_lexical_index(collections: List[str]) -> LexicalIndex:
+    """Recorre los payloads de las colecciones en Qdrant y construye el índice"""
+    from src.services.qdrant_pool import get_qdrant_client
+    start = time.time()
+    generation = get_index_generation()
+    client = get_qdrant_client()
+    index = LexicalIndex(generation)
+    for collection in collections:
+        offset = None
+        while True:
+            points, offset = client.scroll(
+                collection_name=collection,
+                limit=SCROLL_BATCH,
+                offset=offset,
+                with_payload=True,
+                with_vectors=False,
+            )
+            for point in points:
+                index.add(collection, point.id, point.payload or {})
+            if offset is None:
+                break
+    index.finalize()
+    duration = time.time() - start
+    logger.info("✅ Índice léxico construido", source="search", duration=f"{duration:.2f}s", **index.stats())
+    return index
+
+
+_index: Optional[LexicalIndex] = None
+_building = False
+_last_failure = 0.0
+_lock = threading.Lock()
+
+
+def _rebuild(collections: List[str]) -> None:
+    global _index, _building, _last_failure
+    try:
+        _index = build_lexical_index(collections)
+    except Exception as e:
+        _last_failure = time.monotonic()
+        logger.warning(f"⚠️ No se pudo construir el índice léxico: {e}", source="search", error_type=type(e).__name__)
+    finally:
+        _building = False
+
+
+def ensure_lexical_index(collections: List[str], background: bool = True) -> Optional[LexicalIndex]:
+    """
+    Índice de la generación actual. Si falta o está desfasado se (re)construye,
+    en un hilo aparte por defecto; mientras tanto devuelve None (nunca uno desfasado).
+    """
+    global _building
+    index = _index
+    if index is not None and index.generation == get_index_generation():
+        return index
+
+    with _lock:
+        if _building or time.monotonic() - _last_failure < REBUILD_RETRY_S:
+            return None
+        _building = True
+    if background:
+        threading.Thread(target=_rebuild, args=(list(collections),), name="lexical-index", daemon=True).start()
+        return None
+    _rebuild(list(collections))
+    return _index
+
+
+def lexical_applies(query: str) -> bool:
+    """Comprobación barata: solo las consultas con un identificador azurerm_* van al índice léxico"""
+    return SETTINGS.LEXICAL_INDEX_ENABLED and IDENTIFIER_RE.search(query.lower()) is not None
+
+
+def lexical_search(query: str, collections: List[str], k: int) -> List[Dict[str, Any]]:
+    """
+    Camino rápido: hits del índice léxico si la consulta nombra un identificador
+    conocido; [] si no aplica (la llamada debe seguir con la búsqueda densa).
+    Los scores son léxicos relativos: no se filtran con el threshold denso.
+    """
+    if not lexical_applies(query):
+        return []
+
+    index = ensure_lexical_index(collections)
+    if index is None:
+        LEXICAL_LOOKUPS.labels(result="unavailable").inc()
+        return []
+
+    hits = index.search(query, k, SETTINGS.LEXICAL_MIN_RELATIVE_SCORE, collections)
+    LEXICAL_LOOKUPS.labels(result="hit" if hits else "miss").inc()
+    return hits
+
+
+def lexical_index_stats() -> Dict[str, Any]:
+    index = _index
+    return {"enabled": SETTINGS.LEXICAL_INDEX_ENABLED, "ready": index is not None, **(index.stats() if index else {})}
+
+
+def _reset_after_fork() -> None:
+    """En el hijo: el hilo de construcción del padre no existe"""
+    global _building, _lock
+    _building = False
+    _lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
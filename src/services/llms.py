@@ -2,6 +2,7 @@ from langchain_openai import ChatOpenAI
 from dotenv import load_dotenv
 
 from config.config import SETTINGS
+from src.services.metrics import LLMMetricsHandler
 
 load_dotenv()
 
@@ -9,5 +10,15 @@ load_dotenv()
 llm = ChatOpenAI(
     model=SETTINGS.LLM_MODEL_NAME,
     temperature=SETTINGS.LLM_TEMPERATURE,
-    max_retries=SETTINGS.LLM_MAX_RETRIES
+    max_retries=SETTINGS.LLM_MAX_RETRIES,
+    callbacks=[LLMMetricsHandler()],
+)
+
+# Variante sin reintentos para peticiones con deadline: el timeout lo marca
+# el tiempo restante (llm_no_retry.bind(timeout=...)) y un reintento no cabría
+llm_no_retry = ChatOpenAI(
+    model=SETTINGS.LLM_MODEL_NAME,
+    temperature=SETTINGS.LLM_TEMPERATURE,
+    max_retries=0,
+    callbacks=[LLMMetricsHandler()],
 )
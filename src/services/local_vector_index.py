@@ -0,0 +1,305 @@
+"""
+Motor vectorial embebido (búsqueda exacta) para corpus pequeños.
+
+El corpus (libro + ejemplos del manifest) son unos pocos miles de chunks: la
+búsqueda exacta en proceso evita el round-trip HTTP a Qdrant y el decode JSON
+de los payloads. Cada export es una versión en LOCAL_INDEX_DIR/<colección>/<versión>/:
+
+- vectors.npy    matriz float16 (filas normalizadas), memory-mapped
+- offsets.npy    offsets (int64) de cada payload en payloads.bin
+- payloads.bin   payloads (id + payload) en orjson, uno tras otro
+- meta.json      dimensión, nº de puntos, modelo y generación del índice
+
+y LOCAL_INDEX_DIR/<colección>.current apunta a la versión activa. El export
+escribe la versión completa y luego cambia el puntero con os.replace (atómico):
+un lector ve la versión anterior o la nueva, nunca una mezcla. Al cargar se
+comprueba que el modelo y la generación del meta son los actuales; si no, la
+colección se busca en Qdrant hasta el siguiente export.
+
+Top-k con matmul NumPy por bloques + argpartition; solo se decodifican los
+payloads de los k resultados. Se activa con VECTOR_BACKEND=local; Qdrant sigue
+siendo la fuente de verdad (el export sale de sus colecciones) y la opción
+para corpus grandes.
+
+    python -m src.services.local_vector_index export
+"""
+import argparse
+import json
+import mmap
+import os
+import shutil
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import orjson
+
+from config.config import SETTINGS
+from config.logger_config import logger
+from src.services.index_generation import get_index_generation
+
+# Filas por bloque de matmul (acota la copia float16 -> float32)
+BLOCK_ROWS = 16384
+SCROLL_BATCH = 256
+CHECK_INTERVAL_S = 5.0
+# Versiones que se conservan por colección (la activa y la anterior, que puede seguir mapeada)
+KEEP_VERSIONS = 2
+
+
+@dataclass
+class LocalPoint:
+    """Mismo contrato que los puntos de Qdrant que consume search._collect_hits"""
+    id: Any
+    score: float
+    payload: Optional[Dict[str, Any]]
+
+
+def _paths(version_dir: Path) -> Dict[str, Path]:
+    return {
+        kind: version_dir / f"{kind}.{ext}"
+        for kind, ext in (("vectors", "npy"), ("offsets", "npy"), ("payloads", "bin"), ("meta", "json"))
+    }
+
+
+def _pointer(directory: Path, collection: str) -> Path:
+    return directory / f"{collection}.current"
+
+
+def _read_pointer(directory: Path, collection: str) -> str:
+    """Versión activa de la colección (FileNotFoundError si nunca se ha exportado)"""
+    version = _pointer(directory, collection).read_text(encoding="utf-8").strip()
+    if not version or "/" in version or "\\" in version or version.startswith("."):
+        raise ValueError(f"Puntero de índice local no válido: {version!r}")
+    return version
+
+
+def _publish(directory: Path, collection: str, version: str) -> None:
+    """Activa una versión: puntero escrito aparte y sustituido con os.replace"""
+    pointer = _pointer(directory, collection)
+    tmp = pointer.with_name(f"{pointer.name}.{os.getpid()}.tmp")
+    tmp.write_text(version, encoding="utf-8")
+    os.replace(tmp, pointer)
+
+
+def _prune_versions(collection_dir: Path, current: str, keep: int = KEEP_VERSIONS) -> None:
+    """
+    Borra las versiones anteriores a la activa salvo las keep - 1 más recientes
+    (los nombres ordenan por fecha). Las posteriores a la activa (otro export
+    en curso) no se tocan.
+    """
+    older = sorted(p for p in collection_dir.iterdir() if p.is_dir() and p.name < current)
+    for old in older[:len(older) - (keep - 1)]:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+def export_collection(collection: str, directory: Optional[Path] = None, client=None) -> Dict[str, Any]:
+    """Vuelca vectores y payloads de una colección de Qdrant a una versión nueva y la activa"""
+    from src.services.embeddings import resolve_model_name
+
+    start = time.time()
+    # Antes del scroll: si se reindexa durante el export, este queda desfasado (y se descarta al cargar)
+    generation = get_index_generation()
+    model_name = resolve_model_name()
+    directory = Path(directory or SETTINGS.LOCAL_INDEX_DIR)
+    version = f"{time.time_ns():020d}"
+    version_dir = directory / collection / version
+    version_dir.mkdir(parents=True)
+    paths = _paths(version_dir)
+    if client is None:
+        from src.services.qdrant_pool import get_qdrant_client
+        client = get_qdrant_client()
+
+    try:
+        vectors: List[np.ndarray] = []
+        offsets: List[int] = []
+        position = 0
+        with open(paths["payloads"], "wb") as payloads_file:
+            offset = None
+            while True:
+                points, offset = client.scroll(
+                    collection_name=collection,
+                    limit=SCROLL_BATCH,
+                    offset=offset,
+                    with_payload=True,
+                    with_vectors=True,
+                )
+                for point in points:
+                    vector = point.vector
+                    if isinstance(vector, dict):  # colecciones con vectores con nombre
+                        vector = next(iter(vector.values()))
+                    vectors.append(np.asarray(vector, dtype=np.float32))
+                    record = orjson.dumps({"id": point.id, "payload": point.payload or {}})
+                    payloads_file.write(record)
+                    offsets.append(position)
+                    position += len(record)
+                if offset is None:
+                    break
+        offsets.append(position)
+
+        matrix = np.stack(vectors) if vectors else np.empty((0, 0), dtype=np.float32)
+        if len(matrix):
+            matrix /= np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+
+        np.save(paths["vectors"], matrix.astype(np.float16))
+        np.save(paths["offsets"], np.asarray(offsets, dtype=np.int64))
+        meta = {
+            "collection": collection,
+            "version": version,
+            "count": int(matrix.shape[0]),
+            "dim": int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+            "model_name": model_name,
+            "index_generation": generation,
+            "exported_at": time.time(),
+        }
+        paths["meta"].write_text(json.dumps(meta, indent=2), encoding="utf-8")
+    except BaseException:
+        # Versión a medias: nunca se publica
+        shutil.rmtree(version_dir, ignore_errors=True)
+        raise
+
+    _publish(directory, collection, version)
+    _prune_versions(directory / collection, version)
+
+    duration = time.time() - start
+    logger.info("✅ Índice vectorial local exportado", source="qdrant", collection=collection, version=version, count=meta["count"], dim=meta["dim"], duration=f"{duration:.2f}s")
+    return meta
+
+
+class LocalVectorIndex:
+    """Vectores (mmap float16) + payloads compactos de una colección exportada."""
+
+    def __init__(self, collection: str, version_dir: Path):
+        paths = _paths(version_dir)
+        self.collection = collection
+        self.version = version_dir.name
+        self.meta = json.loads(paths["meta"].read_text(encoding="utf-8"))
+        self.vectors = np.load(paths["vectors"], mmap_mode="r")
+        self.offsets = np.load(paths["offsets"])
+        with open(paths["payloads"], "rb") as f:
+            self._payloads = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.offsets[-1] else b""
+
+    def __len__(self) -> int:
+        return self.vectors.shape[0]
+
+    def _record(self, row: int) -> Dict[str, Any]:
+        return orjson.loads(self._payloads[self.offsets[row]:self.offsets[row + 1]])
+
+    def top_k(self, embedding: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(filas, scores) de los k más parecidos, mayor score primero"""
+        n = len(self)
+        if n == 0 or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = np.asarray(embedding, dtype=np.float32)
+        rows_parts, scores_parts = [], []
+        for start in range(0, n, BLOCK_ROWS):
+            scores = self.vectors[start:start + BLOCK_ROWS].astype(np.float32) @ query
+            if len(scores) > k:
+                top = np.argpartition(scores, -k)[-k:]
+                scores_parts.append(scores[top])
+                rows_parts.append(top + start)
+            else:
+                scores_parts.append(scores)
+                rows_parts.append(np.arange(start, start + len(scores)))
+        rows = np.concatenate(rows_parts)
+        scores = np.concatenate(scores_parts)
+        order = np.argsort(-scores)[:k]
+        return rows[order], scores[order]
+
+    def search(self, embedding: np.ndarray, k: int, score_threshold: Optional[float] = None, with_payload: bool = True) -> List[LocalPoint]:
+        """Top-k con el contrato de search_in_qdrant (puntos con id, score y payload)"""
+        rows, scores = self.top_k(embedding, k)
+        points = []
+        for row, score in zip(rows, scores):
+            if score_threshold is not None and score < score_threshold:
+                break
+            record = self._record(int(row))
+            points.append(LocalPoint(record["id"], float(score), record["payload"] if with_payload else None))
+        return points
+
+
+def _mismatch(meta: Dict[str, Any]) -> Optional[str]:
+    """Motivo por el que un export no sirve para las consultas actuales (None si sirve)"""
+    from src.services.embeddings import resolve_model_name
+    model_name = resolve_model_name()
+    if meta.get("model_name") != model_name:
+        return f"modelo {meta.get('model_name')!r}, se consulta con {model_name!r}"
+    if meta.get("index_generation") != get_index_generation():
+        return "generación del índice distinta (colecciones reindexadas tras el export)"
+    return None
+
+
+_indexes: Dict[str, LocalVectorIndex] = {}                 # último export cargado por colección
+_usable: Dict[str, Optional[LocalVectorIndex]] = {}        # ese export si es válido; None = Qdrant
+_last_check: Dict[str, float] = {}
+_lock = threading.Lock()
+
+
+def _load_current(collection: str) -> Optional[LocalVectorIndex]:
+    """Export activo de la colección (recargado si cambió el puntero); el anterior si falla"""
+    directory = Path(SETTINGS.LOCAL_INDEX_DIR)
+    index = _indexes.get(collection)
+    try:
+        version = _read_pointer(directory, collection)
+        if index is None or index.version != version:
+            index = LocalVectorIndex(collection, directory / collection / version)
+            _indexes[collection] = index
+            logger.info("✅ Índice vectorial local cargado", source="search", collection=collection, version=version, count=len(index))
+    except FileNotFoundError:
+        # Sin export (o borrado): se sigue con el ya cargado, si lo hay
+        pass
+    except (OSError, ValueError) as e:
+        # Puntero o versión corruptos (incluye json.JSONDecodeError)
+        logger.warning(f"⚠️ No se pudo cargar el índice vectorial local: {e}", source="search", collection=collection, error_type=type(e).__name__)
+    return index
+
+
+def get_local_index(collection: str) -> Optional[LocalVectorIndex]:
+    """
+    Índice local de la colección, o None si no hay export o no corresponde al
+    modelo / generación del índice actuales (la búsqueda va entonces a Qdrant).
+    Se revisa (puntero + meta) como mucho una vez por CHECK_INTERVAL_S.
+    """
+    now = time.monotonic()
+    if collection in _usable and now - _last_check.get(collection, 0.0) < CHECK_INTERVAL_S:
+        return _usable[collection]
+
+    with _lock:
+        if collection in _usable and now - _last_check.get(collection, 0.0) < CHECK_INTERVAL_S:
+            return _usable[collection]
+        index = _load_current(collection)
+        usable = index
+        if index is not None:
+            reason = _mismatch(index.meta)
+            if reason is not None:
+                usable = None
+                if _usable.get(collection, index) is not None:
+                    logger.warning(f"⚠️ Índice vectorial local descartado: {reason}; se busca en Qdrant", source="search", collection=collection, version=index.version)
+        _usable[collection] = usable
+        _last_check[collection] = now
+    return usable
+
+
+def local_search(collection: str, embedding: np.ndarray, k: int, score_threshold: Optional[float] = None, with_payload: bool = True) -> Optional[List[LocalPoint]]:
+    """Búsqueda en el índice local; None si la colección no está exportada"""
+    index = get_local_index(collection)
+    if index is None:
+        return None
+    return index.search(embedding, k, score_threshold, with_payload)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Exporta colecciones de Qdrant al índice vectorial local (float16 + mmap)")
+    parser.add_argument("command", choices=["export"])
+    parser.add_argument("--collections", nargs="+", default=["terraform_book", "examples_terraform"])
+    parser.add_argument("--dir", default=SETTINGS.LOCAL_INDEX_DIR)
+    args = parser.parse_args()
+    for collection in args.collections:
+        meta = export_collection(collection, Path(args.dir))
+        print(f"✅ {collection}: {meta['count']} vectores ({meta['dim']} dims)")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,111 @@
+"""
+Manifest de ejemplos (data/docs/examples/manifest.yaml) cacheado en memoria.
+
+Se parsea una vez y se sirve desde memoria; solo se vuelve a leer cuando
+cambia el fichero (mtime/tamaño, y el hash del contenido para no re-parsear
+si solo se ha tocado). Como mucho un stat() por CHECK_INTERVAL_S.
+Lo usan la búsqueda (nombre del modelo de embeddings) y el indexador (catálogo).
+"""
+import hashlib
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import yaml
+
+from config.logger_config import logger
+
+MANIFEST_PATH = Path(os.getenv("EXAMPLES_MANIFEST", "data/docs/examples/manifest.yaml"))
+CHECK_INTERVAL_S = float(os.getenv("MANIFEST_CHECK_INTERVAL_S", "5.0"))
+DEFAULT_EMBEDDINGS_MODEL = "intfloat/multilingual-e5-small"
+
+
+class ManifestCache:
+    """Manifest parseado + firma del fichero del que salió."""
+
+    def __init__(self, path: Path, check_interval_s: float = CHECK_INTERVAL_S):
+        self.path = Path(path)
+        self.check_interval_s = check_interval_s
+        self._lock = threading.Lock()
+        self._manifest: Optional[Dict[str, Any]] = None
+        self._signature: Optional[Tuple[int, int]] = None
+        self._digest: Optional[str] = None
+        self._last_check = 0.0
+        self.loads = 0
+
+    def _refresh(self) -> None:
+        """Relee el manifest si su firma ha cambiado (llamar con el lock)"""
+        stat = self.path.stat()
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature == self._signature:
+            return
+
+        raw = self.path.read_bytes()
+        digest = hashlib.sha1(raw).hexdigest()
+        if digest != self._digest:
+            self._manifest = yaml.safe_load(raw) or {}
+            self._digest = digest
+            self.loads += 1
+            logger.info("✅ Manifest cargado", source="search", manifest_path=str(self.path), loads=self.loads)
+        self._signature = signature
+
+    def get(self) -> Dict[str, Any]:
+        """
+        Manifest actual (compartido: no modificar el dict devuelto).
+        Si el fichero desaparece o no parsea tras haberse cargado, se sigue
+        sirviendo la última versión válida.
+        """
+        now = time.monotonic()
+        if self._manifest is not None and now - self._last_check < self.check_interval_s:
+            return self._manifest
+
+        with self._lock:
+            if self._manifest is None or now - self._last_check >= self.check_interval_s:
+                try:
+                    self._refresh()
+                except Exception as e:
+                    if self._manifest is None:
+                        logger.error(f"❌ Error cargando manifest: {e}", source="search", manifest_path=str(self.path), error_type=type(e).__name__)
+                        raise
+                    logger.warning(f"⚠️ Error recargando manifest, se mantiene la versión anterior: {e}", source="search", manifest_path=str(self.path))
+                self._last_check = now
+        return self._manifest
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": str(self.path),
+            "loads": self.loads,
+            "digest": self._digest,
+            "examples": len((self._manifest or {}).get("examples", [])),
+        }
+
+
+_caches: Dict[Path, ManifestCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_manifest_cache(path: Optional[Path] = None) -> ManifestCache:
+    """Caché del manifest de una ruta (por defecto EXAMPLES_MANIFEST)"""
+    key = Path(path or MANIFEST_PATH).resolve()
+    cache = _caches.get(key)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.setdefault(key, ManifestCache(key))
+    return cache
+
+
+def load_manifest(path: Optional[Path] = None) -> Dict[str, Any]:
+    """Manifest parseado (desde memoria salvo que el fichero haya cambiado)"""
+    return get_manifest_cache(path).get()
+
+
+def get_embeddings_model_name(path: Optional[Path] = None) -> str:
+    """Modelo de embeddings declarado en el manifest"""
+    return load_manifest(path).get("embeddings_model", DEFAULT_EMBEDDINGS_MODEL)
+
+
+def get_examples(path: Optional[Path] = None) -> List[Dict[str, Any]]:
+    """Catálogo de ejemplos del manifest"""
+    return load_manifest(path).get("examples", [])
@@ -0,0 +1,146 @@
+"""
+Métricas Prometheus del servicio (expuestas en /metrics).
+
+Histogramas de latencia (petición, nodos del grafo, embeddings, Qdrant, LLM)
+y contadores de resultados para construir dashboards de SLO sin parsear logs.
+
+Con varios workers (gunicorn) se define PROMETHEUS_MULTIPROC_DIR y /metrics
+agrega los valores de todos los procesos (ver render_metrics).
+"""
+import os
+import time
+from typing import Any, Dict
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+
+# Buckets (segundos): desde lookups de caché hasta generaciones largas del LLM
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+REQUEST_LATENCY = Histogram(
+    "rag_request_duration_seconds",
+    "Latencia total de las peticiones de consulta",
+    ["endpoint"],
+    buckets=LATENCY_BUCKETS,
+)
+NODE_LATENCY = Histogram(
+    "rag_node_duration_seconds",
+    "Latencia de cada nodo del grafo LangGraph",
+    ["node"],
+    buckets=LATENCY_BUCKETS,
+)
+EMBEDDING_LATENCY = Histogram(
+    "rag_embedding_encode_duration_seconds",
+    "Tiempo de encode del modelo de embeddings",
+    ["mode"],
+    buckets=LATENCY_BUCKETS,
+)
+EMBEDDING_BATCH_SIZE = Histogram(
+    "rag_embedding_batch_size",
+    "Textos por lote del micro-batching de embeddings de consulta",
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+QDRANT_LATENCY = Histogram(
+    "rag_qdrant_search_duration_seconds",
+    "Tiempo de búsqueda en Qdrant por colección",
+    ["collection"],
+    buckets=LATENCY_BUCKETS,
+)
+LLM_LATENCY = Histogram(
+    "rag_llm_call_duration_seconds",
+    "Tiempo de cada llamada al LLM",
+    ["node"],
+    buckets=LATENCY_BUCKETS,
+)
+
+RESPONSE_ACTIONS = Counter(
+    "rag_response_action_total",
+    "Respuestas por response_action (generate_answer, return_template, hybrid_response, partial_response, rejected)",
+    ["action"],
+)
+REJECTIONS = Counter(
+    "rag_rejections_total",
+    "Peticiones rechazadas por motivo (out_of_scope, queue_full, queue_timeout)",
+    ["reason"],
+)
+CACHE_LOOKUPS = Counter(
+    "rag_response_cache_lookups_total",
+    "Consultas a la caché de respuestas",
+    ["result"],
+)
+SEMANTIC_CACHE_LOOKUPS = Counter(
+    "rag_semantic_cache_lookups_total",
+    "Consultas a la caché semántica de respuestas",
+    ["result"],
+)
+EMBEDDING_CACHE_LOOKUPS = Counter(
+    "rag_query_embedding_cache_lookups_total",
+    "Consultas a la caché de embeddings de consulta",
+    ["result"],
+)
+LEXICAL_LOOKUPS = Counter(
+    "rag_lexical_index_lookups_total",
+    "Consultas con identificador exacto al índice léxico (hit, miss, unavailable)",
+    ["result"],
+)
+COALESCED = Counter(
+    "rag_coalesced_requests_total",
+    "Peticiones agrupadas con una ejecución idéntica en curso",
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "rag_admission_queue_depth",
+    "Peticiones esperando hueco de ejecución",
+    multiprocess_mode="livesum",
+)
+ADMISSION_IN_FLIGHT = Gauge(
+    "rag_admission_in_flight",
+    "Ejecuciones del agente en curso",
+    multiprocess_mode="livesum",
+)
+
+
+def render_metrics() -> bytes:
+    """Exposición de /metrics: del proceso actual o agregada entre workers"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest()
+
+
+def observe_result(result: Dict[str, Any]) -> None:
+    """Cuenta el response_action de un resultado del grafo (y los rechazos de scope)"""
+    action = result.get("response_action") or "unknown"
+    RESPONSE_ACTIONS.labels(action=action).inc()
+    if action == "rejected":
+        REJECTIONS.labels(reason="out_of_scope").inc()
+
+
+class LLMMetricsHandler(BaseCallbackHandler):
+    """Callback de LangChain que mide la duración de cada llamada al LLM."""
+
+    run_inline = True
+
+    def __init__(self):
+        self._starts: Dict[UUID, tuple] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, metadata=None, **kwargs) -> None:
+        node = (metadata or {}).get("langgraph_node", "none")
+        self._starts[run_id] = (time.perf_counter(), node)
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, metadata=None, **kwargs) -> None:
+        node = (metadata or {}).get("langgraph_node", "none")
+        self._starts[run_id] = (time.perf_counter(), node)
+
+    def _observe(self, run_id: UUID) -> None:
+        start = self._starts.pop(run_id, None)
+        if start is not None:
+            started_at, node = start
+            LLM_LATENCY.labels(node=node).observe(time.perf_counter() - started_at)
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs) -> None:
+        self._observe(run_id)
+
+    def on_llm_error(self, error, *, run_id: UUID, **kwargs) -> None:
+        self._observe(run_id)
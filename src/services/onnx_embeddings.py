@@ -0,0 +1,266 @@
+"""
+Backend ONNX Runtime (int8) para los embeddings, sin torch en inferencia.
+
+- export: SentenceTransformer -> ONNX (torch.onnx.export) + cuantización
+  dinámica int8 (onnxruntime.quantization). Solo aquí se necesita torch.
+- inferencia: tokenizador `tokenizers` (Rust) + sesión ONNX Runtime en CPU
+  con hilos configurables; mean pooling y normalización L2 en NumPy,
+  igual que el pipeline de sentence-transformers para e5.
+- drift: similitud coseno entre los vectores torch y ONNX sobre textos de
+  prueba (en lote con longitudes distintas y uno a uno, para cubrir el
+  padding), para validar la cuantización antes de activarla. El comando
+  termina con código 1 si el coseno mínimo queda por debajo del umbral.
+
+Se activa con EMBEDDINGS_BACKEND=onnx (ver src/services/embeddings.py).
+
+Uso:
+    python -m src.services.onnx_embeddings export
+    python -m src.services.onnx_embeddings drift --texts "azurerm_storage_account" "crear una vnet"
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config.config import SETTINGS
+from config.logger_config import logger
+
+MODEL_FILE = "model.onnx"
+QUANTIZED_MODEL_FILE = "model.int8.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+# Ficheros de save_pretrained que pueden declarar pad_token
+TOKENIZER_CONFIG_FILES = ("special_tokens_map.json", "tokenizer_config.json")
+# Si el export no declara pad_token (e5 / XLM-R: "<pad>", id 1; el id 0 es "<s>")
+PAD_TOKEN_CANDIDATES = ("<pad>", "[PAD]")
+EXPORT_INFO_FILE = "export.json"
+OPSET = 17
+# Lotes pequeños: menos padding desperdiciado con textos de longitudes muy distintas
+ENCODE_BATCH_SIZE = 32
+
+# Coseno mínimo frente a torch por fichero del export
+DRIFT_MIN_COSINE = {MODEL_FILE: 0.999, QUANTIZED_MODEL_FILE: 0.98}
+
+# Longitudes muy distintas a propósito: en lote, los cortos llevan mucho padding
+DRIFT_SAMPLE_TEXTS = [
+    "query: vnet",
+    "query: How to create an azurerm_storage_account with private endpoint",
+    "query: crear una red virtual con subredes en Azure con Terraform",
+    "query: azurerm_cdn_frontdoor_profile con dominio personalizado",
+    'resource "azurerm_resource_group" "rg" {\n  name     = "rg-demo"\n  location = "westeurope"\n}',
+    "Terraform state should be stored in a remote backend such as an Azure Storage container.",
+]
+
+
+def model_dir(model_name: str) -> Path:
+    """Directorio del modelo exportado (uno por modelo dentro de ONNX_MODEL_DIR)"""
+    return Path(SETTINGS.ONNX_MODEL_DIR) / re.sub(r"[^A-Za-z0-9_.-]+", "__", model_name)
+
+
+def export_onnx(model_name: str, out_dir: Optional[Path] = None, quantize: bool = True) -> Path:
+    """
+    Exporta el transformer del SentenceTransformer a ONNX (ejes dinámicos de
+    batch y secuencia) y, opcionalmente, su versión int8. Devuelve el directorio.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    out_dir = Path(out_dir or model_dir(model_name))
+    out_dir.mkdir(parents=True, exist_ok=True)
+    start = time.time()
+    logger.info("🔄 Exportando modelo de embeddings a ONNX", source="search", model_name=model_name, out_dir=str(out_dir))
+
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0].auto_model.eval()
+    tokenizer = st_model.tokenizer
+
+    sample = tokenizer(["query: terraform azure"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            (dict(sample),),
+            str(out_dir / MODEL_FILE),
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=OPSET,
+            do_constant_folding=True,
+        )
+    tokenizer.save_pretrained(str(out_dir))
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(str(out_dir / MODEL_FILE), str(out_dir / QUANTIZED_MODEL_FILE), weight_type=QuantType.QInt8)
+
+    info = {
+        "model_name": model_name,
+        "max_seq_length": st_model.max_seq_length,
+        "input_names": input_names,
+        "opset": OPSET,
+        "quantized": quantize,
+    }
+    (out_dir / EXPORT_INFO_FILE).write_text(json.dumps(info, indent=2), encoding="utf-8")
+
+    duration = time.time() - start
+    logger.info("✅ Modelo ONNX exportado", source="search", model_name=model_name, quantized=quantize, duration=f"{duration:.2f}s")
+    return out_dir
+
+
+def configure_padding(tokenizer, path: Path) -> Tuple[str, int]:
+    """
+    Activa el padding con el token del modelo: los valores por defecto de
+    `tokenizers` ("[PAD]", id 0) no son los de e5 y cambian los input_ids.
+    """
+    pad_token = None
+    for name in TOKENIZER_CONFIG_FILES:
+        config_file = path / name
+        if pad_token is None and config_file.exists():
+            value = json.loads(config_file.read_text(encoding="utf-8")).get("pad_token")
+            pad_token = value.get("content") if isinstance(value, dict) else value
+    for token in ([pad_token] if pad_token else PAD_TOKEN_CANDIDATES):
+        pad_id = tokenizer.token_to_id(token)
+        if pad_id is not None:
+            tokenizer.enable_padding(pad_id=pad_id, pad_token=token)
+            return token, pad_id
+    raise ValueError(f"No se encuentra el token de padding en el tokenizador de {path}")
+
+
+class OnnxEncoder:
+    """Encoder de frases sobre ONNX Runtime (misma salida que SentenceTransformer.encode normalizado)."""
+
+    def __init__(self, path: Path, quantized: bool = True):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        info = json.loads((path / EXPORT_INFO_FILE).read_text(encoding="utf-8"))
+        self.model_name = info["model_name"]
+        self.input_names = info["input_names"]
+        self.max_seq_length = info["max_seq_length"]
+
+        self.tokenizer = Tokenizer.from_file(str(path / TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=self.max_seq_length)
+        self.pad_token, self.pad_id = configure_padding(self.tokenizer, path)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if SETTINGS.ONNX_INTRA_OP_THREADS:
+            options.intra_op_num_threads = SETTINGS.ONNX_INTRA_OP_THREADS
+        options.inter_op_num_threads = SETTINGS.ONNX_INTER_OP_THREADS
+        self.model_file = path / (QUANTIZED_MODEL_FILE if quantized and info["quantized"] else MODEL_FILE)
+        self.session = ort.InferenceSession(str(self.model_file), sess_options=options, providers=["CPUExecutionProvider"])
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        inputs = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        hidden = self.session.run(None, {name: inputs[name] for name in self.input_names})[0]
+
+        # Mean pooling sobre los tokens reales + normalización L2
+        mask = inputs["attention_mask"][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Embeddings normalizados (matriz float32, una fila por texto)"""
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        batches = [self._encode_batch(texts[i:i + ENCODE_BATCH_SIZE]) for i in range(0, len(texts), ENCODE_BATCH_SIZE)]
+        return np.concatenate(batches).astype(np.float32, copy=False)
+
+
+_encoder: Optional[OnnxEncoder] = None
+_lock = threading.Lock()
+
+
+def get_onnx_encoder(model_name: str) -> OnnxEncoder:
+    """Encoder ONNX compartido; si falta el modelo exportado y ONNX_AUTO_EXPORT, lo exporta"""
+    global _encoder
+    if _encoder is not None:
+        return _encoder
+
+    with _lock:
+        if _encoder is None:
+            path = model_dir(model_name)
+            if not (path / EXPORT_INFO_FILE).exists():
+                if not SETTINGS.ONNX_AUTO_EXPORT:
+                    logger.error("❌ Falta el modelo ONNX exportado", source="search", model_name=model_name, path=str(path))
+                    raise FileNotFoundError(
+                        f"EMBEDDINGS_BACKEND=onnx pero no hay modelo ONNX exportado para '{model_name}' en {path}. "
+                        f"Expórtalo con 'python -m src.services.onnx_embeddings export' (requiere torch) "
+                        f"o arranca con ONNX_AUTO_EXPORT=true"
+                    )
+                export_onnx(model_name, path)
+            logger.info("🔄 Cargando modelo de embeddings ONNX", source="search", model_name=model_name, path=str(path))
+            _encoder = OnnxEncoder(path, quantized=SETTINGS.ONNX_QUANTIZED)
+            logger.info("✅ Modelo de embeddings ONNX cargado", source="search", model_file=str(_encoder.model_file),
+                        intra_op_threads=SETTINGS.ONNX_INTRA_OP_THREADS, inter_op_threads=SETTINGS.ONNX_INTER_OP_THREADS)
+    return _encoder
+
+
+def drift_report(model_name: str, texts: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Coseno entre los vectores torch (referencia) y ONNX para los mismos textos,
+    codificados en un solo lote (con padding) y uno a uno. `ok` indica si el
+    mínimo de ambos supera DRIFT_MIN_COSINE para ese fichero.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    texts = texts or DRIFT_SAMPLE_TEXTS
+    reference = SentenceTransformer(model_name, device="cpu").encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+
+    report: Dict[str, Any] = {"model_name": model_name, "texts": len(texts), "ok": True}
+    for quantized in (False, True):
+        encoder = OnnxEncoder(model_dir(model_name), quantized=quantized)
+        start = time.perf_counter()
+        candidate = encoder.encode(texts)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        single = np.concatenate([encoder.encode([text]) for text in texts])
+        cosine = (reference * candidate).sum(axis=1)
+        cosine_single = (reference * single).sum(axis=1)
+        min_cosine = DRIFT_MIN_COSINE[encoder.model_file.name]
+        ok = bool(min(cosine.min(), cosine_single.min()) >= min_cosine)
+        report["ok"] = report["ok"] and ok
+        report[encoder.model_file.name] = {
+            "cosine_mean": round(float(cosine.mean()), 6),
+            "cosine_min": round(float(cosine.min()), 6),
+            "cosine_min_single": round(float(cosine_single.min()), 6),
+            "min_cosine_required": min_cosine,
+            "ok": ok,
+            "encode_ms": round(elapsed_ms, 2),
+        }
+    return report
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Backend ONNX de embeddings: exportación y drift frente a torch")
+    parser.add_argument("command", choices=["export", "drift"])
+    parser.add_argument("--model", default=None, help="Modelo (por defecto el del manifest)")
+    parser.add_argument("--no-quantize", action="store_true", help="Exportar solo el modelo fp32")
+    parser.add_argument("--texts", nargs="*", default=None, help="Textos para el informe de drift")
+    args = parser.parse_args()
+
+    from src.services.embeddings import resolve_model_name
+    model_name = args.model or resolve_model_name()
+
+    if args.command == "export":
+        print(f"✅ Exportado en {export_onnx(model_name, quantize=not args.no_quantize)}")
+    else:
+        report = drift_report(model_name, args.texts)
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        if not report["ok"]:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,77 @@
+"""
+Precarga para el modo multi-worker (gunicorn --preload).
+
+El master carga el modelo de embeddings, las reglas del clasificador y el
+grafo compilado antes de hacer fork; los workers heredan esas páginas
+copy-on-write en lugar de cargar cada uno su copia de torch + e5.
+
+En el master NO se ejecuta inferencia: los pools de hilos de torch/OpenMP
+no sobreviven a un fork. La primera inferencia la hace el warmup de cada worker.
+"""
+import gc
+import os
+import time
+from typing import Dict
+
+from config.logger_config import logger
+
+# Campos de /proc/<pid>/smaps_rollup que interesan (kB)
+_SMAPS_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+
+def process_memory(pid: int = None) -> Dict[str, float]:
+    """
+    Memoria del proceso en MB desde /proc. Pss reparte las páginas compartidas
+    entre los procesos que las usan: es la cifra a sumar por worker.
+    """
+    pid = pid or os.getpid()
+    memory = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in _SMAPS_FIELDS:
+                    memory[key.lower()] = round(int(value.split()[0]) / 1024, 1)
+    except OSError:
+        # Sin smaps_rollup (kernels antiguos / no Linux): solo RSS
+        try:
+            with open(f"/proc/{pid}/status", "r") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        memory["rss"] = round(int(line.split()[1]) / 1024, 1)
+        except OSError:
+            pass
+    return memory
+
+
+def log_process_memory(stage: str) -> Dict[str, float]:
+    """Registra la memoria del proceso actual (etapa: master, worker, warmup...)"""
+    memory = process_memory()
+    logger.info(f"🧮 Memoria del proceso ({stage})", source="api", pid=os.getpid(), stage=stage, **{f"{k}_mb": v for k, v in memory.items()})
+    return memory
+
+
+def preload_for_fork() -> None:
+    """Carga en el master todo lo compartible y congela el heap (gc.freeze)"""
+    start = time.time()
+
+    from config.classifier_loader import _load
+    from config.config import SETTINGS
+    from src.services.embeddings import get_embeddings_model
+    from src.Agent.graph import get_agent
+
+    _load()
+    # La sesión de ONNX Runtime crea su pool de hilos al cargarse: cada worker carga la suya.
+    # Con el sidecar de embeddings los workers no cargan el modelo.
+    if SETTINGS.EMBEDDINGS_BACKEND != "onnx" and SETTINGS.EMBEDDING_BATCHER != "sidecar":
+        get_embeddings_model()
+    get_agent()
+
+    # Sin esto, el recolector de cada worker recorre (y escribe en) los objetos
+    # heredados y rompe el copy-on-write de sus páginas
+    gc.collect()
+    gc.freeze()
+
+    duration = time.time() - start
+    logger.info("✅ Precarga del master completada", source="api", duration=f"{duration:.2f}s", frozen_objects=gc.get_freeze_count())
+    log_process_memory("master")
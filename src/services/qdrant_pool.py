@@ -0,0 +1,77 @@
+"""
+Clientes Qdrant compartidos (uno sync y uno async por proceso).
+
+Búsqueda, recuperación e indexación reutilizan el mismo cliente y su pool
+de conexiones, en lugar de crear un QdrantClient por llamada.
+Con QDRANT_PREFER_GRPC=true se usa gRPC (puerto QDRANT_GRPC_PORT, 6334).
+Tras un fork (gunicorn --preload) el hijo descarta los clientes heredados:
+los sockets y canales gRPC no se pueden compartir entre procesos.
+"""
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from qdrant_client import AsyncQdrantClient, QdrantClient
+
+from config.config import SETTINGS
+from config.logger_config import logger
+
+_client: Optional[QdrantClient] = None
+_async_client: Optional[AsyncQdrantClient] = None
+_lock = threading.Lock()
+
+
+def _client_kwargs() -> Dict[str, Any]:
+    """Parámetros de conexión comunes a los dos clientes"""
+    kwargs = {
+        "url": SETTINGS.QDRANT_URL,
+        "prefer_grpc": SETTINGS.QDRANT_PREFER_GRPC,
+        "grpc_port": SETTINGS.QDRANT_GRPC_PORT,
+    }
+    if SETTINGS.QDRANT_API_KEY:
+        kwargs["api_key"] = SETTINGS.QDRANT_API_KEY
+    if SETTINGS.QDRANT_TIMEOUT_S:
+        kwargs["timeout"] = SETTINGS.QDRANT_TIMEOUT_S
+    return kwargs
+
+
+def get_qdrant_client() -> QdrantClient:
+    """Cliente Qdrant síncrono del proceso (se crea la primera vez)"""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                try:
+                    _client = QdrantClient(**_client_kwargs())
+                    logger.info("✅ Cliente Qdrant creado", source="qdrant", url=SETTINGS.QDRANT_URL, grpc=SETTINGS.QDRANT_PREFER_GRPC)
+                except Exception as e:
+                    logger.error(f"❌ Error conectando Qdrant: {e}", source="qdrant", url=SETTINGS.QDRANT_URL, error_type=type(e).__name__)
+                    raise
+    return _client
+
+
+def get_async_qdrant_client() -> AsyncQdrantClient:
+    """Cliente Qdrant asíncrono del proceso (crearlo dentro del event loop que lo usa)"""
+    global _async_client
+    if _async_client is None:
+        with _lock:
+            if _async_client is None:
+                try:
+                    _async_client = AsyncQdrantClient(**_client_kwargs())
+                    logger.info("✅ Cliente Qdrant async creado", source="qdrant", url=SETTINGS.QDRANT_URL, grpc=SETTINGS.QDRANT_PREFER_GRPC)
+                except Exception as e:
+                    logger.error(f"❌ Error creando cliente Qdrant async: {e}", source="qdrant", url=SETTINGS.QDRANT_URL, error_type=type(e).__name__)
+                    raise
+    return _async_client
+
+
+def _reset_after_fork() -> None:
+    """En el hijo: olvidar (sin cerrar) los clientes del padre"""
+    global _client, _async_client, _lock
+    _client = None
+    _async_client = None
+    _lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -7,7 +7,6 @@ project_root = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(project_root))
 import json
 import time
-import yaml
 from typing import List, Dict, Any, Optional, Tuple
 from dataclasses import dataclass
 from enum import Enum
@@ -16,6 +15,8 @@ from collections import defaultdict
 import hashlib
 import re
 from qdrant_client import QdrantClient
+from src.services.qdrant_pool import get_qdrant_client
+from src.services.manifest import get_examples
 from src.services.vector_store import (
     ensure_collection,
     add_documents_to_collection,
@@ -27,6 +28,7 @@ from langchain_core.documents import Document
 from langchain_community.document_loaders import PyPDFLoader, TextLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from src.services.embeddings import embeddings_model
+from config.config import SETTINGS
 from config.logger_config import logger, set_request_id, get_request_id
 
 # CONFIGURACIÓN
@@ -575,10 +577,7 @@ class DocumentLoader:
         """Carga ejemplos desde manifest.yaml"""
         documents = []
         try:
-            with open(self.config.manifest_path, "r", encoding="utf-8") as f:
-                manifest = yaml.safe_load(f)
-
-            examples = manifest.get("examples", [])
+            examples = get_examples(self.config.manifest_path)
             logger.info(
                 f"📋 Cargando {len(examples)} ejemplos del manifest",
                 source="qdrant",
@@ -677,21 +676,8 @@ class QdrantIndexer:
         )
 
     def _create_client(self) -> QdrantClient:
-        """Crea cliente Qdrant"""
-        try:
-            kwargs = {"url": self.config.qdrant_url, "prefer_grpc": False}
-            if self.config.qdrant_api_key:
-                kwargs["api_key"] = self.config.qdrant_api_key
-            client = QdrantClient(**kwargs)
-            logger.info(
-                "✅ Conexión Qdrant establecida",
-                source="qdrant",
-                url=self.config.qdrant_url,
-            )
-            return client
-        except Exception as e:
-            logger.error("❌ Error conectando Qdrant", source="qdrant", error=str(e))
-            raise
+        """Cliente Qdrant compartido del proceso (el mismo que usan search y vector_store)"""
+        return get_qdrant_client()
 
     def index_all(self, recreate_collections: bool = False):
         """Indexa todos los tipos de documentos"""
@@ -852,6 +838,11 @@ def main():
     parser.add_argument(
         "--chunk-size-pdf", type=int, help="Tamaño de chunk para PDFs (default: 1200)"
     )
+    parser.add_argument(
+        "--export-local",
+        action="store_true",
+        help="Exportar las colecciones al índice vectorial local (por defecto si VECTOR_BACKEND=local)",
+    )
     parser.add_argument(
         "--chunk-size-tf",
         type=int,
@@ -895,6 +886,11 @@ def main():
         else:
             # Indexación completa
             indexer.index_all(recreate_collections=args.recreate)
+
+        if args.export_local or SETTINGS.VECTOR_BACKEND == "local":
+            from src.services.local_vector_index import export_collection
+            for collection in (config.collections["pdfs"], config.collections["examples"]):
+                export_collection(collection)
         print("\n✅ ¡Indexación completada! Usa tu API para hacer búsquedas.")
 
     except Exception as e:
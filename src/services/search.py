@@ -1,140 +1,139 @@
 import os
 import sys
-import yaml
+import heapq
+import asyncio
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Iterable, Optional, Tuple, Union
 from dotenv import load_dotenv
-from qdrant_client import QdrantClient
-from sentence_transformers import SentenceTransformer
+import numpy as np
+from qdrant_client import QdrantClient, AsyncQdrantClient, models
+from config.config import SETTINGS
 from config.logger_config import logger, get_request_id
+from src.services.metrics import QDRANT_LATENCY
+from src.services.embeddings import encode_query, encode_queries
+from src.services.qdrant_pool import get_qdrant_client, get_async_qdrant_client
+from src.services import manifest as manifest_store
 load_dotenv()
 
-# Configuración
-QDRANT_URL = os.getenv("QDRANT_URL", "http://qdrant:6333")
-QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
+# Configuración (conexión a Qdrant: src/services/qdrant_pool.py)
 MANIFEST_PATH = os.getenv("EXAMPLES_MANIFEST", "data/docs/examples/manifest.yaml")
-EMBEDDINGS_MODEL = None  # Se carga lazy
 
+# Pool de hilos para buscar en varias colecciones a la vez (camino síncrono)
+_search_executor: Optional[ThreadPoolExecutor] = None
+_search_executor_lock = threading.Lock()
 
 
-def load_manifest() -> Dict[str, Any]:
-    """Carga el manifest con configuración de la colección"""
-    try:
-        with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
-            manifest = yaml.safe_load(f)
-            logger.info("✅ Manifest cargado", source="search", manifest_path=MANIFEST_PATH)
-            return manifest
-    except Exception as e:
-        logger.error(f"❌ Error cargando manifest: {e}", source="search", manifest_path=MANIFEST_PATH, error_type=type(e).__name__)
-        raise
+def _get_search_executor() -> ThreadPoolExecutor:
+    global _search_executor
+    if _search_executor is None:
+        with _search_executor_lock:
+            if _search_executor is None:
+                _search_executor = ThreadPoolExecutor(
+                    max_workers=SETTINGS.SEARCH_MAX_WORKERS,
+                    thread_name_prefix="qdrant-search",
+                )
+    return _search_executor
 
 
-def get_qdrant_client() -> QdrantClient:
-    """Obtiene cliente de Qdrant"""
-    try:
-        kwargs = {"url": QDRANT_URL}
-        if QDRANT_API_KEY:
-            kwargs["api_key"] = QDRANT_API_KEY
-        
-        client = QdrantClient(**kwargs)
-        
-        # Diagnóstico: imprimir métodos disponibles
-        available_methods = [m for m in dir(client) if 'search' in m.lower() or 'query' in m.lower()]
-        logger.info("✅ Conexión Qdrant establecida", source="search", 
-                   url=QDRANT_URL, available_search_methods=available_methods)
-        
-        return client
-    except Exception as e:
-        logger.error(f"❌ Error conectando Qdrant: {e}", source="search", 
-                    url=QDRANT_URL, error_type=type(e).__name__)
-        raise
+def _reset_search_executor_after_fork() -> None:
+    """Los hilos del pool no sobreviven a un fork: el hijo crea el suyo"""
+    global _search_executor, _search_executor_lock
+    _search_executor = None
+    _search_executor_lock = threading.Lock()
 
 
-def get_embeddings_model(model_name: str = None) -> SentenceTransformer:
-    """Obtiene modelo de embeddings"""
-    global EMBEDDINGS_MODEL
-    
-    if EMBEDDINGS_MODEL is not None:
-        return EMBEDDINGS_MODEL
-    
-    try:
-        if model_name is None:
-            manifest = load_manifest()
-            model_name = manifest.get("embeddings_model", "intfloat/multilingual-e5-small")
-        
-        logger.info("🔄 Cargando modelo de embeddings", source="search", model_name=model_name)
-        EMBEDDINGS_MODEL = SentenceTransformer(model_name)
-        logger.info("✅ Modelo de embeddings cargado", source="search", model_name=model_name)
-        
-        return EMBEDDINGS_MODEL
-    except Exception as e:
-        logger.error(f"❌ Error cargando modelo: {e}", source="search", 
-                    model_name=model_name, error_type=type(e).__name__)
-        raise
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_search_executor_after_fork)
 
 
-def search_in_qdrant(client: QdrantClient, collection: str, embedding: list, k: int) -> list:
-    """
-    Busca en Qdrant usando el método disponible (auto-detección)
-    
-    Prueba múltiples métodos en orden:
-    1. query_points (API 1.16+)
-    2. search (API 1.6-1.15)
-    3. similarity_search (legacy)
-    """
-    logger.debug("🔍 Detectando método de búsqueda disponible", source="search")
-    
-    # Método 1: query_points 
-    if hasattr(client, 'query_points'):
+
+def load_manifest() -> Dict[str, Any]:
+    """Manifest con configuración de la colección (cacheado, ver src/services/manifest.py)"""
+    return manifest_store.load_manifest(MANIFEST_PATH)
+
+
+# Método de búsqueda resuelto una sola vez por tipo de cliente ("sync" / "async")
+QUERY_POINTS_MIN_SERVER = (1, 10)  # query_points existe en el servidor desde Qdrant 1.10
+_search_methods: Dict[str, str] = {}
+
+
+def _pick_search_method(client, server_version: Optional[str]) -> str:
+    """query_points si cliente y servidor lo soportan; si no, search (API clásica)"""
+    if not hasattr(client, "query_points"):
+        if not hasattr(client, "search"):
+            raise RuntimeError("El cliente Qdrant no tiene query_points ni search")
+        return "search"
+    if server_version:
         try:
-            logger.debug("Intentando con query_points()", source="search")
-            result = client.query_points(
-                collection_name=collection,
-                query=embedding,
-                limit=k,
-                with_payload=True
-            )
-            logger.debug("✅ Usando query_points", source="search")
-            return result.points
-        except Exception as e:
-            logger.debug(f"query_points() falló: {e}", source="search")
-    
-    # Método 2: search 
-    if hasattr(client, 'search'):
+            major, minor = (int(p) for p in server_version.split(".")[:2])
+            if (major, minor) < QUERY_POINTS_MIN_SERVER and hasattr(client, "search"):
+                return "search"
+        except ValueError:
+            pass
+    return "query_points"
+
+
+def _server_version(info) -> Optional[str]:
+    return getattr(info, "version", None)
+
+
+def _resolve_search_method(client: QdrantClient) -> str:
+    method = _search_methods.get("sync")
+    if method is None:
         try:
-            logger.debug("Intentando con search()", source="search")
-            results = client.search(
-                collection_name=collection,
-                query_vector=embedding,
-                limit=k,
-                with_payload=True
-            )
-            logger.debug("✅ Usando search", source="search")
-            return results
+            version = _server_version(client.info()) if hasattr(client, "info") else None
         except Exception as e:
-            logger.warning(f"search() falló: {e}", source="search")
-    
-    # Método 3: fallback
-    if hasattr(client, 'scroll'):
+            # Sondeo fallido: método provisional, sin cachear (se vuelve a sondear en la siguiente búsqueda)
+            method = _pick_search_method(client, None)
+            logger.warning(f"⚠️ No se pudo consultar la versión de Qdrant, se usa {method} sin cachear: {e}", source="search", error_type=type(e).__name__)
+            return method
+        method = _search_methods["sync"] = _pick_search_method(client, version)
+        logger.info("🔧 Método de búsqueda Qdrant resuelto", source="search", method=method, server_version=version)
+    return method
+
+
+async def _aresolve_search_method(client: AsyncQdrantClient) -> str:
+    method = _search_methods.get("async")
+    if method is None:
         try:
-            logger.warning("⚠️ Usando scroll() como fallback (puede ser lento)", source="search")
-            results, _ = client.scroll(
-                collection_name=collection,
-                limit=k,
-                with_payload=True,
-                with_vectors=False
-            )
-            logger.debug("✅ Usando scroll (sin scoring)", source="search")
-            # Nota: scroll no tiene scores, así que los agregamos ficticios
-            for r in results:
-                r.score = 0.5  # Score ficticio
-            return results
+            version = _server_version(await client.info()) if hasattr(client, "info") else None
         except Exception as e:
-            logger.error(f"scroll() también falló: {e}", source="search")
-    
-    raise RuntimeError(
-        f"No se pudo encontrar un método de búsqueda válido. "
-        f"Métodos disponibles: {[m for m in dir(client) if not m.startswith('_')]}"
+            # Sondeo fallido: método provisional, sin cachear (se vuelve a sondear en la siguiente búsqueda)
+            method = _pick_search_method(client, None)
+            logger.warning(f"⚠️ No se pudo consultar la versión de Qdrant, se usa {method} sin cachear: {e}", source="search", error_type=type(e).__name__)
+            return method
+        method = _search_methods["async"] = _pick_search_method(client, version)
+        logger.info("🔧 Método de búsqueda Qdrant (async) resuelto", source="search", method=method, server_version=version)
+    return method
+
+
+def search_in_qdrant(client: QdrantClient, collection: str, embedding: np.ndarray, k: int, timeout: Optional[int] = None,
+                     score_threshold: Optional[float] = None, with_payload: Union[bool, List[str]] = True) -> list:
+    """
+    Busca en una colección con el método resuelto la primera vez
+    (query_points o search): un único round-trip por búsqueda.
+    score_threshold se aplica en Qdrant; with_payload admite una lista de campos.
+    """
+    if _resolve_search_method(client) == "query_points":
+        return client.query_points(
+            collection_name=collection,
+            query=embedding,
+            limit=k,
+            score_threshold=score_threshold,
+            with_payload=with_payload,
+            timeout=timeout
+        ).points
+
+    return client.search(
+        collection_name=collection,
+        query_vector=embedding,
+        limit=k,
+        score_threshold=score_threshold,
+        with_payload=with_payload,
+        timeout=timeout
     )
 
 
@@ -145,7 +144,7 @@ def search_examples(
     include_content: bool = True,
     collections: List[str] = None
 ) -> List[Dict[str, Any]]:
-    """Búsqueda principal en Qdrant con auto-detección de API"""
+    """Búsqueda principal en Qdrant"""
     request_id = get_request_id()
     if collections is None:
         collections = ["terraform_book", "examples_terraform"]
@@ -167,11 +166,192 @@ def search_examples(
     return results
 
 
+def _encode_query(query: str) -> np.ndarray:
+    """
+    Genera el embedding de la consulta con el modelo compartido (prefijo e5 'query: ').
+    Se devuelve el array float32 tal cual: qdrant_client acepta NumPy sin pasar por list.
+    """
+    return encode_query(query)
+
+
+def _encode_queries(queries: List[str]) -> np.ndarray:
+    """Genera los embeddings de varias consultas en una sola llamada batch a encode (matriz float32)"""
+    return encode_queries(queries)
+
+
+def _collect_hits(results: list, collection: str, threshold: float) -> Tuple[List[Dict[str, Any]], int]:
+    """Convierte los puntos de Qdrant en hits y filtra por threshold"""
+    hits = []
+    filtered_count = 0
+    for result in results:
+        score = float(result.score) if hasattr(result, 'score') else 0.0
+
+        if score < threshold:
+            filtered_count += 1
+            continue
+
+        payload = result.payload or {}
+        metadata = payload.get("metadata", {})
+
+        hits.append({
+            "id": result.id,
+            "score": score,
+            "name": metadata.get("name", metadata.get("source", "N/A")),
+            "section": metadata.get("section", ""),
+            "pages": metadata.get("pages", "-"),
+            "path": metadata.get("path", metadata.get("file_path", "N/A")),
+            "doc_type": metadata.get("doc_type", "unknown"),
+            "tags": metadata.get("tags", []),
+            "metadata": metadata,
+            "collection": collection,
+            "content": payload.get("page_content", "")
+        })
+    return hits, filtered_count
+
+
+def _dedupe_key(hit: Dict[str, Any]) -> Any:
+    # El mismo chunk puede estar indexado en varias colecciones: se compara por contenido
+    # (en la fase 1 de la recuperación en dos fases aún no hay contenido: por id)
+    return hit["content"] if hit.get("content") else (hit["collection"], hit["id"])
+
+
+def _merge_hits(hit_lists: Iterable[List[Dict[str, Any]]], k_per_collection: int, collections: List[str]) -> List[Dict[str, Any]]:
+    """
+    Fusiona los hits de cada colección: sin duplicados (se queda el de mayor score)
+    y los k_per_collection * len(collections) mejores por score (mayor primero).
+    """
+    best: Dict[Any, Dict[str, Any]] = {}
+    for hit in itertools.chain.from_iterable(hit_lists):
+        key = _dedupe_key(hit)
+        current = best.get(key)
+        if current is None or hit["score"] > current["score"]:
+            best[key] = hit
+    max_total = k_per_collection * len(collections)
+    return heapq.nlargest(max_total, best.values(), key=lambda x: x["score"])
+
+
+# Fase 1 de la recuperación en dos fases: solo lo necesario para ordenar y registrar
+LIGHT_PAYLOAD_FIELDS = ["metadata.name", "metadata.source", "metadata.doc_type"]
+
+
+def _two_phase() -> bool:
+    # Con el índice local los payloads no viajan por la red: una sola fase
+    return SETTINGS.TWO_PHASE_RETRIEVAL and SETTINGS.VECTOR_BACKEND != "local"
+
+
+def _search_payload() -> Union[bool, List[str]]:
+    return LIGHT_PAYLOAD_FIELDS if _two_phase() else True
+
+
+def _local_results(collection: str, embedding: np.ndarray, k: int, threshold: float) -> Optional[list]:
+    """Resultados del índice vectorial local (VECTOR_BACKEND=local); None = usar Qdrant"""
+    if SETTINGS.VECTOR_BACKEND != "local":
+        return None
+    from src.services.local_vector_index import local_search
+    return local_search(collection, embedding, k, score_threshold=threshold)
+
+
+def _group_ids(hits: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    ids_by_collection: Dict[str, List[Any]] = {}
+    for hit in hits:
+        ids_by_collection.setdefault(hit["collection"], []).append(hit["id"])
+    return ids_by_collection
+
+
+def _fill_hits(hits: List[Dict[str, Any]], records_by_collection: Dict[str, list], request_id: str) -> List[Dict[str, Any]]:
+    """
+    Completa los hits con el payload de la fase 2 (mismo formato que _collect_hits).
+    Los que no se pudieron recuperar (colección caída, punto borrado entre fases) se descartan.
+    """
+    records = {
+        (collection, record.id): record
+        for collection, collection_records in records_by_collection.items()
+        for record in collection_records
+    }
+    full_hits = []
+    for hit in hits:
+        record = records.get((hit["collection"], hit["id"]))
+        if record is None:
+            continue
+        hydrated, _ = _collect_hits([record], hit["collection"], float("-inf"))
+        hydrated[0]["score"] = hit["score"]
+        full_hits.append(hydrated[0])
+    if len(full_hits) < len(hits):
+        logger.warning("⚠️ Hits sin contenido en la segunda fase", source="search", missing=len(hits) - len(full_hits), request_id=request_id)
+    return full_hits
+
+
+def _fetch_payloads(client: QdrantClient, hits: List[Dict[str, Any]], timeout: Optional[int], request_id: str) -> List[Dict[str, Any]]:
+    """Fase 2: payload completo solo de los hits finales (un retrieve por colección)"""
+    def retrieve_one(item: Tuple[str, List[Any]]) -> Tuple[str, list]:
+        collection, ids = item
+        try:
+            return collection, client.retrieve(collection_name=collection, ids=ids, with_payload=True, with_vectors=False, timeout=timeout)
+        except Exception as e:
+            logger.warning(f"⚠️ Error recuperando payloads de {collection}: {e}", source="search", request_id=request_id)
+            return collection, []
+
+    items = list(_group_ids(hits).items())
+    if len(items) == 1:
+        records_by_collection = dict([retrieve_one(items[0])])
+    else:
+        records_by_collection = dict(_get_search_executor().map(retrieve_one, items))
+    return _fill_hits(hits, records_by_collection, request_id)
+
+
+async def _afetch_payloads(client: AsyncQdrantClient, hits: List[Dict[str, Any]], timeout: Optional[int], request_id: str) -> List[Dict[str, Any]]:
+    """Versión asíncrona de _fetch_payloads"""
+    async def retrieve_one(collection: str, ids: List[Any]) -> Tuple[str, list]:
+        try:
+            return collection, await client.retrieve(collection_name=collection, ids=ids, with_payload=True, with_vectors=False, timeout=timeout)
+        except Exception as e:
+            logger.warning(f"⚠️ Error recuperando payloads de {collection}: {e}", source="search", request_id=request_id)
+            return collection, []
+
+    pairs = await asyncio.gather(*(retrieve_one(c, ids) for c, ids in _group_ids(hits).items()))
+    return _fill_hits(hits, dict(pairs), request_id)
+
+
+def _search_collection(client: QdrantClient, collection: str, embedding: np.ndarray, k: int, threshold: float, timeout: Optional[int], request_id: str) -> List[Dict[str, Any]]:
+    """Busca en una colección; un fallo se registra y devuelve [] para no tumbar las demás"""
+    try:
+        results = _local_results(collection, embedding, k, threshold)
+        if results is None:
+            with QDRANT_LATENCY.labels(collection=collection).time():
+                results = search_in_qdrant(client, collection, embedding, k, timeout=timeout, score_threshold=threshold, with_payload=_search_payload())
+        hits, filtered_count = _collect_hits(results, collection, threshold)
+        logger.info(f"✅ {collection}: {len(results)} resultados, {filtered_count} filtrados por threshold", source="search", collection=collection, results_raw=len(results), filtered_by_threshold=filtered_count, request_id=request_id)
+        return hits
+    except Exception as e:
+        logger.warning(f"⚠️ Error en colección {collection}: {e}", source="search", request_id=request_id)
+        return []
+
+
+async def _asearch_collection(client: AsyncQdrantClient, collection: str, embedding: np.ndarray, k: int, threshold: float, timeout: Optional[int], request_id: str) -> List[Dict[str, Any]]:
+    """Versión asíncrona de _search_collection"""
+    try:
+        # El índice local hace la conversión float16 -> float32 y el matmul (milisegundos): en un hilo
+        results = None
+        if SETTINGS.VECTOR_BACKEND == "local":
+            results = await asyncio.to_thread(_local_results, collection, embedding, k, threshold)
+        if results is None:
+            with QDRANT_LATENCY.labels(collection=collection).time():
+                results = await async_search_in_qdrant(client, collection, embedding, k, timeout=timeout, score_threshold=threshold, with_payload=_search_payload())
+        hits, filtered_count = _collect_hits(results, collection, threshold)
+        logger.info(f"✅ {collection}: {len(results)} resultados, {filtered_count} filtrados por threshold", source="search", collection=collection, results_raw=len(results), filtered_by_threshold=filtered_count, request_id=request_id)
+        return hits
+    except Exception as e:
+        logger.warning(f"⚠️ Error en colección {collection}: {e}", source="search", request_id=request_id)
+        return []
+
+
 def search_all_collections(  
     query: str,
     collections: List[str],
     k_per_collection: int = 5,
-    threshold: float = 0.5
+    threshold: float = 0.5,
+    timeout: Optional[int] = None,
+    fetch_k: Optional[int] = None
 ) -> List[Dict[str, Any]]:
     """
     Busca en TODAS las colecciones y fusiona resultados ordenados por score.
@@ -181,12 +361,14 @@ def search_all_collections(
         collections: Lista de colecciones donde buscar
         k_per_collection: Número de resultados por colección
         threshold: Score mínimo para incluir un resultado
+        timeout: Timeout (s) de cada búsqueda en Qdrant (deadline de la petición)
+        fetch_k: En recuperación en dos fases (TWO_PHASE_RETRIEVAL), nº de hits finales cuyo contenido se recupera
+            (None = todos los fusionados)
     
     Returns:
         Lista fusionada de resultados ordenados por score
     """
     import time
-    request_id = get_request_id()
     start_time = time.time()
     request_id = get_request_id()
     logger.info("🔍 Búsqueda multi-colección iniciada", source="search", query=query[:50], collections=collections, k_per_collection=k_per_collection, request_id=request_id)
@@ -202,75 +384,27 @@ def search_all_collections(
                           request_id=request_id)
             return []
         
-        # Configuración
-        manifest = load_manifest()
-        model_name = manifest.get("embeddings_model", "intfloat/multilingual-e5-small")
-        
-        # Cliente y modelo
+        # Cliente y embedding
         client = get_qdrant_client()
-        model = get_embeddings_model(model_name)
-        
-        # Generar embedding
-        query_with_prefix = f"query: {query}"
-        embedding = model.encode(query_with_prefix)
-        embedding_list = embedding.tolist() if hasattr(embedding, 'tolist') else list(embedding)
+        embedding = _encode_query(query)
         
         logger.info("✅ Embedding generado",
                    source="search",
-                   embedding_dim=len(embedding_list),
+                   embedding_dim=len(embedding),
                    request_id=request_id)
         
-        # Buscar en cada colección
-        all_results = []
-        
-        for collection in collections:
-            try:
-                logger.info(f"🔎 Buscando en {collection}",
-                           source="search",
-                           collection=collection,
-                           request_id=request_id)
-                
-                results = search_in_qdrant(client, collection, embedding_list, k_per_collection)
-                
-                # Procesar resultados de esta colección
-                filtered_count = 0
-                for result in results:
-                    score = float(result.score) if hasattr(result, 'score') else 0.0
-                    
-                    if score < threshold:
-                        filtered_count += 1
-                        continue
-                    
-                    payload = result.payload
-                    metadata = payload.get("metadata", {})
-                    
-                    hit = {
-                        "score": score,
-                        "name": metadata.get("name", metadata.get("source", "N/A")),
-                        "section": metadata.get("section", ""),
-                        "pages": metadata.get("pages", "-"),
-                        "path": metadata.get("path", metadata.get("file_path", "N/A")),
-                        "doc_type": metadata.get("doc_type", "unknown"),
-                        "tags": metadata.get("tags", []),
-                        "metadata": metadata,
-                        "collection": collection,
-                        "content": payload.get("page_content", "")
-                    }
-                    
-                    all_results.append(hit)
-                
-                logger.info(f"✅ {collection}: {len(results)} resultados, {filtered_count} filtrados por threshold", source="search", collection=collection, results_raw=len(results), filtered_by_threshold=filtered_count, request_id=request_id)
-                
-            except Exception as e:
-                logger.warning(f"⚠️ Error en colección {collection}: {e}", source="search", request_id=request_id)
-                continue
-        
-        # Ordenar por score (mayor primero)
-        all_results.sort(key=lambda x: x["score"], reverse=True)
+        # Buscar en todas las colecciones a la vez: la latencia es la de la más lenta
+        def search_one(collection: str) -> List[Dict[str, Any]]:
+            return _search_collection(client, collection, embedding, k_per_collection, threshold, timeout, request_id)
+
+        if len(collections) == 1:
+            hit_lists = [search_one(collections[0])]
+        else:
+            hit_lists = list(_get_search_executor().map(search_one, collections))
         
-        # Limitar total de resultados
-        max_total = k_per_collection * len(collections)
-        all_results = all_results[:max_total]
+        all_results = _merge_hits(hit_lists, k_per_collection, collections)
+        if _two_phase() and all_results:
+            all_results = _fetch_payloads(client, all_results[:fetch_k], timeout, request_id)
         
         duration = time.time() - start_time
         logger.info("✅ Búsqueda multi-colección completada", source="search", total_results=len(all_results), collections_searched=len(collections), duration_ms=round(duration * 1000, 2), top_score=all_results[0]["score"] if all_results else 0.0, request_id=request_id)
@@ -281,6 +415,151 @@ def search_all_collections(
         logger.error(f"❌ Error en búsqueda multi-colección: {e}", source="search", error_type=type(e).__name__, request_id=request_id)
         return []
 
+
+async def async_search_in_qdrant(client: AsyncQdrantClient, collection: str, embedding: np.ndarray, k: int, timeout: Optional[int] = None,
+                                 score_threshold: Optional[float] = None, with_payload: Union[bool, List[str]] = True) -> list:
+    """
+    Versión asíncrona de search_in_qdrant (AsyncQdrantClient).
+    No bloquea el event loop durante el round-trip a Qdrant.
+    """
+    if await _aresolve_search_method(client) == "query_points":
+        result = await client.query_points(
+            collection_name=collection,
+            query=embedding,
+            limit=k,
+            score_threshold=score_threshold,
+            with_payload=with_payload,
+            timeout=timeout
+        )
+        return result.points
+
+    return await client.search(
+        collection_name=collection,
+        query_vector=embedding,
+        limit=k,
+        score_threshold=score_threshold,
+        with_payload=with_payload,
+        timeout=timeout
+    )
+
+
+async def async_search_all_collections(
+    query: str,
+    collections: List[str],
+    k_per_collection: int = 5,
+    threshold: float = 0.5,
+    timeout: Optional[int] = None,
+    fetch_k: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    Versión asíncrona de search_all_collections.
+    El embedding (CPU) se calcula en un hilo y las búsquedas usan AsyncQdrantClient.
+    """
+    import time
+    start_time = time.time()
+    request_id = get_request_id()
+    logger.info("🔍 Búsqueda multi-colección (async) iniciada", source="search", query=query[:50], collections=collections, k_per_collection=k_per_collection, request_id=request_id)
+
+    try:
+        from src.services.relevance_filter import is_query_in_scope
+        is_valid, reason = is_query_in_scope(query, min_keywords=0)
+        if not is_valid:
+            logger.warning("⚠️ Query fuera de scope", source="search", reason=reason, request_id=request_id)
+            return []
+
+        client = get_async_qdrant_client()
+        embedding = await asyncio.to_thread(_encode_query, query)
+
+        # Una petición por colección, todas en vuelo a la vez
+        hit_lists = await asyncio.gather(*(
+            _asearch_collection(client, collection, embedding, k_per_collection, threshold, timeout, request_id)
+            for collection in collections
+        ))
+
+        all_results = _merge_hits(hit_lists, k_per_collection, collections)
+        if _two_phase() and all_results:
+            all_results = await _afetch_payloads(client, all_results[:fetch_k], timeout, request_id)
+
+        duration = time.time() - start_time
+        logger.info("✅ Búsqueda multi-colección (async) completada", source="search", total_results=len(all_results), collections_searched=len(collections), duration_ms=round(duration * 1000, 2), top_score=all_results[0]["score"] if all_results else 0.0, request_id=request_id)
+        return all_results
+
+    except Exception as e:
+        logger.error(f"❌ Error en búsqueda multi-colección (async): {e}", source="search", error_type=type(e).__name__, request_id=request_id)
+        return []
+
+async def async_search_all_collections_batch(
+    queries: List[str],
+    collections: List[str],
+    k_per_collection: int = 5,
+    threshold: float = 0.5
+) -> List[Optional[List[Dict[str, Any]]]]:
+    """
+    Búsqueda batch: N consultas con un único encode y una query batch por colección
+    (en lugar de N x colecciones llamadas a search_all_collections).
+
+    Returns:
+        Una lista de hits por consulta, en el mismo orden. Las consultas fuera
+        de scope devuelven [] (igual que search_all_collections). Si falla la
+        query batch de alguna colección, las consultas en scope devuelven None:
+        sus hits estarían incompletos y el nodo retrieve debe buscar por su cuenta.
+    """
+    import time
+    start_time = time.time()
+    request_id = get_request_id()
+    logger.info("🔍 Búsqueda batch iniciada", source="search", queries=len(queries), collections=collections, k_per_collection=k_per_collection, request_id=request_id)
+
+    from src.services.relevance_filter import is_query_in_scope
+    in_scope = [i for i, q in enumerate(queries) if is_query_in_scope(q, min_keywords=0)[0]]
+    if not in_scope:
+        return [[] for _ in queries]
+
+    client = get_async_qdrant_client()
+    embeddings = await asyncio.to_thread(_encode_queries, [queries[i] for i in in_scope])
+    # QueryRequest (pydantic) solo admite listas
+    requests = [
+        models.QueryRequest(query=embedding.tolist(), limit=k_per_collection, score_threshold=threshold, with_payload=True)
+        for embedding in embeddings
+    ]
+
+    async def batch_one(collection: str) -> Optional[List[list]]:
+        """Puntos de cada consulta en una colección (índice local o una query batch a Qdrant); None si falla"""
+        if SETTINGS.VECTOR_BACKEND == "local":
+            local = await asyncio.to_thread(
+                lambda: [_local_results(collection, embedding, k_per_collection, threshold) for embedding in embeddings]
+            )
+            if all(points is not None for points in local):
+                return local
+        try:
+            with QDRANT_LATENCY.labels(collection=collection).time():
+                responses = await client.query_batch_points(collection_name=collection, requests=requests)
+            return [response.points for response in responses]
+        except Exception as e:
+            logger.warning(f"⚠️ Error en batch de colección {collection}: {e}", source="search", request_id=request_id)
+            return None
+
+    # Una query batch por colección, todas a la vez
+    responses_per_collection = await asyncio.gather(*(batch_one(c) for c in collections))
+
+    failed = [c for c, points in zip(collections, responses_per_collection) if points is None]
+    if failed:
+        logger.warning("⚠️ Búsqueda batch incompleta: cada consulta buscará por su cuenta", source="search", failed_collections=failed, request_id=request_id)
+        in_scope_set = set(in_scope)
+        return [None if i in in_scope_set else [] for i in range(len(queries))]
+
+    hit_lists_per_query: List[List[List[Dict[str, Any]]]] = [[] for _ in queries]
+    for collection, points_per_query in zip(collections, responses_per_collection):
+        for idx, points in zip(in_scope, points_per_query):
+            hits, _ = _collect_hits(points, collection, threshold)
+            hit_lists_per_query[idx].append(hits)
+
+    results_per_query = [_merge_hits(hit_lists, k_per_collection, collections) for hit_lists in hit_lists_per_query]
+
+    duration = time.time() - start_time
+    logger.info("✅ Búsqueda batch completada", source="search", queries=len(queries), in_scope=len(in_scope), duration_ms=round(duration * 1000, 2), request_id=request_id)
+    return results_per_query
+
+
 def search_with_metadata(
     query: str,
     k: int = 5,
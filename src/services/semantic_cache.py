@@ -0,0 +1,194 @@
+"""
+Caché semántica de respuestas (por similitud del embedding de la consulta).
+
+La caché exacta (response_cache) no acierta con paráfrasis ("storage con web
+estática" / "static website en storage account"). Aquí se guarda, por cada
+respuesta servida, el embedding de la pregunta, los documentos recuperados y
+la respuesta final. Una consulta nueva la reutiliza si:
+
+- tiene el mismo intent (classify_intent), k_docs y threshold, y
+- su distancia coseno a la pregunta cacheada es <= SEMANTIC_CACHE_MAX_DISTANCE.
+
+Acotada (LRU) y ligada a la generación del índice, como ResponseCache.
+Desactivada por defecto (SEMANTIC_CACHE_SIZE=0): con e5 hasta preguntas no
+relacionadas tienen coseno >= 0.9, así que la distancia máxima se calibra con
+pares reales de consultas equivalentes y distintas antes de activarla:
+
+    python -m src.services.semantic_cache calibrate --pairs pares.jsonl
+"""
+import argparse
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config.config import SETTINGS
+from src.services.index_generation import get_index_generation
+from src.services.metrics import SEMANTIC_CACHE_LOOKUPS
+
+
+@dataclass
+class _Entry:
+    slot: int                 # fila de la matriz de embeddings
+    question: str
+    intent: str
+    k_docs: int
+    threshold: float
+    generation: str
+    value: Dict[str, Any]
+
+
+class SemanticCache:
+    """LRU de respuestas indexada por embedding de la pregunta (matriz preasignada)."""
+
+    def __init__(self, max_size: int, max_distance: float):
+        self.max_size = max_size
+        self.max_distance = max_distance
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._matrix: Optional[np.ndarray] = None
+        self._free_slots: List[int] = list(range(max_size))
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def _drop(self, entry_id: int) -> None:
+        """Quita una entrada y libera su fila (llamar con el lock)"""
+        self._free_slots.append(self._entries.pop(entry_id).slot)
+
+    def _nearest(self, embedding: np.ndarray, intent: str, k_docs: int, threshold: float) -> Tuple[Optional[int], float]:
+        """Entrada compatible más parecida y su similitud (llamar con el lock)"""
+        generation = get_index_generation()
+        stale = [entry_id for entry_id, e in self._entries.items() if e.generation != generation]
+        for entry_id in stale:
+            self._drop(entry_id)
+        self.invalidations += len(stale)
+
+        candidates = [
+            (entry_id, e.slot) for entry_id, e in self._entries.items()
+            if e.intent == intent and e.k_docs == k_docs and e.threshold == threshold
+        ]
+        if not candidates:
+            return None, 0.0
+        # Embeddings normalizados: coseno = producto escalar
+        similarities = self._matrix[[slot for _, slot in candidates]] @ embedding
+        best = int(np.argmax(similarities))
+        return candidates[best][0], float(similarities[best])
+
+    def get(self, embedding: np.ndarray, intent: str, k_docs: int, threshold: float) -> Optional[Tuple[Dict[str, Any], float, str]]:
+        """(respuesta cacheada, similitud, pregunta original) o None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry_id, similarity = self._nearest(embedding, intent, k_docs, threshold)
+            if entry_id is None or 1.0 - similarity > self.max_distance:
+                self.misses += 1
+                SEMANTIC_CACHE_LOOKUPS.labels(result="miss").inc()
+                return None
+            self._entries.move_to_end(entry_id)
+            entry = self._entries[entry_id]
+            self.hits += 1
+        SEMANTIC_CACHE_LOOKUPS.labels(result="hit").inc()
+        return entry.value, similarity, entry.question
+
+    def set(self, embedding: np.ndarray, question: str, intent: str, k_docs: int, threshold: float, value: Dict[str, Any]) -> None:
+        """Guarda una respuesta; si ya hay una equivalente (dentro de la distancia) la sustituye"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = np.zeros((self.max_size, embedding.shape[0]), dtype=np.float32)
+            entry_id, similarity = self._nearest(embedding, intent, k_docs, threshold)
+            if entry_id is not None and 1.0 - similarity <= self.max_distance:
+                self._drop(entry_id)
+            while not self._free_slots:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+            slot = self._free_slots.pop()
+            self._matrix[slot] = embedding
+            self._entries[self._next_id] = _Entry(slot, question, intent, k_docs, threshold, get_index_generation(), value)
+            self._next_id += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._free_slots = list(range(self.max_size))
+
+    def stats(self) -> Dict[str, Any]:
+        """Métricas de la caché"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "max_distance": self.max_distance,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "index_generation": get_index_generation(),
+        }
+
+
+semantic_cache = SemanticCache(SETTINGS.SEMANTIC_CACHE_SIZE, SETTINGS.SEMANTIC_CACHE_MAX_DISTANCE)
+
+
+def calibrate(pairs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Distancias coseno de pares etiquetados ({"a", "b", "duplicate"}) con el
+    embedding que usa la caché, y la mayor distancia que no acepta ningún par
+    distinto (candidata a SEMANTIC_CACHE_MAX_DISTANCE) con el recall que da.
+    """
+    from src.services.embeddings import encode_queries
+
+    left = encode_queries([p["a"] for p in pairs])
+    right = encode_queries([p["b"] for p in pairs])
+    distances = 1.0 - (left * right).sum(axis=1)
+    labels = np.array([bool(p["duplicate"]) for p in pairs])
+    duplicates, distinct = distances[labels], distances[~labels]
+
+    def summary(values: np.ndarray) -> Dict[str, Any]:
+        if not len(values):
+            return {"pairs": 0}
+        return {
+            "pairs": int(len(values)),
+            "min": round(float(values.min()), 4),
+            "p50": round(float(np.percentile(values, 50)), 4),
+            "p90": round(float(np.percentile(values, 90)), 4),
+            "max": round(float(values.max()), 4),
+        }
+
+    # Umbral seguro: por debajo de la distancia del par distinto más cercano
+    limit = float(distinct.min()) if len(distinct) else float("inf")
+    accepted = duplicates[duplicates < limit]
+    suggested = float(accepted.max()) if len(accepted) else None
+    return {
+        "duplicates": summary(duplicates),
+        "distinct": summary(distinct),
+        "suggested_max_distance": round(suggested, 4) if suggested is not None else None,
+        "duplicate_recall": round(len(accepted) / len(duplicates), 4) if len(duplicates) else None,
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Calibración de SEMANTIC_CACHE_MAX_DISTANCE con pares de consultas etiquetados")
+    parser.add_argument("command", choices=["calibrate"])
+    parser.add_argument("--pairs", required=True, help='JSONL: {"a": "...", "b": "...", "duplicate": true|false}')
+    args = parser.parse_args()
+    with open(args.pairs, encoding="utf-8") as f:
+        pairs = [json.loads(line) for line in f if line.strip()]
+    print(json.dumps(calibrate(pairs), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,77 @@
+"""
+Coalescing (single-flight) de consultas idénticas en curso.
+
+Si llegan a la vez varias peticiones con la misma clave, solo la primera
+ejecuta el agente; el resto espera esa ejecución y comparte su resultado.
+"""
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from src.services.relevance_filter import normalize_query
+from src.services.metrics import COALESCED
+from config.logger_config import logger
+
+
+def query_key(
+    question: str,
+    k_docs: int,
+    threshold: float,
+    chat_history: Optional[List[Dict[str, str]]] = None,
+) -> str:
+    """
+    Clave de una consulta: pregunta normalizada + k_docs + threshold + huella del historial.
+    """
+    normalized = " ".join(normalize_query(question).split())
+    history = json.dumps(chat_history or [], sort_keys=True, ensure_ascii=False)
+    history_fp = hashlib.sha1(history.encode("utf-8")).hexdigest()[:16]
+    return f"{normalized}|{k_docs}|{threshold}|{history_fp}"
+
+
+class SingleFlight:
+    """Agrupa llamadas concurrentes con la misma clave en una sola ejecución."""
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.calls = 0
+        self.executions = 0
+        self.collapsed = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]], timeout: Optional[float] = None) -> Any:
+        """
+        Ejecuta fn() o, si ya hay una ejecución en curso con la misma clave,
+        espera su resultado (o su excepción).
+
+        timeout: lo que puede esperar este llamante si se une a una ejecución
+        ajena (su propio deadline, no el del líder); al agotarse lanza
+        asyncio.TimeoutError sin cancelar la ejecución compartida. Quien lanza
+        fn() ya le ha pasado su deadline y no lo necesita.
+        """
+        self.calls += 1
+        task = self._inflight.get(key)
+
+        if task is None:
+            self.executions += 1
+            # Tarea independiente: si el cliente que la lanzó se desconecta,
+            # los que esperan el mismo resultado no se cancelan
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.collapsed += 1
+            COALESCED.inc()
+            logger.info("🔗 Consulta agrupada con una en curso", source="api", collapsed=self.collapsed)
+            if timeout is not None:
+                return await asyncio.wait_for(asyncio.shield(task), timeout)
+
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, int]:
+        """Contadores de coalescing"""
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "collapsed": self.collapsed,
+            "in_flight": len(self._inflight),
+        }
@@ -2,12 +2,14 @@ import os
 import logging
 from typing import List, Optional, Dict, Any
 from langchain_core.documents import Document
-from qdrant_client import QdrantClient, models
+from qdrant_client import models
 from qdrant_client.http.exceptions import UnexpectedResponse
 from langchain_qdrant import QdrantVectorStore
 
 from config.config import SETTINGS  
 from src.services.embeddings import embeddings_model
+from src.services.index_generation import bump_index_generation
+from src.services.qdrant_pool import get_qdrant_client
 from config.logger_config import logger
 
 qdrant_url = SETTINGS.QDRANT_URL
@@ -16,8 +18,6 @@ collection_name = SETTINGS.QDRANT_COLLECTION_NAME or "jupiter_examples"
 # Dimensión del embedding que se usa (e5-small => 384)
 EMB_DIM = 384  
 
-qdrant_client = QdrantClient(url=qdrant_url)
-logger.info(f"ℹ️ Cliente Qdrant inicializado", source="qdrant", url=qdrant_url)
 COLLECTIONS = {
     "docs": "terraform_book",
     "examples": "examples_terraform",
@@ -29,14 +29,14 @@ def ensure_collection(collection_name: str ) -> bool:
     """
     target = collection_name 
     
-    try:
-        qdrant_client.get_collection(target)
+    # collection_exists en lugar de capturar UnexpectedResponse: con gRPC el error es otro
+    if get_qdrant_client().collection_exists(target):
         logger.info(f"✅ Colección encontrada", source="qdrant", collection=target)
         return True
-    except UnexpectedResponse:
+    else:
         logger.info(f"⚠️ Colección no existe, creando...", source="qdrant", collection=target)
         try:
-            qdrant_client.create_collection(
+            get_qdrant_client().create_collection(
                 collection_name=target,
                 vectors_config=models.VectorParams(
                     size=EMB_DIM,
@@ -55,13 +55,13 @@ def delete_collection(collection_name: str ) -> bool:
     """
     target = collection_name 
     try:
-        qdrant_client.get_collection(target)
-        qdrant_client.delete_collection(target)
+        if not get_qdrant_client().collection_exists(target):
+            logger.warning("⚠️ Colección no existe", source="qdrant", collection=target)
+            return False
+        get_qdrant_client().delete_collection(target)
+        bump_index_generation()
         logger.info("✅ Colección eliminada", source="qdrant", collection=target)
         return True
-    except UnexpectedResponse:
-        logger.warning("⚠️ Colección no existe", source="qdrant", collection=target)
-        return False
     except Exception as e:
         logger.error("❌ Error eliminando colección", source="qdrant", collection=target, error=str(e))
         return False
@@ -75,7 +75,7 @@ def get_collection_info(collection_name: str) -> Optional[Dict[str, Any]]:
     target = collection_name 
     
     try:
-        info = qdrant_client.get_collection(target)
+        info = get_qdrant_client().get_collection(target)
         return {
             "name": target,
             "points_count": info.points_count,
@@ -107,7 +107,7 @@ def add_documents_to_collection(
         ensure_collection(target)
         # Crear vector store temporal para la colección destino
         target_store = QdrantVectorStore(
-            client=qdrant_client,
+            client=get_qdrant_client(),
             collection_name=target,
             embedding=embeddings_model,
             content_payload_key="page_content",
@@ -115,6 +115,7 @@ def add_documents_to_collection(
         )
         # Añadir documentos
         target_store.add_documents(documents)
+        bump_index_generation()
         logger.info("✅ Documentos añadidos",source="qdrant",collection=target,count=len(documents))
         return len(documents)
     except Exception as e:
@@ -129,7 +130,7 @@ def get_vector_store(collection_name: str) -> QdrantVectorStore:
     ensure_collection(target)
     
     return QdrantVectorStore(
-        client=qdrant_client,
+        client=get_qdrant_client(),
         collection_name=target,
         embedding=embeddings_model,
         content_payload_key="page_content",
@@ -139,7 +140,7 @@ def get_vector_store(collection_name: str) -> QdrantVectorStore:
 def list_collections() -> List[str]:
     """Lista todas las colecciones en Qdrant."""
     try:
-        collections = qdrant_client.get_collections()
+        collections = get_qdrant_client().get_collections()
         return [c.name for c in collections.collections]
     except Exception as e:
         logger.error("❌ Error listando colecciones", source="qdrant", error=str(e))
@@ -0,0 +1,186 @@
+"""
+Calentamiento (warmup) en el arranque y estado de readiness.
+
+Evita que la primera petición tras un despliegue pague la carga del modelo
+de embeddings, la primera conexión a Qdrant y la creación del cliente LLM.
+"""
+import time
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.config import SETTINGS
+from config.logger_config import logger
+
+# Componentes imprescindibles para servir /query
+REQUIRED_COMPONENTS = ("classifier", "embeddings", "qdrant")
+
+
+class WarmupState:
+    """Estado de calentamiento por componente"""
+
+    def __init__(self):
+        self.started = False
+        self.finished = False
+        self.components: Dict[str, Dict[str, Any]] = {}
+
+    def mark(self, name: str, ready: bool, duration_ms: float, error: Optional[str] = None, **extra) -> None:
+        self.components[name] = {
+            "ready": ready,
+            "duration_ms": round(duration_ms, 2),
+            "error": error,
+            **extra,
+        }
+
+    @property
+    def ready(self) -> bool:
+        return all(self.components.get(c, {}).get("ready") for c in REQUIRED_COMPONENTS)
+
+
+WARMUP = WarmupState()
+
+
+async def _step(name: str, coro_factory) -> Any:
+    """Ejecuta un paso de warmup registrando duración y errores"""
+    start = time.time()
+    try:
+        extra = await coro_factory() or {}
+        duration_ms = (time.time() - start) * 1000
+        WARMUP.mark(name, True, duration_ms, **extra)
+        logger.info(f"🔥 Warmup {name} completado", source="api", duration=f"{duration_ms / 1000:.2f}s")
+    except Exception as e:
+        duration_ms = (time.time() - start) * 1000
+        WARMUP.mark(name, False, duration_ms, error=str(e))
+        logger.error(f"❌ Warmup {name} falló: {e}", source="api", error_type=type(e).__name__)
+
+
+async def _warm_classifier() -> Dict[str, Any]:
+    from config.classifier_loader import _load
+    await asyncio.to_thread(_load)
+    return {}
+
+
+async def _warm_embeddings() -> Dict[str, Any]:
+    from src.services.search import _encode_query
+    embedding = await asyncio.to_thread(_encode_query, "warmup terraform azure")
+    return {"embedding_dim": len(embedding)}
+
+
+async def _warm_qdrant(collections: List[str]) -> Dict[str, Any]:
+    from src.services.qdrant_pool import get_async_qdrant_client
+    from src.services.search import _encode_query, async_search_in_qdrant
+    client = get_async_qdrant_client()
+    embedding = await asyncio.to_thread(_encode_query, "warmup terraform azure")
+    for collection in collections:
+        await async_search_in_qdrant(client, collection, embedding, 1)
+    return {"collections": await collection_counts(collections)}
+
+
+async def _warm_vector_index(collections: List[str]) -> Dict[str, Any]:
+    from src.services.local_vector_index import get_local_index
+    from src.services.search import _encode_query
+    embedding = await asyncio.to_thread(_encode_query, "warmup terraform azure")
+    loaded = {}
+    for collection in collections:
+        index = get_local_index(collection)
+        if index is not None:
+            index.search(embedding, 1)  # trae las páginas del mmap a memoria
+            loaded[collection] = len(index)
+    return {"local_index": loaded}
+
+
+async def _warm_lexical(collections: List[str]) -> Dict[str, Any]:
+    from src.services.lexical_index import ensure_lexical_index, lexical_index_stats
+    if SETTINGS.LEXICAL_INDEX_ENABLED:
+        await asyncio.to_thread(ensure_lexical_index, collections, False)
+    return lexical_index_stats()
+
+
+async def _warm_llm() -> Dict[str, Any]:
+    from src.services.llms import llm
+    # Crear/abrir la conexión del cliente async (models.list no consume tokens)
+    client = getattr(llm, "root_async_client", None)
+    if client is not None and SETTINGS.WARMUP_LLM_PING:
+        await client.models.list()
+    return {"model": SETTINGS.LLM_MODEL_NAME}
+
+
+async def collection_counts(collections: List[str]) -> Dict[str, int]:
+    """Número real de documentos (puntos) por colección"""
+    from src.services.qdrant_pool import get_async_qdrant_client
+    client = get_async_qdrant_client()
+    infos = await asyncio.gather(*(client.get_collection(collection) for collection in collections))
+    return {collection: info.points_count or 0 for collection, info in zip(collections, infos)}
+
+
+_counts_cache: Dict[Tuple[str, ...], Tuple[float, Dict[str, int]]] = {}
+
+
+async def cached_collection_counts(collections: List[str]) -> Dict[str, int]:
+    """
+    collection_counts con timeout (COLLECTION_COUNTS_TIMEOUT_S) y caché de
+    COLLECTION_COUNTS_TTL_S: / y /ready no lanzan una ronda a Qdrant por sondeo.
+    Los fallos no se cachean (lanzan la excepción, p. ej. asyncio.TimeoutError).
+    """
+    key = tuple(collections)
+    cached = _counts_cache.get(key)
+    now = time.monotonic()
+    if cached is not None and now - cached[0] < SETTINGS.COLLECTION_COUNTS_TTL_S:
+        return cached[1]
+    counts = await asyncio.wait_for(collection_counts(collections), timeout=SETTINGS.COLLECTION_COUNTS_TIMEOUT_S)
+    _counts_cache[key] = (time.monotonic(), counts)
+    return counts
+
+
+def _required_steps(collections: List[str]) -> Dict[str, Any]:
+    """Pasos de los componentes imprescindibles, en orden de ejecución"""
+    return {
+        "classifier": _warm_classifier,
+        "embeddings": _warm_embeddings,
+        "qdrant": lambda: _warm_qdrant(collections),
+    }
+
+
+async def _retry_required(collections: List[str]) -> None:
+    """
+    Reintenta con backoff exponencial (WARMUP_RETRY_INITIAL_S hasta
+    WARMUP_RETRY_MAX_S) los pasos imprescindibles que fallaron: un corte breve
+    de Qdrant en el arranque no deja al worker fuera de rotación para siempre.
+    """
+    delay = SETTINGS.WARMUP_RETRY_INITIAL_S
+    while not WARMUP.ready:
+        failed = [c for c in REQUIRED_COMPONENTS if not WARMUP.components.get(c, {}).get("ready")]
+        logger.warning(f"🔁 Reintentando warmup en {delay:.1f}s", source="api", components=failed)
+        await asyncio.sleep(delay)
+        steps = _required_steps(collections)
+        for name in failed:
+            await _step(name, steps[name])
+        delay = min(delay * 2, SETTINGS.WARMUP_RETRY_MAX_S)
+    logger.info("✅ Componentes imprescindibles listos tras reintentar", source="api")
+
+
+async def run_warmup(collections: List[str]) -> WarmupState:
+    """
+    Calienta todos los componentes (en orden: el de Qdrant reutiliza el modelo ya cargado).
+    Si falla alguno imprescindible, se sigue reintentando en segundo plano hasta que esté listo.
+    """
+    WARMUP.started = True
+    start = time.time()
+    logger.info("🔥 Iniciando warmup", source="api", collections=collections)
+
+    for name, step in _required_steps(collections).items():
+        await _step(name, step)
+    if SETTINGS.VECTOR_BACKEND == "local":
+        await _step("vector_index", lambda: _warm_vector_index(collections))
+    await _step("lexical", lambda: _warm_lexical(collections))
+    await _step("llm", _warm_llm)
+
+    WARMUP.finished = True
+    duration = time.time() - start
+    logger.info("✅ Warmup completado", source="api", duration=f"{duration:.2f}s", ready=WARMUP.ready)
+
+    from src.services.prefork import log_process_memory
+    log_process_memory("warmup")
+
+    if not WARMUP.ready:
+        await _retry_required(collections)
+    return WARMUP
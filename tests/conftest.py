@@ -0,0 +1,5 @@
+import os
+
+# src.services.llms crea los clientes de OpenAI al importarse; los tests
+# unitarios no llaman al LLM, pero necesitan poder importar los módulos
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+from src.services.admission import AdmissionController, AdmissionRejected
+
+
+def test_cola_acotada_rechaza_con_queue_full():
+    async def scenario():
+        admission = AdmissionController(max_concurrent=1, max_queue=1, max_wait_s=5, retry_after_s=3)
+        await admission.acquire()
+        waiter = asyncio.ensure_future(admission.acquire())
+        await asyncio.sleep(0)
+        assert admission.queued == 1
+
+        with pytest.raises(AdmissionRejected) as exc_info:
+            await admission.acquire()
+
+        admission.release()
+        await waiter
+        stats = admission.stats()
+        admission.release()
+        return exc_info.value, stats
+
+    rejected, stats = asyncio.run(scenario())
+    assert rejected.reason == "queue_full"
+    assert rejected.retry_after_s == 3
+    assert stats["rejected_queue_full"] == 1
+    assert stats["in_flight"] == 1
+    assert stats["queued"] == 0
+
+
+def test_espera_maxima_rechaza_con_queue_timeout():
+    async def scenario():
+        admission = AdmissionController(max_concurrent=1, max_queue=5, max_wait_s=0.01, retry_after_s=1)
+        await admission.acquire()
+        with pytest.raises(AdmissionRejected) as exc_info:
+            await admission.acquire()
+        return admission, exc_info.value
+
+    admission, rejected = asyncio.run(scenario())
+    assert rejected.reason == "queue_timeout"
+    assert admission.rejected_timeout == 1
+    assert admission.queued == 0
+
+
+def test_slot_se_libera_al_cancelar():
+    async def scenario():
+        admission = AdmissionController(max_concurrent=1, max_queue=1, max_wait_s=5, retry_after_s=1)
+        started = asyncio.Event()
+
+        async def holder():
+            async with admission.slot():
+                started.set()
+                await asyncio.sleep(10)
+
+        task = asyncio.ensure_future(holder())
+        await started.wait()
+        assert admission.in_flight == 1
+
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        # El hueco vuelve a estar libre: se admite otra petición sin esperar
+        await asyncio.wait_for(admission.acquire(), timeout=0.5)
+        admission.release()
+        return admission
+
+    admission = asyncio.run(scenario())
+    assert admission.in_flight == 0
+    assert admission.admitted == 2
+
+
+def test_cancelar_una_peticion_en_cola_no_ocupa_hueco():
+    async def scenario():
+        admission = AdmissionController(max_concurrent=1, max_queue=1, max_wait_s=5, retry_after_s=1)
+        await admission.acquire()
+        waiter = asyncio.ensure_future(admission.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        queued = admission.queued
+        admission.release()
+        return admission, queued
+
+    admission, queued = asyncio.run(scenario())
+    assert queued == 0
+    assert admission.in_flight == 0
+    assert not admission._semaphore.locked()
+
+
+def test_handler_responde_429_con_retry_after():
+    from src.api.api import admission_rejected_handler
+
+    response = asyncio.run(admission_rejected_handler(None, AdmissionRejected("queue_full", 7)))
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "7"
+    assert b'"reason":"queue_full"' in response.body
@@ -0,0 +1,132 @@
+import asyncio
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from src.api import api
+from src.services import relevance_filter, search
+
+
+class _BatchClient:
+    """Cliente async con query_batch_points: un punto por consulta y colección"""
+
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+
+    async def query_batch_points(self, collection_name, requests):
+        if collection_name in self.fail:
+            raise ConnectionError("qdrant caído")
+        return [
+            SimpleNamespace(points=[SimpleNamespace(
+                id=f"{collection_name}-{i}",
+                score=0.9,
+                payload={"page_content": f"{collection_name} {i}", "metadata": {"name": collection_name}},
+            )])
+            for i, _ in enumerate(requests)
+        ]
+
+
+@pytest.fixture
+def batch_env(monkeypatch):
+    monkeypatch.setattr(search.SETTINGS, "VECTOR_BACKEND", "qdrant")
+    monkeypatch.setattr(search, "_encode_queries", lambda queries: np.ones((len(queries), 4), dtype=np.float32))
+    monkeypatch.setattr(
+        relevance_filter, "is_query_in_scope",
+        lambda query, min_keywords=0: (query != "fuera de scope", ""),
+    )
+
+    def use(client):
+        monkeypatch.setattr(search, "get_async_qdrant_client", lambda: client)
+
+    return use
+
+
+def _batch(queries):
+    return asyncio.run(search.async_search_all_collections_batch(queries, ["a", "b"], k_per_collection=2, threshold=0.5))
+
+
+def test_batch_fusiona_las_colecciones_por_consulta(batch_env):
+    batch_env(_BatchClient())
+    results = _batch(["vnet", "fuera de scope", "storage"])
+    assert [h["id"] for h in results[0]] == ["a-0", "b-0"]
+    assert results[1] == []
+    assert [h["id"] for h in results[2]] == ["a-1", "b-1"]
+
+
+def test_fallo_de_una_coleccion_devuelve_none_para_buscar_aparte(batch_env):
+    batch_env(_BatchClient(fail={"b"}))
+    assert _batch(["vnet", "fuera de scope", "storage"]) == [None, [], None]
+
+
+class _Agent:
+    """Agente de prueba: registra los hits precalculados de cada pregunta"""
+
+    def __init__(self, fail_on=None):
+        self.prefetched = {}
+        self.fail_on = fail_on
+
+    async def ainvoke(self, question, k_docs, threshold, chat_history=None, prefetched_hits=None, deadline=None):
+        if question == self.fail_on:
+            raise RuntimeError("llm caído")
+        self.prefetched[question] = prefetched_hits
+        return {"answer": f"respuesta a {question}", "raw_documents": []}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    agent = _Agent()
+    monkeypatch.setattr(api, "get_agent", lambda: agent)
+    return TestClient(api.app), agent
+
+
+def test_endpoint_batch_pasa_los_hits_compartidos(client, monkeypatch):
+    http, agent = client
+
+    async def fake_batch(questions, collections, k, threshold):
+        return [[{"id": q}] for q in questions]
+
+    monkeypatch.setattr(api, "async_search_all_collections_batch", fake_batch)
+    response = http.post("/query/batch", json={"questions": ["q1", "q2"], "k_docs": 3})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [r["answer"] for r in body["results"]] == ["respuesta a q1", "respuesta a q2"]
+    assert agent.prefetched == {"q1": [{"id": "q1"}], "q2": [{"id": "q2"}]}
+
+
+def test_endpoint_batch_sin_hits_busca_por_pregunta(client, monkeypatch):
+    http, agent = client
+
+    async def partial_batch(questions, collections, k, threshold):
+        return [None for _ in questions]
+
+    monkeypatch.setattr(api, "async_search_all_collections_batch", partial_batch)
+    assert http.post("/query/batch", json={"questions": ["q1", "q2"]}).status_code == 200
+    assert agent.prefetched == {"q1": None, "q2": None}
+
+
+def test_endpoint_batch_error_en_busqueda_compartida(client, monkeypatch):
+    http, agent = client
+
+    async def broken_batch(questions, collections, k, threshold):
+        raise ConnectionError("qdrant caído")
+
+    monkeypatch.setattr(api, "async_search_all_collections_batch", broken_batch)
+    assert http.post("/query/batch", json={"questions": ["q1"]}).status_code == 200
+    assert agent.prefetched == {"q1": None}
+
+
+def test_endpoint_batch_error_de_una_pregunta_no_tumba_el_lote(client, monkeypatch):
+    http, agent = client
+    agent.fail_on = "q2"
+
+    async def fake_batch(questions, collections, k, threshold):
+        return [[] for _ in questions]
+
+    monkeypatch.setattr(api, "async_search_all_collections_batch", fake_batch)
+    results = http.post("/query/batch", json={"questions": ["q1", "q2"]}).json()["results"]
+    assert results[0]["error"] is None
+    assert results[1]["error"] == "llm caído"
+    assert results[1]["answer"] == ""
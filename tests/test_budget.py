@@ -0,0 +1,53 @@
+import pytest
+
+from src.Agent import budget
+from src.Agent.budget import deadline_from_timeout, has_budget, has_llm_budget, qdrant_timeout, remaining
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [500.0]
+    monkeypatch.setattr(budget.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_deadline_from_timeout():
+    assert deadline_from_timeout(None) is None
+    assert deadline_from_timeout(0) is None
+    assert deadline_from_timeout(-5) is None
+    assert deadline_from_timeout(1500, start=10.0) == pytest.approx(11.5)
+
+
+def test_remaining(clock):
+    assert remaining({}) is None
+    assert remaining({"deadline": None}) is None
+    assert remaining({"deadline": 502.5}) == pytest.approx(2.5)
+    # Deadline ya vencido: 0, nunca negativo
+    assert remaining({"deadline": 499.0}) == 0.0
+
+
+def test_has_budget(clock):
+    assert has_budget({})
+    assert has_budget({"deadline": 501.0}, needed_s=0.5)
+    assert not has_budget({"deadline": 501.0}, needed_s=1.0)
+    assert not has_budget({"deadline": 500.0})
+
+
+def test_has_llm_budget(clock, monkeypatch):
+    monkeypatch.setattr(budget.SETTINGS, "DEADLINE_MIN_LLM_S", 1.5)
+    assert has_llm_budget({})
+    assert has_llm_budget({"deadline": 502.0})
+    assert not has_llm_budget({"deadline": 501.5})
+    assert not has_llm_budget({"deadline": 501.0})
+
+
+@pytest.mark.parametrize(
+    "left, expected",
+    [(0.0, 1), (0.2, 1), (1.0, 1), (1.01, 2), (2.5, 3), (10.0, 10)],
+)
+def test_qdrant_timeout_redondea_hacia_arriba(clock, left, expected):
+    assert qdrant_timeout({"deadline": 500.0 + left}) == expected
+
+
+def test_qdrant_timeout_sin_deadline(clock):
+    assert qdrant_timeout({}) is None
@@ -0,0 +1,149 @@
+import socket
+import threading
+import time
+from concurrent.futures import CancelledError
+
+import numpy as np
+import pytest
+
+from src.services import embedding_batcher, embeddings
+from src.services.embedding_batcher import EmbeddingBatcher, SidecarClient, _recv, _send
+
+DIM = 4
+
+
+class _RecordingEncoder:
+    """encode_fn de prueba: un vector por texto (su longitud) y registro de los lotes"""
+
+    def __init__(self, block: bool = False, fail: bool = False):
+        self.batches = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        if not block:
+            self.release.set()
+        self.fail = fail
+
+    def __call__(self, texts):
+        self.batches.append(list(texts))
+        self.started.set()
+        self.release.wait(5)
+        if self.fail:
+            raise RuntimeError("modelo sin memoria")
+        return np.array([[len(t)] * DIM for t in texts], dtype=np.float32)
+
+
+def test_lote_acotado_por_tamano():
+    encoder = _RecordingEncoder()
+    batcher = EmbeddingBatcher(encoder, max_batch_size=4, max_wait_ms=200)
+    futures = [batcher.submit("x" * i) for i in range(10)]
+    results = [f.result(timeout=5) for f in futures]
+
+    assert [len(b) for b in encoder.batches] == [4, 4, 2]
+    assert [int(r[0]) for r in results] == list(range(10))
+
+
+def test_lote_acotado_por_espera():
+    encoder = _RecordingEncoder()
+    batcher = EmbeddingBatcher(encoder, max_batch_size=100, max_wait_ms=20)
+    start = time.monotonic()
+    batcher.encode("a", timeout=5)
+    assert time.monotonic() - start < 1.0
+    time.sleep(0.1)
+    batcher.encode("bb", timeout=5)
+    assert encoder.batches == [["a"], ["bb"]]
+
+
+def test_futures_cancelados_no_se_codifican():
+    encoder = _RecordingEncoder(block=True)
+    batcher = EmbeddingBatcher(encoder, max_batch_size=8, max_wait_ms=0)
+    first = batcher.submit("primero")
+    assert encoder.started.wait(5)
+
+    cancelled = batcher.submit("cancelado")
+    assert cancelled.cancel()
+    kept = batcher.submit("vigente")
+    encoder.release.set()
+
+    assert int(first.result(timeout=5)[0]) == len("primero")
+    assert int(kept.result(timeout=5)[0]) == len("vigente")
+    with pytest.raises(CancelledError):
+        cancelled.result()
+    assert all("cancelado" not in batch for batch in encoder.batches)
+
+
+def test_timeout_del_llamante_cancela_su_future():
+    encoder = _RecordingEncoder(block=True)
+    batcher = EmbeddingBatcher(encoder, max_batch_size=8, max_wait_ms=0)
+    batcher.submit("bloquea")
+    assert encoder.started.wait(5)
+    with pytest.raises(TimeoutError):
+        batcher.encode("tarde", timeout=0.01)
+    encoder.release.set()
+    assert batcher.encode("siguiente", timeout=5) is not None
+    assert all("tarde" not in batch for batch in encoder.batches)
+
+
+def test_excepcion_del_encode_llega_a_todo_el_lote():
+    encoder = _RecordingEncoder(fail=True)
+    batcher = EmbeddingBatcher(encoder, max_batch_size=8, max_wait_ms=50)
+    futures = [batcher.submit(t) for t in ("a", "b", "c")]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="modelo sin memoria"):
+            future.result(timeout=5)
+
+
+@pytest.fixture
+def sidecar(tmp_path, monkeypatch):
+    """Sidecar real sobre un socket Unix temporal, con un batcher de prueba"""
+    socket_path = str(tmp_path / "emb.sock")
+    monkeypatch.setattr(embedding_batcher, "_batcher", EmbeddingBatcher(_RecordingEncoder(), 8, 1))
+    monkeypatch.setattr(embedding_batcher.SETTINGS, "EMBEDDING_SIDECAR_MAX_REQUEST_BYTES", 1024)
+    server = embedding_batcher._SidecarServer(socket_path, embedding_batcher._SidecarHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield socket_path
+    server.shutdown()
+    server.server_close()
+
+
+def test_sidecar_encode_y_ping(sidecar):
+    client = SidecarClient(sidecar, timeout_s=5)
+    matrix = client.encode(["query: a", "query: bbb"])
+    assert matrix.shape == (2, DIM)
+    assert matrix[:, 0].tolist() == [len("query: a"), len("query: bbb")]
+    assert client.ping()
+
+
+def test_sidecar_cierra_peticiones_demasiado_grandes(sidecar):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.settimeout(5)
+        conn.connect(sidecar)
+        _send(conn, b'{"texts": ["' + b"x" * 2048 + b'"]}')
+        with pytest.raises(ConnectionError):
+            _recv(conn)
+
+
+def test_recv_respeta_el_maximo():
+    left, right = socket.socketpair()
+    with left, right:
+        _send(left, b"x" * 100)
+        with pytest.raises(ValueError):
+            _recv(right, max_size=10)
+
+
+def test_ping_sin_sidecar(tmp_path):
+    assert not SidecarClient(str(tmp_path / "no_existe.sock"), timeout_s=1).ping()
+
+
+def test_sin_sidecar_falla_o_codifica_en_local(tmp_path, monkeypatch):
+    monkeypatch.setattr(embedding_batcher, "_client", SidecarClient(str(tmp_path / "no_existe.sock"), timeout_s=1))
+    monkeypatch.setattr(embedding_batcher, "_sidecar_retry_at", 0.0)
+    monkeypatch.setattr(embeddings, "_encode", lambda texts, mode: np.ones((len(texts), DIM), dtype=np.float32))
+
+    monkeypatch.setattr(embedding_batcher.SETTINGS, "EMBEDDING_SIDECAR_FALLBACK", "fail")
+    with pytest.raises(OSError):
+        embedding_batcher.sidecar_encode(["query: a"])
+
+    monkeypatch.setattr(embedding_batcher.SETTINGS, "EMBEDDING_SIDECAR_FALLBACK", "local")
+    assert embedding_batcher.sidecar_encode(["query: a"]).shape == (1, DIM)
+    assert embedding_batcher._sidecar_retry_at > time.monotonic()
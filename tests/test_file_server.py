@@ -0,0 +1,106 @@
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from src.api import file_server
+from src.api.file_server import _parse_range
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ("bytes=0-99", (0, 99)),
+        ("bytes=100-", (100, 999)),
+        ("bytes=900-5000", (900, 999)),   # el fin se recorta al tamaño
+        ("bytes=-100", (900, 999)),       # sufijo: últimos 100 bytes
+        ("bytes=-5000", (0, 999)),        # sufijo mayor que el fichero
+        ("bytes=0-0,10-20", None),        # multi-rango: se ignora
+        ("items=0-10", None),             # unidad no soportada
+        ("bytes=10", None),
+    ],
+)
+def test_parse_range(header, expected):
+    assert _parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=500-100", "bytes=-0", "bytes=a-b"])
+def test_parse_range_no_satisfacible(header):
+    with pytest.raises(ValueError):
+        _parse_range(header, 1000)
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    (data_dir / "doc.pdf").write_bytes(bytes(range(256)) * 4)
+    (data_dir / "main.tf").write_text('resource "azurerm_resource_group" "rg" {}\n', encoding="utf-8")
+    (tmp_path / "secret.txt").write_text("secreto", encoding="utf-8")
+    monkeypatch.setattr(file_server, "DATA_DIR", data_dir.resolve())
+
+    app = FastAPI()
+
+    @app.get("/viewer/{path:path}")
+    def viewer(path: str, request: Request):
+        return file_server.serve_file(request, path)
+
+    return TestClient(app)
+
+
+def test_fichero_completo_con_etag(client):
+    response = client.get("/viewer/doc.pdf")
+    assert response.status_code == 200
+    assert len(response.content) == 1024
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["etag"].startswith('"')
+
+
+def test_if_none_match_devuelve_304(client):
+    etag = client.get("/viewer/main.tf").headers["etag"]
+    assert client.get("/viewer/main.tf", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/viewer/main.tf", headers={"If-None-Match": f"W/{etag}"}).status_code == 304
+    assert client.get("/viewer/main.tf", headers={"If-None-Match": '"otro"'}).status_code == 200
+
+
+def test_rango_simple_206(client):
+    response = client.get("/viewer/doc.pdf", headers={"Range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.content == bytes(range(10, 20))
+    assert response.headers["content-range"] == "bytes 10-19/1024"
+
+
+def test_rango_sufijo_206(client):
+    response = client.get("/viewer/doc.pdf", headers={"Range": "bytes=-4"})
+    assert response.status_code == 206
+    assert response.content == bytes([252, 253, 254, 255])
+    assert response.headers["content-range"] == "bytes 1020-1023/1024"
+
+
+def test_rango_en_fichero_cacheado_206(client):
+    response = client.get("/viewer/main.tf", headers={"Range": "bytes=0-7"})
+    assert response.status_code == 206
+    assert response.content == b"resource"
+
+
+def test_rango_no_satisfacible_416(client):
+    response = client.get("/viewer/doc.pdf", headers={"Range": "bytes=2000-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == "bytes */1024"
+
+
+def test_if_range_distinto_ignora_el_rango(client):
+    response = client.get("/viewer/doc.pdf", headers={"Range": "bytes=0-9", "If-Range": '"viejo"'})
+    assert response.status_code == 200
+    assert len(response.content) == 1024
+
+
+@pytest.mark.parametrize("path", ["../secret.txt", "..%2Fsecret.txt", "/etc/passwd", "no_existe.md"])
+def test_rutas_fuera_de_data_dan_404(client, path):
+    assert client.get(f"/viewer/{path}").status_code == 404
+
+
+def test_resolve_data_path_rechaza_traversal(client, tmp_path):
+    assert file_server.resolve_data_path("../secret.txt") is None
+    assert file_server.resolve_data_path("sub/../../secret.txt") is None
+    assert file_server.resolve_data_path("doc\x00.pdf") is None
+    assert file_server.resolve_data_path("doc.pdf") == file_server.DATA_DIR / "doc.pdf"
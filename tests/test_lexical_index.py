@@ -0,0 +1,141 @@
+import asyncio
+import threading
+
+import pytest
+
+from src.Agent.nodes import retrieval
+from src.Agent.nodes.decision import _find_best_template
+from src.Agent.state import DocumentScore
+from src.services import lexical_index
+from src.services.lexical_index import LexicalIndex, is_lexical_hit, tokenize
+
+STORAGE_TF = 'resource "azurerm_storage_account" "sa" {\n  name = "stdemo"\n}'
+
+
+def _payload(content, resource_types=(), azure_resources=()):
+    return {
+        "page_content": content,
+        "metadata": {
+            "name": content[:20],
+            "resource_types": list(resource_types),
+            "azure_resources": list(azure_resources),
+        },
+    }
+
+
+@pytest.fixture
+def index():
+    idx = LexicalIndex("gen-1")
+    # 0: declara el recurso en los metadatos (mapa exacto)
+    idx.add("examples_terraform", "p0", _payload(STORAGE_TF, resource_types=["azurerm_storage_account"]))
+    # 1: lo menciona solo en el texto
+    idx.add("terraform_book", "p1", _payload("Use azurerm_storage_account to create a storage account in Azure."))
+    # 2: lo declara vía azure_resources (sin prefijo)
+    idx.add("examples_terraform", "p2", _payload("cuenta de almacenamiento", azure_resources=["storage_account"]))
+    # 3: otro recurso
+    idx.add("examples_terraform", "p3", _payload('resource "azurerm_virtual_network" "vnet" {}', resource_types=["azurerm_virtual_network"]))
+    # 4: sin relación
+    idx.add("terraform_book", "p4", _payload("Terraform state and remote backends."))
+    return idx.finalize()
+
+
+def test_tokenize_mantiene_identificadores():
+    assert tokenize("Crear azurerm_storage_account, con HTTPS") == ["crear", "azurerm_storage_account", "con", "https"]
+
+
+def test_identifiers_solo_los_conocidos(index):
+    assert index.identifiers("azurerm_storage_account y azurerm_key_vault") == ["azurerm_storage_account"]
+    assert index.identifiers("crear una cuenta de almacenamiento") == []
+
+
+def test_sin_identificador_no_hay_hits(index):
+    assert index.search("crear una cuenta de almacenamiento", k=5) == []
+
+
+def test_mapa_exacto_por_delante_de_la_mencion_en_texto(index):
+    hits = index.search("ejemplo de azurerm_storage_account", k=5)
+    ids = [h["id"] for h in hits]
+    assert set(ids) == {"p0", "p1", "p2"}
+    # Los que declaran el recurso (boost exacto) van antes que el que solo lo menciona
+    assert ids[-1] == "p1"
+    assert hits[0]["score"] == 1.0
+    assert all(0 < h["score"] <= 1.0 for h in hits)
+    assert [h["score"] for h in hits] == sorted((h["score"] for h in hits), reverse=True)
+
+
+def test_bm25_prefiere_mas_ocurrencias_en_texto_corto():
+    idx = LexicalIndex("gen-1")
+    idx.add("terraform_book", "once", _payload("azurerm_key_vault " + "relleno " * 30))
+    idx.add("terraform_book", "twice", _payload("azurerm_key_vault azurerm_key_vault notas"))
+    idx.finalize()
+    assert [h["id"] for h in idx.search("azurerm_key_vault", k=5)] == ["twice", "once"]
+
+
+def test_hits_marcados_como_lexicos_sin_tocar_el_indice(index):
+    hit = index.search("azurerm_virtual_network", k=5)[0]
+    assert is_lexical_hit(hit["metadata"])
+    assert hit["metadata"]["lexical_score"] > 0
+    hit["metadata"]["ref"] = "http://x"
+    assert "retrieval" not in index.docs[3]["metadata"]
+    assert "ref" not in index.docs[3]["metadata"]
+
+
+def test_min_relative_score_y_colecciones(index):
+    hits = index.search("azurerm_storage_account", k=5, min_relative_score=0.9)
+    assert "p1" not in [h["id"] for h in hits]
+    hits = index.search("azurerm_storage_account", k=5, collections=["terraform_book"])
+    assert [h["id"] for h in hits] == ["p1"]
+    assert len(index.search("azurerm_storage_account", k=1)) == 1
+
+
+def test_lexical_search_usa_el_indice_de_la_generacion_actual(index, monkeypatch):
+    monkeypatch.setattr(lexical_index.SETTINGS, "LEXICAL_MIN_RELATIVE_SCORE", 0.5)
+    monkeypatch.setattr(lexical_index, "_index", index)
+    monkeypatch.setattr(lexical_index, "get_index_generation", lambda: "gen-1")
+    hits = lexical_index.lexical_search("azurerm_storage_account", ["examples_terraform", "terraform_book"], 5)
+    # p1 (solo mención en el texto) queda por debajo de LEXICAL_MIN_RELATIVE_SCORE
+    assert [h["id"] for h in hits] == ["p0", "p2"]
+    assert lexical_index.lexical_search("crear una vnet", ["examples_terraform"], 5) == []
+
+
+def test_hit_lexico_no_decide_return_template():
+    lexical = DocumentScore(
+        content=STORAGE_TF,
+        metadata={"retrieval": "lexical", "lexical_score": 14.2},
+        relevance_score=1.0,
+        source="examples/storage/main.tf",
+    )
+    assert _find_best_template([lexical], threshold=0.82) == (None, False)
+
+    dense = DocumentScore(content=STORAGE_TF, metadata={}, relevance_score=0.9, source="examples/storage/main.tf")
+    assert _find_best_template([lexical, dense], threshold=0.82) == (dense, True)
+
+
+def test_nodo_async_puntua_fuera_del_event_loop(monkeypatch):
+    threads = []
+
+    def fake_lexical_search(query, collections, k):
+        threads.append(threading.get_ident())
+        return [{"id": "p0", "score": 1.0, "content": STORAGE_TF, "metadata": {"retrieval": "lexical"}, "collection": "examples_terraform"}]
+
+    monkeypatch.setattr(lexical_index.SETTINGS, "LEXICAL_INDEX_ENABLED", True)
+    monkeypatch.setattr(retrieval, "lexical_search", fake_lexical_search)
+
+    async def scenario():
+        state = {"question": "ejemplo de azurerm_storage_account", "k_docs": 3, "threshold": 0.8, "messages": []}
+        result = await retrieval.aretrieve_documents(state)
+        return threading.get_ident(), result
+
+    loop_thread, result = asyncio.run(scenario())
+    assert threads and threads[0] != loop_thread
+    assert [d.content for d in result["raw_documents"]] == [STORAGE_TF]
+
+
+def test_sin_identificador_no_salta_a_un_hilo(monkeypatch):
+    monkeypatch.setattr(lexical_index.SETTINGS, "LEXICAL_INDEX_ENABLED", True)
+
+    async def forbidden(*args, **kwargs):
+        raise AssertionError("no debería usar un hilo")
+
+    monkeypatch.setattr(retrieval.asyncio, "to_thread", forbidden)
+    assert asyncio.run(retrieval._alexical_hits({"k_docs": 3}, "crear una vnet")) == []
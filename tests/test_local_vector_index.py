@@ -0,0 +1,148 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from src.services import embeddings
+from src.services import local_vector_index as lvi
+
+DIM = 16
+
+
+class _ScrollClient:
+    """Cliente con el scroll paginado de Qdrant sobre una lista de puntos"""
+
+    def __init__(self, points, fail=False):
+        self.points = points
+        self.fail = fail
+
+    def scroll(self, collection_name, limit, offset=None, with_payload=True, with_vectors=True):
+        if self.fail:
+            raise ConnectionError("qdrant caído")
+        start = offset or 0
+        page = self.points[start:start + limit]
+        next_offset = start + limit if start + limit < len(self.points) else None
+        return page, next_offset
+
+
+def _points(n, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(n, DIM)).astype(np.float32)
+    return [
+        SimpleNamespace(id=f"p{i}", vector=vectors[i].tolist(), payload={"page_content": f"chunk {i}", "metadata": {"i": i}})
+        for i in range(n)
+    ]
+
+
+@pytest.fixture
+def env(tmp_path, monkeypatch):
+    state = {"model": "modelo-a", "generation": "gen-1"}
+    monkeypatch.setattr(lvi.SETTINGS, "LOCAL_INDEX_DIR", str(tmp_path))
+    monkeypatch.setattr(lvi, "CHECK_INTERVAL_S", 0.0)
+    monkeypatch.setattr(lvi, "_indexes", {})
+    monkeypatch.setattr(lvi, "_usable", {})
+    monkeypatch.setattr(lvi, "_last_check", {})
+    monkeypatch.setattr(lvi, "get_index_generation", lambda: state["generation"])
+    monkeypatch.setattr(embeddings, "resolve_model_name", lambda: state["model"])
+    state["dir"] = tmp_path
+    return state
+
+
+def _brute_force(index, query, k):
+    scores = index.vectors.astype(np.float32) @ query
+    order = np.argsort(-scores)[:k]
+    return order, scores[order]
+
+
+def test_top_k_igual_que_fuerza_bruta(env, monkeypatch):
+    monkeypatch.setattr(lvi, "BLOCK_ROWS", 64)  # varios bloques
+    lvi.export_collection("col", client=_ScrollClient(_points(1000)))
+    index = lvi.get_local_index("col")
+    assert len(index) == 1000
+
+    rng = np.random.default_rng(1)
+    for _ in range(5):
+        query = rng.normal(size=DIM).astype(np.float32)
+        query /= np.linalg.norm(query)
+        rows, scores = index.top_k(query, 10)
+        expected_rows, expected_scores = _brute_force(index, query, 10)
+        np.testing.assert_allclose(scores, expected_scores, rtol=1e-5)
+        assert set(rows.tolist()) == set(expected_rows.tolist())
+
+        points = index.search(query, 10)
+        assert [p.id for p in points] == [f"p{r}" for r in rows]
+        assert points[0].payload["metadata"]["i"] == int(rows[0])
+
+
+def test_search_corta_por_threshold(env):
+    lvi.export_collection("col", client=_ScrollClient(_points(300)))
+    index = lvi.get_local_index("col")
+    query = index.vectors[7].astype(np.float32)
+    _, expected_scores = _brute_force(index, query, 50)
+    threshold = float(expected_scores[9])
+
+    points = index.search(query, 50, score_threshold=threshold)
+    assert points[0].id == "p7"
+    assert all(p.score >= threshold for p in points)
+    assert len(points) == int((expected_scores >= threshold).sum())
+    assert all(p.payload is None for p in index.search(query, 3, with_payload=False))
+
+
+def test_coleccion_vacia(env):
+    meta = lvi.export_collection("vacia", client=_ScrollClient([]))
+    assert meta["count"] == 0
+    index = lvi.get_local_index("vacia")
+    rows, scores = index.top_k(np.ones(DIM, dtype=np.float32), 5)
+    assert len(rows) == len(scores) == 0
+    assert lvi.local_search("vacia", np.ones(DIM, dtype=np.float32), 5) == []
+
+
+def test_sin_export_se_usa_qdrant(env):
+    assert lvi.get_local_index("nunca_exportada") is None
+    assert lvi.local_search("nunca_exportada", np.ones(DIM, dtype=np.float32), 5) is None
+
+
+def test_generacion_o_modelo_distintos_descartan_el_export(env):
+    lvi.export_collection("col", client=_ScrollClient(_points(10)))
+    assert lvi.get_local_index("col") is not None
+
+    env["generation"] = "gen-2"
+    assert lvi.get_local_index("col") is None
+    lvi.export_collection("col", client=_ScrollClient(_points(10)))
+    assert lvi.get_local_index("col") is not None
+
+    env["model"] = "modelo-b"
+    assert lvi.get_local_index("col") is None
+
+
+def test_reexport_cambia_de_version_y_poda_las_antiguas(env):
+    for seed in range(4):
+        lvi.export_collection("col", client=_ScrollClient(_points(5 + seed, seed=seed)))
+        assert len(lvi.get_local_index("col")) == 5 + seed
+
+    versions = sorted(p.name for p in (env["dir"] / "col").iterdir())
+    assert len(versions) == lvi.KEEP_VERSIONS
+    assert (env["dir"] / "col.current").read_text(encoding="utf-8") == versions[-1]
+
+
+def test_version_corrupta_mantiene_la_cargada(env):
+    lvi.export_collection("col", client=_ScrollClient(_points(10)))
+    loaded = lvi.get_local_index("col")
+
+    broken = env["dir"] / "col" / "99999999999999999999"
+    broken.mkdir()
+    (broken / "meta.json").write_text("{no es json", encoding="utf-8")
+    (env["dir"] / "col.current").write_text(broken.name, encoding="utf-8")
+
+    assert lvi.get_local_index("col") is loaded
+
+
+def test_export_fallido_no_se_publica(env):
+    lvi.export_collection("col", client=_ScrollClient(_points(10)))
+    pointer = (env["dir"] / "col.current").read_text(encoding="utf-8")
+
+    with pytest.raises(ConnectionError):
+        lvi.export_collection("col", client=_ScrollClient(_points(10), fail=True))
+
+    assert (env["dir"] / "col.current").read_text(encoding="utf-8") == pointer
+    assert [p.name for p in (env["dir"] / "col").iterdir()] == [pointer]
@@ -0,0 +1,69 @@
+import os
+
+import pytest
+
+from src.services import manifest
+from src.services.manifest import ManifestCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(manifest.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def manifest_file(tmp_path):
+    path = tmp_path / "manifest.yaml"
+    path.write_text("embeddings_model: modelo-a\nexamples: []\n", encoding="utf-8")
+    return path
+
+
+def _rewrite(path, text, mtime_ns):
+    path.write_text(text, encoding="utf-8")
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_se_parsea_una_vez(clock, manifest_file):
+    cache = ManifestCache(manifest_file, check_interval_s=5)
+    assert cache.get()["embeddings_model"] == "modelo-a"
+    clock[0] += 10
+    assert cache.get()["embeddings_model"] == "modelo-a"
+    assert cache.loads == 1
+
+
+def test_no_relee_dentro_del_intervalo(clock, manifest_file):
+    cache = ManifestCache(manifest_file, check_interval_s=5)
+    cache.get()
+    _rewrite(manifest_file, "embeddings_model: modelo-b\n", 2_000_000_000_000_000_000)
+    clock[0] += 4
+    assert cache.get()["embeddings_model"] == "modelo-a"
+    clock[0] += 2
+    assert cache.get()["embeddings_model"] == "modelo-b"
+    assert cache.loads == 2
+
+
+def test_cambio_de_firma_sin_cambio_de_contenido_no_reparsea(clock, manifest_file):
+    cache = ManifestCache(manifest_file, check_interval_s=0)
+    first = cache.get()
+    digest = cache.stats()["digest"]
+    _rewrite(manifest_file, manifest_file.read_text(encoding="utf-8"), 2_000_000_000_000_000_000)
+    clock[0] += 1
+    assert cache.get() is first
+    assert cache.loads == 1
+    assert cache.stats()["digest"] == digest
+
+
+def test_fichero_borrado_mantiene_la_ultima_version(clock, manifest_file):
+    cache = ManifestCache(manifest_file, check_interval_s=0)
+    cache.get()
+    manifest_file.unlink()
+    clock[0] += 1
+    assert cache.get()["embeddings_model"] == "modelo-a"
+
+
+def test_sin_fichero_en_la_primera_carga_falla(clock, tmp_path):
+    cache = ManifestCache(tmp_path / "no_existe.yaml")
+    with pytest.raises(FileNotFoundError):
+        cache.get()
@@ -0,0 +1,52 @@
+from src.services.search import _merge_hits
+
+
+def _hit(collection, pid, score, content=None):
+    return {"id": pid, "collection": collection, "score": score, "content": content if content is not None else f"{collection}/{pid}"}
+
+
+def _ids(hits):
+    return [(h["collection"], h["id"]) for h in hits]
+
+
+def test_ordena_por_score_entre_colecciones():
+    merged = _merge_hits(
+        [[_hit("a", 1, 0.9), _hit("a", 2, 0.6)], [_hit("b", 1, 0.95), _hit("b", 2, 0.7)]],
+        k_per_collection=2,
+        collections=["a", "b"],
+    )
+    assert _ids(merged) == [("b", 1), ("a", 1), ("b", 2), ("a", 2)]
+
+
+def test_corta_en_k_por_coleccion_por_numero_de_colecciones():
+    hit_lists = [[_hit("a", i, 0.9 - i / 100) for i in range(5)], [_hit("b", i, 0.5) for i in range(5)]]
+    merged = _merge_hits(hit_lists, k_per_collection=3, collections=["a", "b"])
+    # El corte es global: una colección puede llevarse todos los huecos
+    assert len(merged) == 6
+    assert _ids(merged)[:5] == [("a", i) for i in range(5)]
+    assert merged[-1]["collection"] == "b"
+
+
+def test_deduplica_contenido_repetido_quedandose_el_mejor():
+    merged = _merge_hits(
+        [[_hit("a", 1, 0.8, "mismo chunk"), _hit("a", 2, 0.7)], [_hit("b", 9, 0.9, "mismo chunk")]],
+        k_per_collection=2,
+        collections=["a", "b"],
+    )
+    assert _ids(merged) == [("b", 9), ("a", 2)]
+
+
+def test_sin_contenido_deduplica_por_coleccion_e_id():
+    # Fase 1 de la recuperación en dos fases: hits sin contenido
+    merged = _merge_hits(
+        [[_hit("a", 1, 0.8, ""), _hit("a", 1, 0.8, "")], [_hit("b", 1, 0.7, "")]],
+        k_per_collection=2,
+        collections=["a", "b"],
+    )
+    assert _ids(merged) == [("a", 1), ("b", 1)]
+
+
+def test_empates_conservan_el_orden_de_llegada_y_vacios():
+    merged = _merge_hits([[_hit("a", 1, 0.5)], [], [_hit("c", 1, 0.5)]], k_per_collection=1, collections=["a", "b", "c"])
+    assert _ids(merged) == [("a", 1), ("c", 1)]
+    assert _merge_hits([[], []], k_per_collection=3, collections=["a", "b"]) == []
@@ -0,0 +1,39 @@
+import json
+
+import pytest
+
+tokenizers = pytest.importorskip("tokenizers")
+
+from src.services.onnx_embeddings import configure_padding
+
+# Como e5 / XLM-R: "<s>" es el id 0 y "<pad>" el 1
+VOCAB = {"<s>": 0, "<pad>": 1, "</s>": 2, "<unk>": 3, "crear": 4, "una": 5, "vnet": 6, "[PAD]": 7}
+
+
+def _tokenizer():
+    tokenizer = tokenizers.Tokenizer(tokenizers.models.WordLevel(VOCAB, unk_token="<unk>"))
+    tokenizer.pre_tokenizer = tokenizers.pre_tokenizers.Whitespace()
+    return tokenizer
+
+
+def test_padding_con_el_token_del_modelo(tmp_path):
+    tokenizer = _tokenizer()
+    assert configure_padding(tokenizer, tmp_path) == ("<pad>", 1)
+
+    short, long = tokenizer.encode_batch(["vnet", "crear una vnet"])
+    assert short.ids == [6, 1, 1]
+    assert short.attention_mask == [1, 0, 0]
+    assert long.ids == [4, 5, 6]
+
+
+def test_pad_token_declarado_en_el_export(tmp_path):
+    (tmp_path / "special_tokens_map.json").write_text(json.dumps({"pad_token": {"content": "[PAD]"}}), encoding="utf-8")
+    tokenizer = _tokenizer()
+    assert configure_padding(tokenizer, tmp_path) == ("[PAD]", 7)
+    assert tokenizer.encode_batch(["vnet", "crear una"])[0].ids == [6, 7]
+
+
+def test_sin_token_de_padding_falla(tmp_path):
+    tokenizer = tokenizers.Tokenizer(tokenizers.models.WordLevel({"<unk>": 0, "vnet": 1}, unk_token="<unk>"))
+    with pytest.raises(ValueError):
+        configure_padding(tokenizer, tmp_path)
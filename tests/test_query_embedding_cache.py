@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from src.services import embeddings
+from src.services.embeddings import QUERY_PREFIX, QueryEmbeddingCache
+
+DIM = 4
+
+
+def _vec(value):
+    return np.full(DIM, value, dtype=np.float32)
+
+
+def test_hit_y_miss():
+    cache = QueryEmbeddingCache(max_size=4)
+    key = ("modelo", "crear una vnet")
+    assert cache.get(key) is None
+    cache.set(key, _vec(1.0))
+    assert np.array_equal(cache.get(key), _vec(1.0))
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+
+def test_lru_expulsa_la_menos_usada():
+    cache = QueryEmbeddingCache(max_size=2)
+    cache.set(("m", "a"), _vec(1.0))
+    cache.set(("m", "b"), _vec(2.0))
+    cache.get(("m", "a"))  # "a" pasa a la más reciente
+    cache.set(("m", "c"), _vec(3.0))
+
+    assert cache.get(("m", "b")) is None
+    assert cache.get(("m", "a")) is not None
+    assert cache.get(("m", "c")) is not None
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["size"] == 2
+
+
+def test_entradas_de_solo_lectura():
+    cache = QueryEmbeddingCache(max_size=2)
+    cache.set(("m", "a"), _vec(1.0))
+    with pytest.raises(ValueError):
+        cache.get(("m", "a"))[0] = 5.0
+
+
+def test_desactivada_con_tamano_cero():
+    cache = QueryEmbeddingCache(max_size=0)
+    cache.set(("m", "a"), _vec(1.0))
+    assert cache.get(("m", "a")) is None
+    assert cache.stats()["size"] == 0
+
+
+@pytest.fixture
+def encoder(monkeypatch):
+    """Sustituye el modelo: registra los textos codificados y devuelve un vector por texto"""
+    calls = []
+
+    def fake_encode(texts, mode):
+        calls.append(list(texts))
+        return np.stack([_vec(float(len(t))) for t in texts])
+
+    monkeypatch.setattr(embeddings, "query_cache", QueryEmbeddingCache(max_size=8))
+    monkeypatch.setattr(embeddings, "_model_name", "modelo-a")
+    monkeypatch.setattr(embeddings, "_encode_query_texts", fake_encode)
+    return calls
+
+
+def test_encode_query_codifica_el_texto_con_prefijo_una_vez(encoder):
+    first = embeddings.encode_query("crear una vnet")
+    second = embeddings.encode_query("  crear   una vnet ")
+    assert encoder == [[QUERY_PREFIX + "crear una vnet"]]
+    assert second is first
+    assert embeddings.query_cache.stats()["hits"] == 1
+
+
+def test_clave_distingue_mayusculas_y_modelo(encoder, monkeypatch):
+    embeddings.encode_query("crear una vnet")
+    embeddings.encode_query("Crear una VNet")
+    monkeypatch.setattr(embeddings, "_model_name", "modelo-b")
+    embeddings.encode_query("crear una vnet")
+    assert len(encoder) == 3
+
+
+def test_encode_queries_solo_codifica_las_que_faltan(encoder):
+    cached = embeddings.encode_query("a")
+    matrix = embeddings.encode_queries(["a", "bb", "ccc"])
+    assert encoder[-1] == [QUERY_PREFIX + "bb", QUERY_PREFIX + "ccc"]
+    assert np.array_equal(matrix[0], cached)
+    assert matrix.shape == (3, DIM)
+    assert embeddings.query_cache.stats()["size"] == 3
@@ -0,0 +1,67 @@
+import pytest
+
+from src.services import response_cache as response_cache_module
+from src.services.response_cache import ResponseCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(response_cache_module.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def generation(monkeypatch):
+    current = ["gen-1"]
+    monkeypatch.setattr(response_cache_module, "get_index_generation", lambda: current[0])
+    return current
+
+
+def test_hit_y_miss(clock, generation):
+    cache = ResponseCache(max_size=4, ttl_s=60)
+    assert cache.get("a") is None
+    cache.set("a", {"answer": "A"})
+    assert cache.get("a") == {"answer": "A"}
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+
+def test_expira_tras_el_ttl(clock, generation):
+    cache = ResponseCache(max_size=4, ttl_s=60)
+    cache.set("a", {"answer": "A"})
+    clock[0] += 59
+    assert cache.get("a") is not None
+    clock[0] += 2
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+    assert cache.stats()["size"] == 0
+
+
+def test_lru_expulsa_la_menos_usada(clock, generation):
+    cache = ResponseCache(max_size=2, ttl_s=60)
+    cache.set("a", {"answer": "A"})
+    cache.set("b", {"answer": "B"})
+    cache.get("a")  # "a" pasa a ser la más reciente
+    cache.set("c", {"answer": "C"})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"answer": "A"}
+    assert cache.get("c") == {"answer": "C"}
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cambio_de_generacion_invalida(clock, generation):
+    cache = ResponseCache(max_size=4, ttl_s=60)
+    cache.set("a", {"answer": "A"})
+    generation[0] = "gen-2"
+    assert cache.get("a") is None
+    assert cache.stats()["invalidations"] == 1
+    cache.set("a", {"answer": "A2"})
+    assert cache.get("a") == {"answer": "A2"}
+
+
+def test_desactivada_con_tamano_cero(clock, generation):
+    cache = ResponseCache(max_size=0, ttl_s=60)
+    cache.set("a", {"answer": "A"})
+    assert cache.get("a") is None
+    assert cache.stats()["size"] == 0
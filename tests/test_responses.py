@@ -0,0 +1,24 @@
+import pytest
+
+from src.api.responses import accepts_gzip
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ("gzip", True),
+        ("gzip, deflate, br", True),
+        ("br;q=1.0, gzip;q=0.8", True),
+        ("GZIP", True),
+        ("*", True),
+        ("", False),
+        ("br, deflate", False),
+        ("gzip;q=0", False),
+        ("gzip;q=0.0, br", False),
+        ("*;q=0.5, gzip;q=0", False),
+        ("*;q=0", False),
+        ("gzip;q=abc", False),
+    ],
+)
+def test_accepts_gzip(header, expected):
+    assert accepts_gzip(header) is expected
@@ -0,0 +1,67 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from src.services import search
+
+
+class _Client:
+    def __init__(self, version=None, fail=False):
+        self.version = version
+        self.fail = fail
+        self.probes = 0
+
+    def info(self):
+        self.probes += 1
+        if self.fail:
+            raise ConnectionError("qdrant no responde")
+        return SimpleNamespace(version=self.version)
+
+    def query_points(self, **kwargs):
+        pass
+
+    def search(self, **kwargs):
+        pass
+
+
+class _AsyncClient(_Client):
+    async def info(self):
+        return _Client.info(self)
+
+
+@pytest.fixture(autouse=True)
+def _clean_methods(monkeypatch):
+    monkeypatch.setattr(search, "_search_methods", {})
+
+
+@pytest.mark.parametrize("version, expected", [("1.12.4", "query_points"), ("1.9.0", "search"), (None, "query_points")])
+def test_pick_search_method(version, expected):
+    assert search._pick_search_method(_Client(), version) == expected
+
+
+def test_sondeo_correcto_se_cachea():
+    client = _Client(version="1.9.0")
+    assert search._resolve_search_method(client) == "search"
+    assert search._resolve_search_method(client) == "search"
+    assert client.probes == 1
+
+
+def test_sondeo_fallido_no_se_cachea():
+    client = _Client(version="1.9.0", fail=True)
+    assert search._resolve_search_method(client) == "query_points"
+    assert "sync" not in search._search_methods
+
+    client.fail = False
+    assert search._resolve_search_method(client) == "search"
+    assert client.probes == 2
+    assert search._search_methods["sync"] == "search"
+
+
+def test_sondeo_async_fallido_no_se_cachea():
+    client = _AsyncClient(version="1.9.0", fail=True)
+    assert asyncio.run(search._aresolve_search_method(client)) == "query_points"
+    assert "async" not in search._search_methods
+    client.fail = False
+    assert asyncio.run(search._aresolve_search_method(client)) == "search"
+    assert search._search_methods["async"] == "search"
@@ -0,0 +1,149 @@
+import math
+
+import numpy as np
+import pytest
+
+from src.services import embeddings
+from src.services import semantic_cache as semantic_cache_module
+from src.services.semantic_cache import SemanticCache, calibrate
+
+
+def _vector(distance: float, axis: int = 0) -> np.ndarray:
+    """Vector unitario a la distancia coseno dada del eje `axis`"""
+    angle = math.acos(1.0 - distance)
+    v = np.zeros(4, dtype=np.float32)
+    v[axis] = math.cos(angle)
+    v[(axis + 1) % 4] = math.sin(angle)
+    return v
+
+
+@pytest.fixture
+def generation(monkeypatch):
+    current = ["gen-1"]
+    monkeypatch.setattr(semantic_cache_module, "get_index_generation", lambda: current[0])
+    return current
+
+
+def test_acierto_dentro_de_la_distancia(generation):
+    cache = SemanticCache(max_size=4, max_distance=0.05)
+    cache.set(_vector(0.0), "storage con web estática", "code_template", 3, 0.8, {"answer": "A"})
+
+    hit = cache.get(_vector(0.049), "code_template", 3, 0.8)
+    assert hit is not None
+    value, similarity, question = hit
+    assert value == {"answer": "A"}
+    assert similarity == pytest.approx(0.951, abs=1e-4)
+    assert question == "storage con web estática"
+    assert cache.stats()["hits"] == 1
+
+
+def test_fallo_justo_por_encima_de_la_distancia(generation):
+    cache = SemanticCache(max_size=4, max_distance=0.05)
+    cache.set(_vector(0.0), "q", "code_template", 3, 0.8, {"answer": "A"})
+    assert cache.get(_vector(0.051), "code_template", 3, 0.8) is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_solo_entradas_compatibles(generation):
+    cache = SemanticCache(max_size=4, max_distance=0.05)
+    cache.set(_vector(0.0), "q", "code_template", 3, 0.8, {"answer": "A"})
+    assert cache.get(_vector(0.0), "explanation", 3, 0.8) is None
+    assert cache.get(_vector(0.0), "code_template", 5, 0.8) is None
+    assert cache.get(_vector(0.0), "code_template", 3, 0.7) is None
+
+
+def test_cambio_de_generacion_invalida(generation):
+    cache = SemanticCache(max_size=4, max_distance=0.05)
+    cache.set(_vector(0.0), "q", "code_template", 3, 0.8, {"answer": "A"})
+    generation[0] = "gen-2"
+    assert cache.get(_vector(0.0), "code_template", 3, 0.8) is None
+    stats = cache.stats()
+    assert stats["invalidations"] == 1
+    assert stats["size"] == 0
+
+
+def test_lru_expulsa_la_menos_usada(generation):
+    cache = SemanticCache(max_size=2, max_distance=0.05)
+    cache.set(_vector(0.0, axis=0), "a", "explanation", 3, 0.8, {"answer": "A"})
+    cache.set(_vector(0.0, axis=1), "b", "explanation", 3, 0.8, {"answer": "B"})
+    assert cache.get(_vector(0.0, axis=0), "explanation", 3, 0.8) is not None  # "a" pasa a la más reciente
+    cache.set(_vector(0.0, axis=2), "c", "explanation", 3, 0.8, {"answer": "C"})
+
+    assert cache.get(_vector(0.0, axis=1), "explanation", 3, 0.8) is None
+    assert cache.get(_vector(0.0, axis=0), "explanation", 3, 0.8)[0] == {"answer": "A"}
+    assert cache.get(_vector(0.0, axis=2), "explanation", 3, 0.8)[0] == {"answer": "C"}
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["size"] == 2
+
+
+def test_set_sustituye_la_entrada_equivalente(generation):
+    cache = SemanticCache(max_size=4, max_distance=0.05)
+    cache.set(_vector(0.0), "q1", "explanation", 3, 0.8, {"answer": "viejo"})
+    cache.set(_vector(0.01), "q2", "explanation", 3, 0.8, {"answer": "nuevo"})
+    assert cache.stats()["size"] == 1
+    assert cache.get(_vector(0.0), "explanation", 3, 0.8)[0] == {"answer": "nuevo"}
+
+
+def test_desactivada_con_tamano_cero(generation):
+    cache = SemanticCache(max_size=0, max_distance=0.05)
+    assert not cache.enabled
+    cache.set(_vector(0.0), "q", "explanation", 3, 0.8, {"answer": "A"})
+    assert cache.get(_vector(0.0), "explanation", 3, 0.8) is None
+
+
+def test_calibrate_sugiere_distancia_sin_falsos_positivos(monkeypatch):
+    vectors = {
+        "a1": _vector(0.0), "b1": _vector(0.02),   # equivalentes
+        "a2": _vector(0.0), "b2": _vector(0.06),   # equivalentes, pero más lejos que un par distinto
+        "a3": _vector(0.0), "b3": _vector(0.04),   # distintos
+    }
+    monkeypatch.setattr(embeddings, "encode_queries", lambda queries: np.stack([vectors[q] for q in queries]))
+    report = calibrate([
+        {"a": "a1", "b": "b1", "duplicate": True},
+        {"a": "a2", "b": "b2", "duplicate": True},
+        {"a": "a3", "b": "b3", "duplicate": False},
+    ])
+    assert report["suggested_max_distance"] == pytest.approx(0.02, abs=1e-3)
+    assert report["duplicate_recall"] == 0.5
+    assert report["distinct"]["min"] == pytest.approx(0.04, abs=1e-3)
+
+
+@pytest.fixture
+def node_cache(monkeypatch, generation):
+    from src.Agent.nodes import semantic_cache as node
+    cache = SemanticCache(max_size=4, max_distance=0.05)
+    monkeypatch.setattr(node, "semantic_cache", cache)
+    monkeypatch.setattr(node, "encode_query", lambda question: _vector(0.0))
+    return node, cache
+
+
+def _result(chat_history):
+    return {
+        "question": "crear una vnet",
+        "intent": "explanation",
+        "k_docs": 3,
+        "threshold": 0.8,
+        "chat_history": chat_history,
+        "is_valid_scope": True,
+        "response_action": "generate_answer",
+        "messages": [],
+        "answer": "A",
+    }
+
+
+def test_con_historial_no_se_guarda_ni_se_consulta(node_cache):
+    node, cache = node_cache
+    history = [{"role": "user", "content": "hablemos de AKS"}]
+
+    node.store_in_semantic_cache(_result(history))
+    assert cache.stats()["size"] == 0
+
+    node.store_in_semantic_cache(_result([]))
+    assert cache.stats()["size"] == 1
+    state = node.lookup_semantic_cache({**_result(history), "messages": []})
+    assert state["semantic_cache_hit"] is False
+    assert cache.stats()["hits"] == 0
+
+    state = node.lookup_semantic_cache({**_result(None), "messages": []})
+    assert state["semantic_cache_hit"] is True
+    assert state["answer"] == "A"
@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+from src.services.singleflight import SingleFlight, query_key
+
+
+def test_query_key_normaliza_pregunta():
+    assert query_key("  Crear   una VNet ", 3, 0.7) == query_key("crear una vnet", 3, 0.7)
+    assert query_key("crear una vnet", 3, 0.7) != query_key("crear una vnet", 5, 0.7)
+    assert query_key("crear una vnet", 3, 0.7) != query_key(
+        "crear una vnet", 3, 0.7, [{"role": "user", "content": "hola"}]
+    )
+
+
+def test_llamadas_concurrentes_comparten_una_ejecucion():
+    async def scenario():
+        flight = SingleFlight()
+        executions = 0
+
+        async def fn():
+            nonlocal executions
+            executions += 1
+            await asyncio.sleep(0.01)
+            return {"answer": "ok"}
+
+        results = await asyncio.gather(*(flight.do("k", fn) for _ in range(5)))
+        return flight, executions, results
+
+    flight, executions, results = asyncio.run(scenario())
+    assert executions == 1
+    assert all(r == {"answer": "ok"} for r in results)
+    assert flight.stats() == {"calls": 5, "executions": 1, "collapsed": 4, "in_flight": 0}
+
+
+def test_fallo_del_lider_llega_a_los_seguidores():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def fn():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("qdrant caído")
+
+        return flight, await asyncio.gather(*(flight.do("k", fn) for _ in range(3)), return_exceptions=True)
+
+    flight, results = asyncio.run(scenario())
+    assert all(isinstance(r, RuntimeError) and str(r) == "qdrant caído" for r in results)
+    assert flight.executions == 1
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_tras_un_fallo_la_siguiente_llamada_vuelve_a_ejecutar():
+    async def scenario():
+        flight = SingleFlight()
+        attempts = 0
+
+        async def fn():
+            nonlocal attempts
+            attempts += 1
+            if attempts == 1:
+                raise RuntimeError("fallo")
+            return "ok"
+
+        with pytest.raises(RuntimeError):
+            await flight.do("k", fn)
+        return await flight.do("k", fn), attempts
+
+    assert asyncio.run(scenario()) == ("ok", 2)
+
+
+def test_cancelar_al_lider_no_cancela_a_los_seguidores():
+    async def scenario():
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def fn():
+            await release.wait()
+            return "ok"
+
+        leader = asyncio.ensure_future(flight.do("k", fn))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do("k", fn))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        return leader, await follower, flight
+
+    leader, follower_result, flight = asyncio.run(scenario())
+    assert leader.cancelled()
+    assert follower_result == "ok"
+    assert flight.executions == 1
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_seguidor_espera_solo_su_propio_deadline():
+    async def scenario():
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def fn():
+            await release.wait()
+            return "ok"
+
+        leader = asyncio.ensure_future(flight.do("k", fn))
+        await asyncio.sleep(0)
+        with pytest.raises(asyncio.TimeoutError):
+            await flight.do("k", fn, timeout=0.01)
+
+        # El timeout del seguidor no cancela la ejecución compartida
+        release.set()
+        return await leader
+
+    assert asyncio.run(scenario()) == "ok"
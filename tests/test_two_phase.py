@@ -0,0 +1,115 @@
+import asyncio
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from src.services import relevance_filter, search
+
+
+def _point(pid, score, name, content):
+    return SimpleNamespace(id=pid, score=score, payload={"page_content": content, "metadata": {"name": name, "doc_type": "example"}})
+
+
+def _light(point, fields):
+    """Proyección de campos del payload, como hace Qdrant con with_payload=[...]"""
+    metadata = {key: value for key, value in point.payload["metadata"].items() if f"metadata.{key}" in fields}
+    return SimpleNamespace(id=point.id, score=point.score, payload={"metadata": metadata})
+
+
+class _AsyncClient:
+    """Cliente async con query_points/retrieve sobre puntos en memoria, registrando las llamadas"""
+
+    def __init__(self, points_by_collection, fail_retrieve=()):
+        self.points = points_by_collection
+        self.fail_retrieve = set(fail_retrieve)
+        self.search_payloads = []
+        self.retrieved = {}
+
+    async def info(self):
+        return SimpleNamespace(version="1.12.0")
+
+    async def query_points(self, collection_name, query, limit, score_threshold, with_payload, timeout):
+        self.search_payloads.append(with_payload)
+        points = [p for p in self.points[collection_name] if p.score >= score_threshold][:limit]
+        if with_payload is not True:
+            points = [_light(p, with_payload) for p in points]
+        return SimpleNamespace(points=points)
+
+    async def retrieve(self, collection_name, ids, with_payload, with_vectors, timeout):
+        if collection_name in self.fail_retrieve:
+            raise ConnectionError("qdrant caído")
+        self.retrieved[collection_name] = list(ids)
+        by_id = {p.id: p for p in self.points[collection_name]}
+        return [SimpleNamespace(id=i, payload=by_id[i].payload) for i in ids if i in by_id]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    fake = _AsyncClient({
+        "a": [_point("a1", 0.95, "vnet", "contenido a1"), _point("a2", 0.80, "subnet", "contenido a2")],
+        "b": [_point("b1", 0.90, "storage", "contenido b1"), _point("b2", 0.85, "nsg", "contenido b2")],
+    })
+    monkeypatch.setattr(search, "_search_methods", {})
+    monkeypatch.setattr(search, "get_async_qdrant_client", lambda: fake)
+    monkeypatch.setattr(search, "_encode_query", lambda query: np.ones(4, dtype=np.float32))
+    monkeypatch.setattr(relevance_filter, "is_query_in_scope", lambda query, min_keywords=0: (True, ""))
+    monkeypatch.setattr(search.SETTINGS, "VECTOR_BACKEND", "qdrant")
+    return fake
+
+
+def _search(fetch_k=None):
+    return asyncio.run(search.async_search_all_collections("crear vnet", ["a", "b"], k_per_collection=2, threshold=0.5, fetch_k=fetch_k))
+
+
+def test_desactivada_por_defecto_una_sola_fase(client):
+    assert search.SETTINGS.TWO_PHASE_RETRIEVAL is False
+    hits = _search()
+    assert client.search_payloads == [True, True]
+    assert client.retrieved == {}
+    assert [h["id"] for h in hits] == ["a1", "b1", "b2", "a2"]
+    assert hits[0]["content"] == "contenido a1"
+
+
+def test_busqueda_ligera_y_relleno_del_top_k(client, monkeypatch):
+    monkeypatch.setattr(search.SETTINGS, "TWO_PHASE_RETRIEVAL", True)
+    hits = _search(fetch_k=3)
+
+    # Fase 1: solo los campos ligeros
+    assert client.search_payloads == [search.LIGHT_PAYLOAD_FIELDS] * 2
+    # Fase 2: contenido solo de los 3 mejores, un retrieve por colección
+    assert client.retrieved == {"a": ["a1"], "b": ["b1", "b2"]}
+    assert [h["id"] for h in hits] == ["a1", "b1", "b2"]
+    assert [h["content"] for h in hits] == ["contenido a1", "contenido b1", "contenido b2"]
+    assert [h["score"] for h in hits] == [0.95, 0.90, 0.85]
+    assert hits[1]["name"] == "storage"
+    assert hits[1]["collection"] == "b"
+
+
+def test_fallo_del_retrieve_descarta_solo_esa_coleccion(client, monkeypatch):
+    monkeypatch.setattr(search.SETTINGS, "TWO_PHASE_RETRIEVAL", True)
+    client.fail_retrieve = {"b"}
+    hits = _search()
+    assert [h["id"] for h in hits] == ["a1", "a2"]
+    assert all(h["content"] for h in hits)
+
+
+def test_indice_local_no_usa_dos_fases(monkeypatch):
+    monkeypatch.setattr(search.SETTINGS, "TWO_PHASE_RETRIEVAL", True)
+    monkeypatch.setattr(search.SETTINGS, "VECTOR_BACKEND", "local")
+    assert not search._two_phase()
+    assert search._search_payload() is True
+
+
+def test_fill_hits_conserva_orden_y_score_de_la_fase_1():
+    hits = [
+        {"id": "x", "collection": "a", "score": 0.9},
+        {"id": "borrado", "collection": "a", "score": 0.8},
+        {"id": "y", "collection": "b", "score": 0.7},
+    ]
+    records = {
+        "a": [SimpleNamespace(id="x", payload={"page_content": "X", "metadata": {"name": "x"}})],
+        "b": [SimpleNamespace(id="y", payload={"page_content": "Y", "metadata": {"name": "y"}})],
+    }
+    filled = search._fill_hits(hits, records, request_id="test")
+    assert [(h["id"], h["score"], h["content"]) for h in filled] == [("x", 0.9, "X"), ("y", 0.7, "Y")]
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from src.services import prefork, warmup
+from src.services.warmup import WarmupState
+
+
+@pytest.fixture
+def state(monkeypatch):
+    fresh = WarmupState()
+    monkeypatch.setattr(warmup, "WARMUP", fresh)
+    monkeypatch.setattr(warmup.SETTINGS, "WARMUP_RETRY_INITIAL_S", 0.0)
+    monkeypatch.setattr(warmup.SETTINGS, "WARMUP_RETRY_MAX_S", 0.0)
+    monkeypatch.setattr(warmup.SETTINGS, "VECTOR_BACKEND", "qdrant")
+    monkeypatch.setattr(prefork, "log_process_memory", lambda stage: None)
+
+    async def ok():
+        return {}
+
+    for name in ("_warm_classifier", "_warm_embeddings", "_warm_llm"):
+        monkeypatch.setattr(warmup, name, ok)
+    monkeypatch.setattr(warmup, "_warm_lexical", lambda collections: ok())
+    return fresh
+
+
+def test_reintenta_qdrant_hasta_que_responde(state, monkeypatch):
+    attempts = []
+
+    async def flaky_qdrant(collections):
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionError("qdrant caído")
+        return {"collections": {}}
+
+    monkeypatch.setattr(warmup, "_warm_qdrant", flaky_qdrant)
+    result = asyncio.run(asyncio.wait_for(warmup.run_warmup(["col"]), timeout=5))
+
+    assert result is state
+    assert state.ready
+    assert state.finished
+    assert len(attempts) == 3
+    assert state.components["qdrant"]["error"] is None
+
+
+def test_solo_reintenta_los_pasos_fallidos(state, monkeypatch):
+    calls = {"classifier": 0, "qdrant": 0}
+
+    async def classifier():
+        calls["classifier"] += 1
+        return {}
+
+    async def qdrant(collections):
+        calls["qdrant"] += 1
+        if calls["qdrant"] == 1:
+            raise ConnectionError("qdrant caído")
+        return {}
+
+    monkeypatch.setattr(warmup, "_warm_classifier", classifier)
+    monkeypatch.setattr(warmup, "_warm_qdrant", qdrant)
+    asyncio.run(asyncio.wait_for(warmup.run_warmup(["col"]), timeout=5))
+
+    assert state.ready
+    assert calls == {"classifier": 1, "qdrant": 2}
+
+
+def test_sin_fallos_no_hay_reintentos(state, monkeypatch):
+    async def qdrant(collections):
+        return {}
+
+    async def no_retry(collections):
+        raise AssertionError("no debería reintentar")
+
+    monkeypatch.setattr(warmup, "_warm_qdrant", qdrant)
+    monkeypatch.setattr(warmup, "_retry_required", no_retry)
+    assert asyncio.run(warmup.run_warmup(["col"])).ready